@@ -0,0 +1,168 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from prompts.context import SUMMARY_PROMPT, SUMMARY_CONTEXT
+from utils.logger import log
+from utils.tokens import estimate_tokens
+
+# Summaries are written off the request path; shared by all sessions
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="context-summary")
+
+# Approximate per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+class ContextBuilder:
+    """
+    Fits a conversation into a per-call token budget.
+
+    The newest messages that fit the budget are sent verbatim. Messages that fall out
+    of the window are folded into a rolling summary by a background LLM call, which
+    only ever sees the previous summary plus the newly evicted messages, so the cost
+    of summarizing stays constant as the conversation grows. Until a summary catches
+    up, the evicted messages are simply left out; requests never wait for it.
+    """
+
+    def __init__(self, client=None, budget: Optional[int] = None, summary_tokens: Optional[int] = None):
+        """
+        Initialize the context builder.
+
+        Args:
+            client: ChatModel used to write the summary (no summary is kept without one)
+            budget: Default prompt budget in estimated tokens (defaults to CONTEXT_TOKEN_BUDGET)
+            summary_tokens: Target length of the summary (defaults to CONTEXT_SUMMARY_TOKENS)
+        """
+        self.client = client
+        if budget is None:
+            budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+        self.budget = budget
+        if summary_tokens is None:
+            summary_tokens = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "300"))
+        self.summary_tokens = summary_tokens
+
+        self.summary = ""
+        self._summarized = 0       # history[:_summarized] is covered by the summary
+        self._pending = None       # future of the running summary update
+        self._generation = 0       # bumped by reset, so updates for an earlier history are dropped
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget the summary; call whenever the conversation history is replaced."""
+        with self._lock:
+            self.summary = ""
+            self._summarized = 0
+            self._pending = None
+            self._generation += 1
+
+    @staticmethod
+    def count_tokens(message: Dict[str, str]) -> int:
+        """Estimated tokens a message adds to a prompt."""
+        return estimate_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+    def build(self, system_prompt: str, history: List[Dict[str, str]], budget: Optional[int] = None,
+              summarize: bool = True, context: str = "") -> List[Dict[str, str]]:
+        """
+        Build the messages for an LLM call.
+
+        The system prompt and the history come first and change little from turn to turn,
+        so providers can serve them from their prompt cache. Content that changes every
+        turn (the summary and the given context) goes in a system message placed just
+        before the latest message.
+
+        Args:
+            system_prompt: System prompt of the call, identical across turns
+            history: Full conversation history, oldest first; only ever appended to
+            budget: Prompt budget for this call (defaults to the builder's budget)
+            summarize: Whether messages evicted from this window should be summarized
+            context: Per-turn context such as retrieved knowledge (optional)
+
+        Returns:
+            The system prompt, the most recent messages that fit the budget and the
+            per-turn context. The latest message is always included.
+        """
+        if budget is None:
+            budget = self.budget
+
+        with self._lock:
+            summary, summarized = self.summary, self._summarized
+        # The latest message is always sent, even if the summary claims to cover it
+        summarized = max(0, min(summarized, len(history) - 1))
+
+        blocks = []
+        if summary:
+            blocks.append(SUMMARY_CONTEXT.format(summary=summary))
+        if context.strip():
+            blocks.append(context.strip())
+        turn_context = {"role": "system", "content": "\n\n".join(blocks)} if blocks else None
+
+        messages = [{"role": "system", "content": system_prompt}]
+        remaining = budget - self.count_tokens(messages[0])
+        if turn_context:
+            remaining -= self.count_tokens(turn_context)
+
+        # Never go back past what the summary covers
+        start = self._window_start(history, summarized, remaining)
+        window = history[start:]
+        messages.extend(window[:-1])
+        if turn_context:
+            messages.append(turn_context)
+        messages.extend(window[-1:])
+
+        if summarize and start > summarized:
+            # Summarize down to half the window, so the next few turns fit without another update
+            self._schedule_summary(history, self._window_start(history, summarized, remaining // 2))
+        return messages
+
+    def _window_start(self, history: List[Dict[str, str]], floor: int, tokens: int) -> int:
+        """Index of the oldest message, not before floor, such that history[index:] fits in tokens."""
+        start = len(history)
+        while start > floor:
+            cost = self.count_tokens(history[start - 1])
+            if cost > tokens and start < len(history):
+                break
+            tokens -= cost
+            start -= 1
+        return start
+
+    def _schedule_summary(self, history: List[Dict[str, str]], end: int):
+        """Fold history[_summarized:end] into the summary in the background."""
+        if self.client is None:
+            return
+        with self._lock:
+            if self._pending is not None and not self._pending.done():
+                # One update at a time; the next build picks up whatever is still unsummarized
+                return
+            evicted = history[self._summarized:end]
+            self._pending = _summary_executor.submit(self._update_summary, self.summary, evicted, end,
+                                                     self._generation)
+
+    def _update_summary(self, summary: str, evicted: List[Dict[str, str]], end: int, generation: int):
+        """Ask the LLM for the summary extended with the evicted messages."""
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in evicted)
+        try:
+            updated = self.client.generate_response(
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(max_words=self.summary_tokens)},
+                    {"role": "user", "content": f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"}
+                ],
+                temperature=0.2,
+                max_tokens=self.summary_tokens * 2
+            ).strip()
+        except Exception as e:
+            log('WARNING', f"[context] summary update failed, will retry on the next turn: {e}")
+            return
+
+        with self._lock:
+            if generation != self._generation:
+                # The history was replaced while summarizing; end indexes the old one
+                return
+            self.summary = updated
+            self._summarized = end
+        log('INFO', f"[context] summarized {len(evicted)} messages, {estimate_tokens(updated)} tokens of summary")
+
+    def wait(self, timeout: Optional[float] = None):
+        """Block until a running summary update finishes (for tests and shutdown)."""
+        with self._lock:
+            pending = self._pending
+        if pending is not None:
+            pending.result(timeout)
@@ -0,0 +1,232 @@
+import os
+import re
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from prompts.router import ROUTER_EXAMPLES, ROUTER_KEYWORDS
+from utils.logger import log
+
+class NodeRouter:
+    """
+    Local router that picks the next conversation node without an LLM call.
+
+    Each node is scored from three signals: similarity of the input embedding to the
+    node's example messages, keyword matches, and a prior favoring the current node's
+    default next node. The scores are turned into probabilities with a softmax; when
+    the top probability is below the confidence threshold the caller should ask the LLM.
+    """
+
+    # Weights of the routing signals, in softmax logits
+    SIMILARITY_SCALE = 10.0
+    KEYWORD_WEIGHT = 1.5
+    MAX_KEYWORD_HITS = 3
+    NEXT_NODE_PRIOR = 1.0
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, nodes: Dict[str, Dict[str, Any]], embedding_model=None, threshold: Optional[float] = None,
+                 audit_rate: Optional[float] = None, speculation_delay: Optional[float] = None):
+        """
+        Initialize the router.
+
+        Args:
+            nodes: Conversation nodes (AGENT_PROMPT)
+            embedding_model: Model used to embed the node examples and user input (optional)
+            threshold: Minimum confidence to accept a local decision (defaults to ROUTER_CONFIDENCE_THRESHOLD)
+            audit_rate: Fraction of confident decisions also checked against the LLM in the
+                background, to measure agreement above the threshold (defaults to ROUTER_AUDIT_RATE)
+            speculation_delay: Seconds callers wait for the input embedding before asking the
+                LLM in parallel, in case the decision is unsure (defaults to ROUTER_SPECULATION_DELAY)
+        """
+        self.nodes = nodes
+        self.node_ids = list(nodes.keys())
+        self.embedding_model = embedding_model
+        if threshold is None:
+            threshold = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.6"))
+        self.threshold = threshold
+        if audit_rate is None:
+            audit_rate = float(os.getenv("ROUTER_AUDIT_RATE", "0"))
+        self.audit_rate = audit_rate
+        if speculation_delay is None:
+            speculation_delay = float(os.getenv("ROUTER_SPECULATION_DELAY", "0.1"))
+        self.speculation_delay = speculation_delay
+
+        self._keywords = {node_id: [self._compile_keyword(k) for k in ROUTER_KEYWORDS.get(node_id, [])]
+                          for node_id in self.node_ids}
+        self._prototypes = None      # (example matrix, node index per example)
+        self._lock = threading.Lock()
+        self._stats = {"local": 0, "llm": 0, "compared": 0, "agreements": 0}
+        # Agreement between local and LLM choices per confidence decile, for tuning the threshold
+        self._agreement_bins = [[0, 0] for _ in range(10)]
+
+    @classmethod
+    def shared(cls, nodes: Dict[str, Dict[str, Any]], embedding_model=None) -> "NodeRouter":
+        """
+        Return the process-wide router, so node prototypes are embedded once and stats are pooled.
+
+        A router built without an embedding model (e.g. its caller's knowledge manager
+        failed) takes the model of the first later caller that has one.
+        """
+        shared = cls._shared
+        if shared is None or (shared.embedding_model is None and embedding_model is not None):
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls(nodes, embedding_model)
+                elif cls._shared.embedding_model is None and embedding_model is not None:
+                    cls._shared.embedding_model = embedding_model
+        return cls._shared
+
+    @staticmethod
+    def _compile_keyword(keyword: str) -> "re.Pattern":
+        """Match ASCII keywords on word boundaries ("test" not in "latest"), others as substrings."""
+        if keyword.isascii():
+            return re.compile(r"\b" + re.escape(keyword) + r"\b")
+        return re.compile(re.escape(keyword))
+
+    def _prototype_texts(self) -> Tuple[List[str], List[int]]:
+        """Node examples and the index of the node each one belongs to."""
+        texts, owners = [], []
+        for node_id, examples in ROUTER_EXAMPLES.items():
+            if node_id in self.nodes:
+                for example in examples:
+                    texts.append(example)
+                    owners.append(self.node_ids.index(node_id))
+        return texts, owners
+
+    def _set_prototypes(self, embeddings, owners: List[int]) -> Tuple[np.ndarray, np.ndarray]:
+        """Store normalized example embeddings as the node prototypes."""
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        self._prototypes = (matrix, np.asarray(owners))
+        return self._prototypes
+
+    def _get_prototypes(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Embed the node examples on first use."""
+        if self.embedding_model is None:
+            return None
+        with self._lock:
+            if self._prototypes is None:
+                texts, owners = self._prototype_texts()
+                self._set_prototypes(self.embedding_model.get_embeddings(texts), owners)
+            return self._prototypes
+
+    def route(self, current_node_id: str, user_input: str,
+              query_embedding: Optional[List[float]] = None) -> Tuple[str, float]:
+        """
+        Score every node for the user input.
+
+        Args:
+            current_node_id: Node the conversation is at
+            user_input: Latest user message
+            query_embedding: Embedding of user_input, if already computed
+
+        Returns:
+            (best node, confidence between 0 and 1)
+        """
+        prototypes = None
+        try:
+            prototypes = self._get_prototypes()
+            if prototypes is not None and query_embedding is None:
+                query_embedding = self.embedding_model.get_embedding(user_input)
+        except Exception as e:
+            log('WARNING', f"[router] embedding unavailable, using keywords only: {e}")
+            prototypes = None
+
+        return self._score(current_node_id, user_input, prototypes, query_embedding)
+
+    async def aroute(self, current_node_id: str, user_input: str,
+                     query_embedding: Optional[List[float]] = None) -> Tuple[str, float]:
+        """Async version of route, embedding with the model's async methods."""
+        prototypes = None
+        try:
+            if self.embedding_model is not None:
+                prototypes = self._prototypes
+                if prototypes is None:
+                    # Concurrent first calls may both embed the examples; the result is the same
+                    texts, owners = self._prototype_texts()
+                    prototypes = self._set_prototypes(await self.embedding_model.aget_embeddings(texts), owners)
+                if query_embedding is None:
+                    query_embedding = await self.embedding_model.aget_embedding(user_input)
+        except Exception as e:
+            log('WARNING', f"[router] embedding unavailable, using keywords only: {e}")
+            prototypes = None
+
+        return self._score(current_node_id, user_input, prototypes, query_embedding)
+
+    def route_keywords(self, current_node_id: str, user_input: str) -> Tuple[str, float]:
+        """Score every node from keywords and the next-node prior only, without embedding."""
+        return self._score(current_node_id, user_input, None, None)
+
+    def _score(self, current_node_id: str, user_input: str,
+               prototypes: Optional[Tuple[np.ndarray, np.ndarray]],
+               query_embedding: Optional[List[float]]) -> Tuple[str, float]:
+        """Combine the routing signals into the best node and its probability."""
+        logits = np.zeros(len(self.node_ids), dtype=np.float32)
+
+        if prototypes is not None:
+            matrix, owners = prototypes
+            query = np.asarray(query_embedding, dtype=np.float32)
+            similarities = matrix @ (query / max(np.linalg.norm(query), 1e-12))
+            # A node is as close as its closest example
+            best = np.full(len(self.node_ids), -1.0, dtype=np.float32)
+            np.maximum.at(best, owners, similarities)
+            logits += self.SIMILARITY_SCALE * best
+
+        text = user_input.lower()
+        for i, node_id in enumerate(self.node_ids):
+            hits = sum(1 for pattern in self._keywords[node_id] if pattern.search(text))
+            logits[i] += self.KEYWORD_WEIGHT * min(hits, self.MAX_KEYWORD_HITS)
+
+        default_next = self.nodes.get(current_node_id, {}).get("next")
+        if default_next in self.node_ids:
+            logits[self.node_ids.index(default_next)] += self.NEXT_NODE_PRIOR
+
+        probabilities = np.exp(logits - logits.max())
+        probabilities /= probabilities.sum()
+        best_index = int(np.argmax(probabilities))
+        return self.node_ids[best_index], float(probabilities[best_index])
+
+    def record_local(self):
+        """Count a turn routed without the LLM."""
+        with self._lock:
+            self._stats["local"] += 1
+
+    def record_llm(self, local_node: str, confidence: float, llm_node: str, audit: bool = False):
+        """
+        Record the LLM's choice for a turn and whether the local choice agreed.
+
+        Args:
+            local_node: Node the local router picked
+            confidence: Confidence of the local choice
+            llm_node: Node the LLM picked
+            audit: True when the turn was routed locally and the LLM was only asked for comparison
+        """
+        agreed = local_node == llm_node
+        with self._lock:
+            if not audit:
+                self._stats["llm"] += 1
+            self._stats["compared"] += 1
+            self._stats["agreements"] += agreed
+            bin_stats = self._agreement_bins[min(int(confidence * 10), 9)]
+            bin_stats[0] += 1
+            bin_stats[1] += agreed
+        log('INFO', f"[router] local={local_node} ({confidence:.2f}) llm={llm_node} agreed={agreed}"
+                    f"{' (audit)' if audit else ''}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return routing counters and local/LLM agreement per confidence decile."""
+        with self._lock:
+            total = self._stats["local"] + self._stats["llm"]
+            compared = self._stats["compared"]
+            return {
+                "turns": total,
+                "local": self._stats["local"],
+                "llm": self._stats["llm"],
+                "local_rate": self._stats["local"] / total if total else 0.0,
+                "agreement_rate": self._stats["agreements"] / compared if compared else 0.0,
+                "agreement_by_confidence": {
+                    f"{i / 10:.1f}-{(i + 1) / 10:.1f}": round(agreed / count, 3)
+                    for i, (count, agreed) in enumerate(self._agreement_bins) if count
+                }
+            }
@@ -1,28 +1,66 @@
 from typing import Dict, Any, Callable, List
-from models.chat import ChatModel
+from models.chat import ChatModel, AsyncChatModel
 from utils.logger import log
 from prompts.system import SYSTEM_PROMPT
 from prompts.agent import AGENT_PROMPT
 from prompts.tools import AVAILABLE_TOOLS
-from prompts.assistent import get_assistant_prompt
+from prompts.assistent import compile_node_prompts
 from prompts.knowledge import AVAILABLE_KNOWLEDGE_BASES, get_knowledge_base
 from knowledge.manager import KnowledgeManager
+from agents.router import NodeRouter
+from agents.context import ContextBuilder
+from utils import startup
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 import json
+import random
+import asyncio
+
+# Number of knowledge documents added to a node's prompt
+KNOWLEDGE_TOP_K = 2
+
+# System prompts of every node, rendered once so they are byte-identical on every call
+NODE_PROMPTS = compile_node_prompts(AGENT_PROMPT, AVAILABLE_TOOLS)
+
+# Runs speculative knowledge retrieval while node routing is in flight; shared by all sessions.
+# Its tasks never wait on each other, so a full pool only delays them.
+_prefetch_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="knowledge-prefetch")
+
+# Routing LLM calls started before the local router has decided; they are on the critical
+# path, so they don't queue behind other sessions' retrieval or audits
+_routing_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="node-routing")
+
+# Sampled LLM checks of confident local routing decisions, off the critical path
+_audit_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="route-audit")
 
 class Workflow:
     def __init__(self):
         # Initialize the workflow nodes
         self.nodes = AGENT_PROMPT
         
-        # Initialize AI client
-        self.client = ChatModel(provider="qwen")
+        # Initialize AI clients (the async one serves aselect_node/aexecute_node)
+        with startup.stage("chat models"):
+            self.client = ChatModel(provider="qwen")
+            self.async_client = AsyncChatModel(provider="qwen")
+        # Import the client library and connect while the greeting is shown, not on the first message
+        _routing_executor.submit(self._warm_up_client)
         
         # Conversation history to provide context for LLM
         self.conversation_history = []
         
-        # Initialize knowledge manager
+        # Fits the history into each call's token budget, summarizing what no longer fits
+        self.context = ContextBuilder(self.client)
+        
+        # (user input, future of the query embedding, future of per-knowledge-base hits
+        # keyed by node filter) from prefetch_knowledge, and the asyncio tasks from its
+        # async counterpart
+        self._prefetch = None
+        self._async_prefetch = None
+        
+        # Initialize knowledge manager: the index is shared by every session in the process and
+        # loads in the background, documents added here stay local to this session
         try:
-            self.knowledge_manager = KnowledgeManager()
+            with startup.stage("knowledge manager"):
+                self.knowledge_manager = KnowledgeManager.session()
             # Add emergency knowledge example
             self.knowledge_manager.add_document({
                 "content": "When there is a possibility of self harm or injury to others, emergency calls should be made immediately：119。",
@@ -31,9 +69,145 @@ class Workflow:
         except Exception as e:
             print(f"Error initializing knowledge manager: {e}")
             self.knowledge_manager = None
+        
+        # Local node router; the LLM is only asked when it is unsure
+        with startup.stage("node router"):
+            self.router = NodeRouter.shared(
+                self.nodes, self.knowledge_manager.embedding_model if self.knowledge_manager else None
+            )
+    
+    def set_conversation_history(self, history):
+        """Replace the conversation history, e.g. with a loaded conversation"""
+        self.conversation_history = history
+        # The summary and its window described the previous history
+        self.context.reset()
+    
+    def _warm_up_client(self):
+        """Create the chat client in the background"""
+        try:
+            with startup.stage("chat client (background)"):
+                self.client.warm_up()
+        except Exception as e:
+            log('WARNING', f"Error creating chat client: {e}")
 
+    def prefetch_knowledge(self, user_input):
+        """
+        Start retrieving knowledge for user_input in the background.
+        
+        The node is not known yet, so candidates are fetched from every knowledge base any
+        node uses, once unfiltered and once per distinct node knowledge filter;
+        retrieve_relevant_knowledge later keeps the ones for the chosen node.
+        """
+        if not self.knowledge_manager or not user_input:
+            return
+        
+        searches = self._prefetch_searches()
+        # Resolved by fetch() as soon as the embedding is ready, so routing can use it
+        # while the search runs; one task does both, so no pool thread waits on another
+        embedding_future = Future()
+        
+        def fetch():
+            try:
+                query_embedding = self.knowledge_manager.embedding_model.get_embedding(user_input)
+                embedding_future.set_result(query_embedding)
+            except Exception as e:
+                embedding_future.set_exception(e)
+                # Keyword retrieval still works while the embedding provider is down
+                log('WARNING', f"Error embedding user input, using keyword search: {e}")
+                return {key: self.knowledge_manager.collect_hits(user_input, kb_names, KNOWLEDGE_TOP_K,
+                                                                 mode="lexical", filter=knowledge_filter)
+                        for key, (kb_names, knowledge_filter) in searches.items()}
+            # A filter narrows the candidate rows first, so the filtered searches are cheap
+            return {key: self.knowledge_manager.collect_hits(user_input, kb_names, KNOWLEDGE_TOP_K,
+                                                             query_embedding=query_embedding, filter=knowledge_filter)
+                    for key, (kb_names, knowledge_filter) in searches.items()}
+        
+        hits_future = _prefetch_executor.submit(fetch)
+        self._prefetch = (user_input, embedding_future, hits_future)
+    
+    def _prefetch_searches(self):
+        """
+        Searches that serve every node: filter key -> (knowledge bases, filter).
+        
+        The unfiltered search (key None) covers every knowledge base any node may search;
+        each node filter gets one search over the knowledge bases of the nodes using it.
+        """
+        searches = {None: (sorted({kb for node in self.nodes.values() for kb in node.get("knowledge", [])}
+                                  | set(self.knowledge_manager.knowledge_bases.keys())), None)}
+        for node_id in self.nodes:
+            knowledge_filter = self._node_knowledge_filter(node_id)
+            if knowledge_filter:
+                key = self._filter_key(knowledge_filter)
+                kb_names = searches[key][0] if key in searches else []
+                searches[key] = (sorted(set(kb_names) | set(self._node_knowledge_bases(node_id))), knowledge_filter)
+        return searches
+    
+    @staticmethod
+    def _filter_key(knowledge_filter):
+        """Hashable key of a node's knowledge filter; None when the node has none"""
+        return json.dumps(knowledge_filter, sort_keys=True) if knowledge_filter else None
+    
+    def _prefetched_embedding(self, user_input):
+        """Return the prefetched embedding of user_input, or None if unavailable"""
+        if not self._prefetch or self._prefetch[0] != user_input:
+            return None
+        try:
+            return self._prefetch[1].result()
+        except Exception as e:
+            log('WARNING', f"Error embedding user input: {e}")
+            return None
+    
+    def _needs_speculative_route(self, current_node_id, user_input):
+        """Whether to ask the routing LLM before the embedding-based decision: keywords alone are unsure"""
+        _, confidence = self.router.route_keywords(current_node_id, user_input)
+        return confidence < self.router.threshold
+    
     def select_node_with_llm(self, current_node_id, user_input):
-        """Use LLM to intelligently select the next appropriate node based on user input"""
+        """Select the next node, routing locally when confident and asking the LLM otherwise"""
+        
+        # Embed the input and search while routing is in progress
+        self.prefetch_knowledge(user_input)
+        
+        # If the embedding is slow and the decision may need the LLM, ask it now rather than
+        # after the embedding, so the two round trips overlap
+        llm_future = None
+        if self._prefetch and self._prefetch[0] == user_input and self.router.embedding_model is not None:
+            if not wait([self._prefetch[1]], self.router.speculation_delay).done \
+                    and self._needs_speculative_route(current_node_id, user_input):
+                llm_future = _routing_executor.submit(self._select_node_by_llm, current_node_id, user_input)
+        
+        local_node, confidence = self.router.route(
+            current_node_id, user_input, query_embedding=self._prefetched_embedding(user_input)
+        )
+        if confidence >= self.router.threshold:
+            log('INFO', f"[next node]: {local_node} (local router, confidence {confidence:.2f})")
+            self.router.record_local()
+            if llm_future is not None:
+                # Not needed after all: dropped if still queued, its answer ignored otherwise
+                llm_future.cancel()
+            if random.random() < self.router.audit_rate:
+                # Check a sample of confident decisions against the LLM off the critical path
+                _audit_executor.submit(self._audit_local_route, current_node_id, user_input, local_node, confidence)
+            return local_node
+        
+        if llm_future is not None:
+            next_node = llm_future.result()
+        else:
+            next_node = self._select_node_by_llm(current_node_id, user_input)
+        if next_node is None:
+            # Fallback to default logic if the LLM call fails or returns an invalid node
+            return self.nodes[current_node_id]["next"]
+        self.router.record_llm(local_node, confidence, next_node)
+        return next_node
+    
+    def _audit_local_route(self, current_node_id, user_input, local_node, confidence):
+        """Record whether the LLM agrees with a confident local routing decision"""
+        llm_node = self._select_node_by_llm(current_node_id, user_input)
+        if llm_node is not None:
+            self.router.record_llm(local_node, confidence, llm_node, audit=True)
+    
+    def _node_selection_messages(self, current_node_id, user_input):
+        """Build the messages asking the LLM to pick the next node"""
         
         # Create a prompt for the LLM to decide the next node
         system_prompt = f"""
@@ -44,6 +218,7 @@ class Workflow:
         Current stage: {current_node_id}
         User input: "{user_input}"
         
+        If the user mentions suicide, self-harm or harming others, select "crisis".
         If the user's request would benefit from using specialized tools or assessments, select "tool_use".
         Otherwise, choose the most appropriate conversation stage.
         
@@ -53,30 +228,52 @@ class Workflow:
         # Add the current conversation context
         user_prompt = f"Current node: {current_node_id}\nUser message: {user_input}\nWhich node should I go to next?"
         log('INFO', f"[current node]: {user_prompt}")
-        # Call the LLM
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+    
+    def _parse_selected_node(self, response):
+        """Validate the LLM's node choice; None if it is not a known node"""
+        next_node = response.strip().lower()
+        log('INFO', f"[next node]: {next_node}")
+        return next_node if next_node in self.nodes else None
+    
+    def _select_node_by_llm(self, current_node_id, user_input):
+        """Use LLM to intelligently select the next appropriate node; None if it fails"""
         try:
             response = self.client.generate_response(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
+                messages=self._node_selection_messages(current_node_id, user_input),
                 temperature=0.2  # Low temperature for more deterministic responses
             )
-            
-            next_node = response.strip().lower()
-            
-            # Validate the node exists
-            log('INFO', f"[next node]: {next_node}")
-            if next_node in self.nodes:
-                return next_node
-            else:
-                # Fallback to default logic if LLM returns invalid node
-                return self.nodes[current_node_id]["next"]
+            return self._parse_selected_node(response)
                 
         except Exception as e:
-            # Fallback to default logic if LLM call fails
             print(f"Error calling LLM: {e}")
-            return self.nodes[current_node_id]["next"]
+            return None
+    
+    def _node_knowledge_bases(self, node_id):
+        """Knowledge bases searched for a node; all of them if the node doesn't specify any"""
+        knowledge_bases = self.nodes[node_id].get("knowledge", [])
+        if not knowledge_bases:
+            # If no specific knowledge bases are defined, perform a general search
+            knowledge_bases = list(self.knowledge_manager.knowledge_bases.keys())
+        return knowledge_bases
+    
+    def _node_knowledge_filter(self, node_id):
+        """Metadata filter restricting a node's knowledge search, or None"""
+        return self.nodes[node_id].get("knowledge_filter")
+    
+    def _format_knowledge(self, node_id, relevant_docs):
+        """Render retrieved documents as the knowledge block of the system prompt"""
+        knowledge_context = ""
+        if relevant_docs:
+            knowledge_context = "\n\nRelevant information from knowledge base (your answer must prioritize the use of knowledge):\n"
+            for i, doc in enumerate(relevant_docs):
+                knowledge_context += f"{i+1}. {doc['content']}\n"
+            log('INFO', f"Retrieved knowledge for node {node_id}: {len(relevant_docs)} documents")
+            log('INFO', f"Knowledge context: {knowledge_context}")
+        return knowledge_context
     
     def retrieve_relevant_knowledge(self, node_id: str, user_input: str) -> str:
         """Retrieve knowledge relevant to the current node and user input"""
@@ -86,55 +283,56 @@ class Workflow:
         knowledge_context = ""
         try:
             # Get knowledge bases specified for this node
-            node_info = self.nodes[node_id]
-            knowledge_bases = node_info.get("knowledge", [])
+            knowledge_bases = self._node_knowledge_bases(node_id)
+            knowledge_filter = self._node_knowledge_filter(node_id)
             
-            if not knowledge_bases:
-                # If no specific knowledge bases are defined, perform a general search
-                relevant_docs = self.knowledge_manager.search(user_input, top_k=2)
+            prefetch, self._prefetch = self._prefetch, None
+            if prefetch and prefetch[0] == user_input:
+                # Use the candidates fetched during routing with this node's filter,
+                # restricted to this node's knowledge bases
+                relevant_docs = self.knowledge_manager.merge_hits(
+                    prefetch[2].result()[self._filter_key(knowledge_filter)],
+                    knowledge_bases,
+                    top_k=KNOWLEDGE_TOP_K
+                )
             else:
                 # Otherwise search only in the specified knowledge bases
                 relevant_docs = self.knowledge_manager.search_in_bases(
                     user_input, 
                     knowledge_bases,
-                    top_k=2
+                    top_k=KNOWLEDGE_TOP_K,
+                    filter=knowledge_filter
                 )
                 
-            if relevant_docs:
-                knowledge_context = "\n\nRelevant information from knowledge base (your answer must prioritize the use of knowledge):\n"
-                for i, doc in enumerate(relevant_docs):
-                    knowledge_context += f"{i+1}. {doc['content']}\n"
-                log('INFO', f"Retrieved knowledge for node {node_id}: {len(relevant_docs)} documents")
-                log('INFO', f"Knowledge context: {knowledge_context}")
+            knowledge_context = self._format_knowledge(node_id, relevant_docs)
         except Exception as e:
             print(f"Error retrieving knowledge: {e}")
             
         return knowledge_context
     
-    def generate_response_with_llm(self, node_id, user_input):
-        """Use LLM to generate a dynamic response based on the node and user input"""
+    def _prepare_llm_messages(self, node_id, user_input, knowledge_context=None):
+        """
+        Record the user input and build the messages for a node's LLM response.
+        
+        Knowledge is retrieved here unless the caller already did (knowledge_context).
+        """
         
         # Add current exchange to conversation history
         if user_input:
             self.conversation_history.append({"role": "user", "content": user_input})
         
-        # Create system prompt based on current node
-        node_info = self.nodes[node_id]
-        system_prompt = get_assistant_prompt(node_id, node_info)
-        
         # Retrieve relevant knowledge
-        knowledge_context = self.retrieve_relevant_knowledge(node_id, user_input)
+        if knowledge_context is None:
+            knowledge_context = self.retrieve_relevant_knowledge(node_id, user_input)
         
-        # Add knowledge to system prompt if available
-        if knowledge_context:
-            system_prompt += knowledge_context
-            
-        # Prepare messages for the API call
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Include relevant conversation history (last 18 exchanges)
-        for item in self.conversation_history[-18:]:
-            messages.append(item)
+        # Prepare messages for the API call: the node's precompiled system prompt, as much
+        # conversation history as the budget allows, and the knowledge for this turn
+        return self.context.build(NODE_PROMPTS[node_id]["assistant"], self.conversation_history,
+                                  context=knowledge_context)
+    
+    def generate_response_with_llm(self, node_id, user_input):
+        """Use LLM to generate a dynamic response based on the node and user input"""
+        messages = self._prepare_llm_messages(node_id, user_input)
             
         try:
             response = self.client.generate_response(
@@ -154,6 +352,33 @@ class Workflow:
             print(f"Error generating LLM response: {e}")
             return self._generate_template_response(node_id, user_input)
     
+    def generate_response_with_llm_stream(self, node_id, user_input):
+        """Streaming variant of generate_response_with_llm, yielding the reply as it is generated"""
+        messages = self._prepare_llm_messages(node_id, user_input)
+        
+        chunks = []
+        try:
+            for chunk in self.client.stream_response(messages=messages, temperature=0.7):
+                # Drop leading whitespace, as the non-streaming path strips the response
+                if not chunks:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Error generating LLM response: {e}")
+            if not chunks:
+                # Fallback to template-based response
+                yield self._generate_template_response(node_id, user_input)
+                return
+        
+        llm_response = "".join(chunks).strip()
+        log('DEBUG', f"LLM response: {llm_response}")
+        
+        # Add assistant response to history
+        self.conversation_history.append({"role": "assistant", "content": llm_response})
+    
     def _generate_template_response(self, node_id, user_input):
         """Fallback method using template-based responses"""
         node = self.nodes[node_id]
@@ -164,6 +389,8 @@ class Workflow:
         elif node_id == "support":
             strategies = "practicing mindfulness, talking with friends, and engaging in physical activity"
             return node["prompt"].replace("{strategies}", strategies)
+        elif node_id == "crisis":
+            return node["prompt"].replace("{resources}", "call 119 or your local emergency number")
         else:
             return node["prompt"]
     
@@ -192,35 +419,27 @@ class Workflow:
             # Basic template response
             return node_info["prompt"]
 
+    def execute_node_stream(self, node_id, user_input=None):
+        """Execute a node in the workflow, yielding the response text as it is generated"""
+        if node_id == "tool_use":
+            # Tool calls are only recognizable once the whole reply is in, so this node is not streamed
+            yield self.generate_response_with_tools(node_id, user_input)
+        elif user_input:
+            yield from self.generate_response_with_llm_stream(node_id, user_input)
+        else:
+            yield self.execute_node(node_id, user_input)
+
     def generate_response_with_tools(self, node_id, user_input):
         """Generate a response with potential tool usage"""
         # Add current exchange to conversation history
         if user_input:
             self.conversation_history.append({"role": "user", "content": user_input})
         
-        # Create system prompt based on current node
-        node_info = self.nodes[node_id]
-        system_prompt = get_assistant_prompt(node_id, node_info)
-        
-        # Add tool description if tools are available for this node
-        if "tools" in node_info and node_info["tools"]:
-            available_tools = {tool: AVAILABLE_TOOLS[tool] for tool in node_info["tools"] if tool in AVAILABLE_TOOLS}
-            if available_tools:
-                tools_description = json.dumps(available_tools, indent=2)
-                system_prompt += f"\n\nYou have access to the following tools:\n{tools_description}\n"
-                system_prompt += "\nIf you believe a tool would help address the user's needs, you can use it by responding with:\n"
-                system_prompt += '{"tool": "tool_name", "parameters": {"param1": "value1", ...}}'
-                system_prompt += "\nBe warm, empathetic, and conversational - avoid clinical or generic questions\n"
-                system_prompt += "\nOnly use tools when they would clearly benefit the conversation."
-        
-        # Knowledge context handling remains the same as before
-        # [...]
-        # Send messages to LLM
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Include relevant conversation history (last 8 exchanges)
-        for item in self.conversation_history[-18:]:
-            messages.append(item)
+        # Node prompt with its tool descriptions, compiled once at startup
+        system_prompt = NODE_PROMPTS[node_id]["tools"]
+        
+        # Send messages to LLM, with as much conversation history as the budget allows
+        messages = self.context.build(system_prompt, self.conversation_history)
             
         try:
             response = self.client.generate_response(
@@ -282,16 +501,13 @@ class Workflow:
             assessment_info = result["result"].get("assessment_info", {})
             guidance = result["result"].get("guidance", "")
             
-            messages = [
-                {"role": "system", "content": f"You are conducting a psychological assessment. {guidance}\n\n"
-                                             f"Assessment: {assessment_info.get('name')}\n"
-                                             f"Description: {assessment_info.get('description')}\n"
-                                             f"Begin by introducing the assessment and its purpose, then ask the first question."}
-            ]
+            system_prompt = (f"You are conducting a psychological assessment. {guidance}\n\n"
+                             f"Assessment: {assessment_info.get('name')}\n"
+                             f"Description: {assessment_info.get('description')}\n"
+                             f"Begin by introducing the assessment and its purpose, then ask the first question.")
             
             # Include recent conversation history
-            for item in self.conversation_history[-4:]:
-                messages.append(item)
+            messages = self.context.build(system_prompt, self.conversation_history)
             
             # Generate assessment introduction and first question
             response = self.client.generate_response(
@@ -311,17 +527,14 @@ class Workflow:
         
         # For continuing an assessment that's in progress
         if hasattr(self, 'in_assessment') and self.in_assessment:
-            messages = [
-                {"role": "system", "content": "You are continuing a psychological assessment. "
-                                             "Review the user's response and either:\n"
-                                             "1. Ask the next question in the sequence if more questions remain\n"
-                                             "2. Provide a thoughtful analysis if all questions have been answered\n\n"
-                                             "Do not show numerical scores. Focus on patterns and helpful insights."}
-            ]
+            system_prompt = ("You are continuing a psychological assessment. "
+                             "Review the user's response and either:\n"
+                             "1. Ask the next question in the sequence if more questions remain\n"
+                             "2. Provide a thoughtful analysis if all questions have been answered\n\n"
+                             "Do not show numerical scores. Focus on patterns and helpful insights.")
             
-            # Include more conversation history for assessment context
-            for item in self.conversation_history[-12:]:
-                messages.append(item)
+            # Include conversation history for assessment context
+            messages = self.context.build(system_prompt, self.conversation_history)
             
             response = self.client.generate_response(
                 messages=messages,
@@ -346,16 +559,13 @@ class Workflow:
             return response
         
         # For other tools, generate a response based on tool results
-        messages = [
-            {"role": "system", "content": "You are a helpful assistant. The system has just executed a tool. "
-                                         "Formulate a helpful response based on the tool results. "
-                                         "Make your response conversational and friendly, as if you're having a natural "
-                                         "dialogue. Don't mention that you used a tool unless necessary."}
-        ]
+        system_prompt = ("You are a helpful assistant. The system has just executed a tool. "
+                         "Formulate a helpful response based on the tool results. "
+                         "Make your response conversational and friendly, as if you're having a natural "
+                         "dialogue. Don't mention that you used a tool unless necessary.")
         
         # Include relevant conversation history
-        for item in self.conversation_history[-6:]:
-            messages.append(item)
+        messages = self.context.build(system_prompt, self.conversation_history)
         
         # Generate response
         try:
@@ -378,6 +588,176 @@ class Workflow:
             # Simple fallback
             return "Based on the information I've gathered, I can provide some insights about your situation. Would you like to discuss specific strategies or concerns?"
 
+    # Asyncio API: the same turn logic with non-blocking model calls, so many sessions can
+    # share one event loop. Knowledge search is CPU-bound NumPy work and runs in a worker thread.
+    
+    def _aprefetch_knowledge(self, user_input):
+        """Async counterpart of prefetch_knowledge, scheduling asyncio tasks"""
+        if not self.knowledge_manager or not user_input:
+            return
+        
+        searches = self._prefetch_searches()
+        embedding_task = asyncio.ensure_future(self.knowledge_manager.embedding_model.aget_embedding(user_input))
+        
+        async def collect():
+            hits = await asyncio.gather(*(self._acollect_hits(user_input, kb_names, embedding_task, knowledge_filter)
+                                          for kb_names, knowledge_filter in searches.values()))
+            return dict(zip(searches, hits))
+        
+        self._async_prefetch = (user_input, embedding_task, asyncio.ensure_future(collect()))
+    
+    async def _acollect_hits(self, user_input, kb_names, embedding, knowledge_filter=None):
+        """Collect knowledge hits once the awaitable query embedding is ready, falling back to keywords"""
+        try:
+            query_embedding = await embedding
+        except Exception as e:
+            log('WARNING', f"Error embedding user input, using keyword search: {e}")
+            return await asyncio.to_thread(
+                self.knowledge_manager.collect_hits, user_input, kb_names, KNOWLEDGE_TOP_K,
+                mode="lexical", filter=knowledge_filter
+            )
+        return await asyncio.to_thread(
+            self.knowledge_manager.collect_hits, user_input, kb_names, KNOWLEDGE_TOP_K, query_embedding,
+            filter=knowledge_filter
+        )
+    
+    async def _aprefetched_embedding(self, user_input):
+        """Async counterpart of _prefetched_embedding"""
+        if not self._async_prefetch or self._async_prefetch[0] != user_input:
+            return None
+        try:
+            return await self._async_prefetch[1]
+        except Exception as e:
+            log('WARNING', f"Error embedding user input: {e}")
+            return None
+    
+    async def _aselect_node_by_llm(self, current_node_id, user_input):
+        """Async version of _select_node_by_llm"""
+        try:
+            response = await self.async_client.generate_response(
+                messages=self._node_selection_messages(current_node_id, user_input),
+                temperature=0.2
+            )
+            return self._parse_selected_node(response)
+        except Exception as e:
+            print(f"Error calling LLM: {e}")
+            return None
+    
+    async def aselect_node(self, current_node_id, user_input):
+        """Async version of select_node_with_llm"""
+        self._aprefetch_knowledge(user_input)
+        
+        llm_task = None
+        if self._async_prefetch and self._async_prefetch[0] == user_input and self.router.embedding_model is not None:
+            done, _ = await asyncio.wait([self._async_prefetch[1]], timeout=self.router.speculation_delay)
+            if not done and self._needs_speculative_route(current_node_id, user_input):
+                llm_task = asyncio.ensure_future(self._aselect_node_by_llm(current_node_id, user_input))
+        
+        local_node, confidence = await self.router.aroute(
+            current_node_id, user_input, query_embedding=await self._aprefetched_embedding(user_input)
+        )
+        if confidence >= self.router.threshold:
+            log('INFO', f"[next node]: {local_node} (local router, confidence {confidence:.2f})")
+            self.router.record_local()
+            if llm_task is not None:
+                llm_task.cancel()
+            if random.random() < self.router.audit_rate:
+                _audit_executor.submit(self._audit_local_route, current_node_id, user_input, local_node, confidence)
+            return local_node
+        
+        if llm_task is not None:
+            next_node = await llm_task
+        else:
+            next_node = await self._aselect_node_by_llm(current_node_id, user_input)
+        
+        if next_node is None:
+            return self.nodes[current_node_id]["next"]
+        self.router.record_llm(local_node, confidence, next_node)
+        return next_node
+    
+    async def aretrieve_relevant_knowledge(self, node_id: str, user_input: str) -> str:
+        """Async version of retrieve_relevant_knowledge"""
+        if not self.knowledge_manager or not user_input:
+            return ""
+        
+        knowledge_context = ""
+        try:
+            knowledge_bases = self._node_knowledge_bases(node_id)
+            knowledge_filter = self._node_knowledge_filter(node_id)
+            
+            prefetch, self._async_prefetch = self._async_prefetch, None
+            if prefetch and prefetch[0] == user_input:
+                hits_by_base = (await prefetch[2])[self._filter_key(knowledge_filter)]
+            else:
+                embedding = prefetch[1] if prefetch and prefetch[0] == user_input \
+                    else self.knowledge_manager.embedding_model.aget_embedding(user_input)
+                hits_by_base = await self._acollect_hits(user_input, knowledge_bases, embedding, knowledge_filter)
+            
+            relevant_docs = self.knowledge_manager.merge_hits(hits_by_base, knowledge_bases, top_k=KNOWLEDGE_TOP_K)
+            knowledge_context = self._format_knowledge(node_id, relevant_docs)
+        except Exception as e:
+            print(f"Error retrieving knowledge: {e}")
+        
+        return knowledge_context
+    
+    async def agenerate_response_with_llm(self, node_id, user_input):
+        """Async version of generate_response_with_llm"""
+        knowledge_context = await self.aretrieve_relevant_knowledge(node_id, user_input)
+        messages = self._prepare_llm_messages(node_id, user_input, knowledge_context)
+        
+        try:
+            response = await self.async_client.generate_response(messages=messages, temperature=0.7)
+            log('DEBUG', f"LLM response: {response}")
+            llm_response = response.strip()
+            
+            self.conversation_history.append({"role": "assistant", "content": llm_response})
+            return llm_response
+            
+        except Exception as e:
+            print(f"Error generating LLM response: {e}")
+            return self._generate_template_response(node_id, user_input)
+    
+    async def agenerate_response_with_llm_stream(self, node_id, user_input):
+        """Async version of generate_response_with_llm_stream"""
+        knowledge_context = await self.aretrieve_relevant_knowledge(node_id, user_input)
+        messages = self._prepare_llm_messages(node_id, user_input, knowledge_context)
+        
+        chunks = []
+        try:
+            async for chunk in self.async_client.stream_response(messages=messages, temperature=0.7):
+                if not chunks:
+                    chunk = chunk.lstrip()
+                    if not chunk:
+                        continue
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Error generating LLM response: {e}")
+            if not chunks:
+                yield self._generate_template_response(node_id, user_input)
+                return
+        
+        llm_response = "".join(chunks).strip()
+        log('DEBUG', f"LLM response: {llm_response}")
+        self.conversation_history.append({"role": "assistant", "content": llm_response})
+    
+    async def aexecute_node(self, node_id, user_input=None):
+        """Async version of execute_node"""
+        if node_id == "tool_use":
+            # The multi-step tool flow keeps its blocking implementation, off the event loop
+            return await asyncio.to_thread(self.generate_response_with_tools, node_id, user_input)
+        if user_input:
+            return await self.agenerate_response_with_llm(node_id, user_input)
+        return self.execute_node(node_id, user_input)
+    
+    async def aexecute_node_stream(self, node_id, user_input=None):
+        """Async version of execute_node_stream"""
+        if node_id == "tool_use" or not user_input:
+            yield await self.aexecute_node(node_id, user_input)
+        else:
+            async for chunk in self.agenerate_response_with_llm_stream(node_id, user_input):
+                yield chunk
+
     def get_next_node(self, current_node_id, user_input=None):
         """Get the ID of the next node in the workflow, using LLM if input is provided"""
         try:
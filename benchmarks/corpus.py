@@ -0,0 +1,79 @@
+from collections import Counter
+from typing import Any, Dict, List
+import numpy as np
+from knowledge.documents import load_knowledge_documents
+from knowledge.lexical import tokenize
+from prompts.knowledge import AVAILABLE_KNOWLEDGE_BASES
+
+# Length of a synthetic document and of a query, in words
+DOCUMENT_WORDS = (20, 80)
+QUERY_WORDS = (3, 8)
+
+# Synthetic documents are spread over this many categories per knowledge base
+CATEGORIES = 12
+
+def shipped_corpus() -> Dict[str, List[Dict[str, Any]]]:
+    """Documents of every knowledge base in knowledge/data, keyed by knowledge base name."""
+    corpus = {}
+    for kb_name, kb_info in AVAILABLE_KNOWLEDGE_BASES.items():
+        path = kb_info.get('path', '')
+        corpus[kb_name] = load_knowledge_documents(kb_name, path)
+    return corpus
+
+def synthetic_corpus(size: int, seed: int = 0) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Generate documents that look like the shipped ones to the retrievers.
+
+    Words are drawn from the shipped vocabulary with a Zipf-like distribution, so term
+    statistics (posting list lengths, n-gram overlap) resemble real passages at any size.
+
+    Args:
+        size: Total number of documents
+        seed: Random seed; the same seed gives the same corpus
+
+    Returns:
+        Documents with 'id', 'content' and 'metadata' ('source' and 'category'), keyed
+        by knowledge base name like shipped_corpus
+    """
+    counts = Counter(word for documents in shipped_corpus().values()
+                     for document in documents for word in tokenize(document['content']))
+    vocabulary = np.array([word for word, _ in counts.most_common()])
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(DOCUMENT_WORDS[0], DOCUMENT_WORDS[1] + 1, size=size)
+    words = vocabulary[rng.choice(len(vocabulary), size=int(lengths.sum()), p=weights / weights.sum())]
+    ends = np.cumsum(lengths)
+
+    kb_names = list(AVAILABLE_KNOWLEDGE_BASES)
+    corpus = {kb_name: [] for kb_name in kb_names}
+    for i, end in enumerate(ends):
+        kb_name = kb_names[i % len(kb_names)]
+        corpus[kb_name].append({
+            "id": f"synthetic:{i}",
+            "content": " ".join(words[end - lengths[i]:end]),
+            "metadata": {"source": kb_name, "category": f"category-{i // len(kb_names) % CATEGORIES}"}
+        })
+    return corpus
+
+def sample_queries(corpus: Dict[str, List[Dict[str, Any]]], count: int, seed: int = 0) -> List[str]:
+    """
+    Sample queries as short runs of words taken from random documents of a corpus.
+
+    Args:
+        corpus: Documents keyed by knowledge base name
+        count: Number of queries
+        seed: Random seed
+
+    Returns:
+        Query texts
+    """
+    documents = [document for documents in corpus.values() for document in documents]
+    rng = np.random.default_rng(seed)
+    queries = []
+    for index in rng.integers(0, len(documents), size=count):
+        words = documents[index]['content'].split()
+        length = min(len(words), int(rng.integers(QUERY_WORDS[0], QUERY_WORDS[1] + 1)))
+        start = int(rng.integers(0, len(words) - length + 1))
+        queries.append(" ".join(words[start:start + length]))
+    return queries
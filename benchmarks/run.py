@@ -0,0 +1,309 @@
+import os
+import gc
+import sys
+import json
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+from typing import Any, Callable, Dict, List, Optional, Sequence
+import numpy as np
+from benchmarks.corpus import shipped_corpus, synthetic_corpus, sample_queries
+
+# Benchmarks in run order; the retrieval ones run once per corpus size
+RETRIEVAL_BENCHMARKS = ("kb_build", "kb_search", "kb_search_lexical", "manager_search")
+BENCHMARKS = RETRIEVAL_BENCHMARKS + ("routing", "history")
+
+DEFAULT_SIZES = ["shipped", "1000", "10000", "100000"]
+DEFAULT_OUTPUT = "benchmarks/results/latest.json"
+DEFAULT_BASELINE = "benchmarks/baseline.json"
+
+# Untimed calls before measuring, so one-off work (index training, first allocations) is excluded
+WARMUP_CALLS = 5
+
+# Conversation lengths, in messages, for the history benchmark, and saved conversations listed
+HISTORY_TURNS = (10, 100, 1000)
+HISTORY_FILES = 100
+
+# Metrics compared against the baseline; for all of them higher is worse
+COMPARED_METRICS = ("p50_ms", "p90_ms", "add_s", "embed_s", "memory_bytes")
+
+def _rss_bytes() -> Optional[int]:
+    """Resident memory of this process, None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_bytes() -> Optional[int]:
+    """Peak resident memory of this process, None where unavailable"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def measure(call: Callable[[Any], Any], inputs: Sequence[Any]) -> Dict[str, float]:
+    """
+    Time one call per input.
+
+    Args:
+        call: Function under test, called with each input
+        inputs: Inputs; the first WARMUP_CALLS are also called untimed beforehand
+
+    Returns:
+        Number of calls and latency statistics in milliseconds
+    """
+    for item in inputs[:WARMUP_CALLS]:
+        call(item)
+    gc.collect()
+    latencies = np.empty(len(inputs))
+    for i, item in enumerate(inputs):
+        start = time.perf_counter()
+        call(item)
+        latencies[i] = time.perf_counter() - start
+    latencies *= 1000
+    return {
+        "calls": len(inputs),
+        "mean_ms": round(float(latencies.mean()), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 4),
+        "p90_ms": round(float(np.percentile(latencies, 90)), 4),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 4),
+        "max_ms": round(float(latencies.max()), 4)
+    }
+
+def _build_base(embedding_model, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build and embed a knowledge base; returns it with the build time and memory"""
+    from knowledge.base import KnowledgeBase
+
+    gc.collect()
+    rss = _rss_bytes()
+    start = time.perf_counter()
+    kb = KnowledgeBase(embedding_model)
+    for document in documents:
+        kb.add_document(document)
+    added = time.perf_counter()
+    kb.warm_up()
+    embedded = time.perf_counter()
+    gc.collect()
+    return {
+        "kb": kb,
+        "documents": len(documents),
+        "add_s": round(added - start, 4),
+        "embed_s": round(embedded - added, 4),
+        "index_bytes": kb.vectors.nbytes,
+        "memory_bytes": _rss_bytes() - rss if rss is not None else None
+    }
+
+def run_retrieval(manager, case: str, corpus: Dict[str, List[Dict[str, Any]]], queries: List[str],
+                  top_k: int, benchmarks: Sequence[str]) -> List[Dict[str, Any]]:
+    """
+    Benchmark retrieval on one corpus.
+
+    The knowledge base benchmarks search one knowledge base holding the whole corpus;
+    manager_search searches all knowledge bases of the corpus through the manager, as
+    the workflow does.
+
+    Returns:
+        One result per benchmark
+    """
+    results = []
+    documents = [document for base_documents in corpus.values() for document in base_documents]
+    if {"kb_build", "kb_search", "kb_search_lexical"} & set(benchmarks):
+        build = _build_base(manager.embedding_model, documents)
+        kb = build.pop("kb")
+        if "kb_build" in benchmarks:
+            results.append(dict(benchmark="kb_build", case=case, **build))
+        if "kb_search" in benchmarks:
+            results.append(dict(benchmark="kb_search", case=case,
+                                **measure(lambda query: kb.search(query, top_k), queries)))
+        if "kb_search_lexical" in benchmarks:
+            results.append(dict(benchmark="kb_search_lexical", case=case,
+                                **measure(lambda query: kb.search_lexical(query, top_k), queries)))
+        del kb
+
+    if "manager_search" in benchmarks:
+        saved = manager.knowledge_bases
+        manager.knowledge_bases = {kb_name: _build_base(manager.embedding_model, base_documents)["kb"]
+                                   for kb_name, base_documents in corpus.items()}
+        kb_names = list(manager.knowledge_bases)
+        results.append(dict(benchmark="manager_search", case=case, mode=manager.search_mode,
+                            **measure(lambda query: manager.search_in_bases(query, kb_names, top_k=top_k), queries)))
+        manager.knowledge_bases = saved
+    return results
+
+def run_routing(embedding_model, calls: int) -> List[Dict[str, Any]]:
+    """Benchmark local routing of the router's example messages from every node"""
+    from agents.router import NodeRouter
+    from prompts.agent import AGENT_PROMPT
+    from prompts.router import ROUTER_EXAMPLES
+
+    router = NodeRouter(AGENT_PROMPT, embedding_model)
+    messages = [message for examples in ROUTER_EXAMPLES.values() for message in examples]
+    node_ids = list(AGENT_PROMPT)
+    inputs = [(node_ids[i % len(node_ids)], messages[i % len(messages)]) for i in range(calls)]
+    return [dict(benchmark="routing", case=f"nodes={len(node_ids)}",
+                 **measure(lambda item: router.route(*item), inputs))]
+
+def run_history(directory: str, calls: int, queries: List[str]) -> List[Dict[str, Any]]:
+    """Benchmark saving, loading and listing conversations in a scratch directory"""
+    from history.record import save_conversation, load_conversation, list_conversations
+
+    results = []
+    for turns in HISTORY_TURNS:
+        conversation = [{"role": "user" if i % 2 == 0 else "assistant", "content": queries[i % len(queries)] * 4}
+                        for i in range(turns)]
+        filename = os.path.join(directory, f"conversation_{turns}.json")
+        results.append(dict(benchmark="history", case=f"save turns={turns}",
+                            **measure(lambda _: save_conversation(conversation, filename), range(calls))))
+        results.append(dict(benchmark="history", case=f"load turns={turns}",
+                            **measure(lambda _: load_conversation(filename), range(calls))))
+
+    listing = os.path.join(directory, "listing")
+    os.makedirs(listing)
+    for i in range(HISTORY_FILES):
+        save_conversation(conversation[:HISTORY_TURNS[0]], os.path.join(listing, f"conversation_{i:04d}.json"))
+    results.append(dict(benchmark="history", case=f"list files={HISTORY_FILES}",
+                        **measure(lambda _: list_conversations(listing), range(calls))))
+    return results
+
+def compare(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+            tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Compare results with a baseline run.
+
+    Args:
+        results: Results of this run
+        baseline: Results of the baseline run
+        tolerance: Relative slowdown or growth above which a metric counts as a regression
+
+    Returns:
+        One row per metric present in both runs, with the relative change and whether
+        it is a regression
+    """
+    previous = {(result["benchmark"], result["case"]): result for result in baseline}
+    rows = []
+    for result in results:
+        before = previous.get((result["benchmark"], result["case"]))
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if not result.get(metric) or not before.get(metric):
+                continue
+            change = result[metric] / before[metric] - 1
+            rows.append({
+                "benchmark": result["benchmark"],
+                "case": result["case"],
+                "metric": metric,
+                "baseline": before[metric],
+                "current": result[metric],
+                "change": round(change, 3),
+                "regression": change > tolerance
+            })
+    return rows
+
+def _print_results(results: List[Dict[str, Any]]):
+    """Print results as a table"""
+    print(f"{'benchmark':<20}{'case':<20}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'build s':>10}{'memory MB':>11}")
+    for result in results:
+        build = result.get("add_s", 0) + result.get("embed_s", 0) if "add_s" in result else None
+        memory = result.get("memory_bytes")
+        cells = [result.get("p50_ms"), result.get("p90_ms"), result.get("p99_ms"), build]
+        line = f"{result['benchmark']:<20}{result['case']:<20}" + "".join(
+            f"{cell:>10.3f}" if cell is not None else f"{'':>10}" for cell in cells)
+        print(line + (f"{memory / 2**20:>11.1f}" if memory is not None else ""))
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: python -m benchmarks.run [--sizes shipped 1000] [--only kb_search]"""
+    parser = argparse.ArgumentParser(description="Offline latency and memory benchmarks of retrieval, routing and history I/O")
+    parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES,
+                        help="corpora to search: 'shipped' for knowledge/data or a number of synthetic documents (default: %(default)s)")
+    parser.add_argument("--only", nargs="+", choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help="benchmarks to run (default: all)")
+    parser.add_argument("--queries", type=int, default=200, help="timed calls per benchmark (default: %(default)s)")
+    parser.add_argument("--top-k", type=int, default=3, help="results per search (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic corpora and queries (default: %(default)s)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="where to write the results (default: %(default)s)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="results to compare with, if the file exists (default: %(default)s)")
+    parser.add_argument("--save-baseline", action="store_true", help="also store the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative slowdown reported as a regression (default: %(default)s)")
+    args = parser.parse_args(argv)
+    sizes = [size if size == "shipped" else int(size) for size in args.sizes]
+
+    with tempfile.TemporaryDirectory(prefix="mindio-bench-") as workdir:
+        # Stub models: the local hashed embedder needs no network and is deterministic; the
+        # persistent cache and compiled index point into the scratch directory
+        os.environ["EMBEDDING_PROVIDER"] = "local"
+        os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embeddings.db")
+        os.environ["KNOWLEDGE_INDEX_PATH"] = os.path.join(workdir, "index")
+        from knowledge.manager import KnowledgeManager
+        manager = KnowledgeManager()
+        manager.wait()
+
+        results = []
+        for size in sizes:
+            corpus = shipped_corpus() if size == "shipped" else synthetic_corpus(size, args.seed)
+            queries = sample_queries(corpus, args.queries, args.seed)
+            documents = sum(len(base_documents) for base_documents in corpus.values())
+            print(f"Benchmarking retrieval on {documents} {'shipped' if size == 'shipped' else 'synthetic'} documents...",
+                  file=sys.stderr)
+            results += run_retrieval(manager, str(size), corpus, queries, args.top_k, args.only)
+            del corpus
+
+        if "routing" in args.only:
+            results += run_routing(manager.embedding_model, args.queries)
+        if "history" in args.only:
+            results += run_history(workdir, args.queries, sample_queries(shipped_corpus(), 100, args.seed))
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count()
+        },
+        "config": {
+            "embedding_model": manager.embedding_model.model,
+            "dimensions": manager.embedding_model.dimensions,
+            "search_mode": manager.search_mode,
+            "index": os.getenv("KNOWLEDGE_INDEX", "ivf"),
+            "storage": os.getenv("KNOWLEDGE_VECTOR_STORAGE", "float32"),
+            "top_k": args.top_k
+        },
+        "peak_memory_bytes": _peak_rss_bytes(),
+        "results": results
+    }
+    _print_results(results)
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        report["baseline"] = {"path": args.baseline, "created": baseline.get("created")}
+        report["comparison"] = compare(results, baseline["results"], args.tolerance)
+        regressions = [row for row in report["comparison"] if row["regression"]]
+        print(f"\nCompared with {args.baseline} ({baseline.get('created')}): "
+              f"{len(regressions)} regressions above {args.tolerance:.0%}")
+        for row in regressions:
+            print(f"  {row['benchmark']} {row['case']} {row['metric']}: {row['baseline']} -> {row['current']} "
+                  f"({row['change']:+.0%})")
+
+    for path in [args.output] + ([args.baseline] if args.save_baseline else []):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Results written to {path}")
+
+    # A non-zero exit status lets CI fail on regressions
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,10 @@
-from agents.workflow import Workflow
-import os
-from history.record import save_conversation, get_conversation_by_index, list_conversations
+from utils import startup
+startup.begin()
+
+with startup.stage("import application"):
+    from agents.workflow import Workflow
+    import os
+    from history.record import save_conversation, get_conversation_by_index, list_conversations
 
 class CommandLineInterface:
     def __init__(self):
@@ -24,8 +28,14 @@ class CommandLineInterface:
             if hasattr(self.workflow, 'get_next_node'):
                 self.current_node = self.workflow.get_next_node(self.current_node)
 
-        # Execute current node and get result
-        result = self.workflow.execute_node(self.current_node, user_input)
+        # Execute current node, printing the response as it streams in
+        print("\nAssistant: ", end="", flush=True)
+        chunks = []
+        for chunk in self.workflow.execute_node_stream(self.current_node, user_input):
+            chunks.append(chunk)
+            print(chunk, end="", flush=True)
+        print()
+        result = "".join(chunks)
         
         # Add assistant response to history
         if result:
@@ -33,7 +43,6 @@ class CommandLineInterface:
                 'role': 'assistant',
                 'content': result
             })
-            print(f"\nAssistant: {result}")
         return True
     
     def display_greeting(self):
@@ -65,7 +74,7 @@ class CommandLineInterface:
             
         # Update conversation history
         self.conversation_history = loaded_history
-        self.workflow.conversation_history = loaded_history.copy()
+        self.workflow.set_conversation_history(loaded_history.copy())
         
         # Determine current node
         self._determine_current_node(loaded_history)
@@ -117,7 +126,9 @@ class CommandLineInterface:
         print("========================================\n")
         
         # Display greeting
-        self.display_greeting()
+        with startup.stage("greeting"):
+            self.display_greeting()
+        startup.report()
         
         # Main interaction loop
         running = True
@@ -151,7 +162,8 @@ class CommandLineInterface:
 
 def main():
     # Create and start interface
-    cli = CommandLineInterface()
+    with startup.stage("CommandLineInterface()"):
+        cli = CommandLineInterface()
     cli.start()
 
 if __name__ == "__main__":
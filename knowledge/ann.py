@@ -0,0 +1,243 @@
+import os
+from typing import List, Optional, Sequence, Tuple
+import numpy as np
+from knowledge.vector_store import VectorStore
+from utils.logger import log
+
+# Rows scored per matrix product when assigning vectors to clusters, to bound temporary memory
+ASSIGN_CHUNK_ROWS = 8192
+
+class IVFIndex(VectorStore):
+    """
+    Inverted-file approximate nearest-neighbour index over a VectorStore.
+
+    Rows are grouped into clusters by spherical k-means. A query is compared with the
+    cluster centroids first and only the rows of the nprobe closest clusters are scored,
+    so a search touches roughly nprobe / nlist of the corpus. Raising nprobe improves
+    recall at the cost of latency.
+
+    Below exact_threshold rows the index behaves exactly like VectorStore. Clusters are
+    trained on the first search or refresh() past the threshold and retrained once the
+    store has doubled in size; rows added in between are assigned to their nearest centroid.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+                 exact_threshold: Optional[int] = None, train_iterations: int = 8, seed: int = 0,
+                 storage: str = "float32"):
+        """
+        Initialize an empty index.
+
+        Args:
+            dimension: Embedding dimension (inferred from the first insert if omitted)
+            nlist: Number of clusters (defaults to about sqrt(rows) at training time)
+            nprobe: Clusters scanned per query (defaults to ANN_NPROBE)
+            exact_threshold: Row count below which searches are exhaustive (defaults to ANN_EXACT_THRESHOLD)
+            train_iterations: k-means iterations
+            seed: Seed for sampling training rows and initial centroids
+            storage: "float32", "float16" or "int8" (see VectorStore)
+        """
+        super().__init__(dimension, storage)
+        self.nlist = nlist
+        if nprobe is None:
+            nprobe = int(os.getenv("ANN_NPROBE", "16"))
+        self.nprobe = nprobe
+        if exact_threshold is None:
+            exact_threshold = int(os.getenv("ANN_EXACT_THRESHOLD", "20000"))
+        self.exact_threshold = exact_threshold
+        self.train_iterations = train_iterations
+        self._rng = np.random.default_rng(seed)
+
+        self._centroids = None       # (nlist, dimension) normalized cluster centres
+        self._trained_size = 0
+        self._assignments = np.zeros(0, dtype=np.int32)  # cluster of each row
+        self._lists: List[List[int]] = []                # rows of each cluster
+        self._list_arrays: List[Optional[np.ndarray]] = []  # cached np.array of each list
+
+    @property
+    def trained(self) -> bool:
+        """Whether clusters have been built."""
+        return self._centroids is not None
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        """Append vectors, assigning them to clusters if the index is trained."""
+        start = self._size
+        super().add(vectors)
+        if self.trained and self._size > start:
+            rows = np.arange(start, self._size)
+            self._assignments = np.concatenate([self._assignments, np.zeros(len(rows), dtype=np.int32)])
+            self._assign_rows(rows)
+
+    def set(self, rows: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """Overwrite rows in place and move them to their new nearest clusters."""
+        super().set(rows, vectors)
+        if self.trained:
+            rows = np.asarray(rows, dtype=np.int64)
+            for row in rows:
+                self._unlink(int(row))
+            self._assign_rows(rows)
+
+    def remove(self, row: int):
+        """Remove a row by moving the last row into its place, as VectorStore does."""
+        last = self._size - 1
+        super().remove(row)
+        if self.trained:
+            self._unlink(row)
+            if row != last:
+                cluster = int(self._assignments[last])
+                self._lists[cluster][self._lists[cluster].index(last)] = row
+                self._list_arrays[cluster] = None
+                self._assignments[row] = cluster
+            self._assignments = self._assignments[:last]
+
+    def clear(self):
+        """Remove all vectors and the trained clusters."""
+        super().clear()
+        self._reset_clusters()
+
+    def _reset_clusters(self):
+        """Forget the clusters; the next search past the threshold trains new ones."""
+        self._centroids = None
+        self._trained_size = 0
+        self._assignments = np.zeros(0, dtype=np.int32)
+        self._lists = []
+        self._list_arrays = []
+
+    def search(self, query: Sequence[float], top_k: int = 3,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the rows most similar to a query vector.
+
+        Exhaustive below exact_threshold rows, approximate above it. With candidate rows,
+        a subset below the threshold is scored exactly, and a larger one is intersected
+        with the probed clusters.
+
+        Args:
+            query: Query embedding
+            top_k: Number of rows to return
+            rows: Candidate rows (e.g. from a metadata filter); only these are scored
+
+        Returns:
+            (row indices, cosine scores), best match first
+        """
+        searched = self._size if rows is None else len(rows)
+        if searched < self.exact_threshold or top_k <= 0:
+            return super().search(query, top_k, rows)
+        self.refresh()
+
+        query = self._normalize(np.asarray(query, dtype=np.float32))
+        centroid_scores = self._centroids @ query
+        nprobe = min(self.nprobe, len(self._centroids))
+        probed = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        candidates = np.concatenate([self._list_array(int(cluster)) for cluster in probed])
+        if rows is not None:
+            candidates = np.intersect1d(candidates, rows)
+        if len(candidates) < top_k:
+            # Too few rows near the query; scanning everything is cheaper than probing more
+            return super().search(query, top_k, rows)
+
+        return self._select(candidates, self._score(query, candidates), query, top_k)
+
+    def refresh(self):
+        """Train the clusters if the store is past exact_threshold and untrained or doubled since."""
+        if self._size >= self.exact_threshold and (not self.trained or self._size >= 2 * self._trained_size):
+            self.train()
+
+    def train(self):
+        """Cluster the stored rows with spherical k-means and rebuild the inverted lists."""
+        if self._size == 0:
+            return
+        nlist = self.nlist or int(np.sqrt(self._size))
+        nlist = max(1, min(nlist, self._size))
+
+        # k-means on a sample is enough to place the centroids
+        sample_size = min(self._size, 32 * nlist)
+        sample = self.vectors(self._rng.choice(self._size, sample_size, replace=False))
+        centroids = sample[self._rng.choice(sample_size, nlist, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                # Restart empty clusters from random sample rows
+                sums[empty] = sample[self._rng.choice(sample_size, int(empty.sum()))]
+            centroids = self._normalize(sums)
+
+        self._centroids = centroids.astype(np.float32)
+        self._trained_size = self._size
+        self._assignments = np.zeros(self._size, dtype=np.int32)
+        self._lists = [[] for _ in range(nlist)]
+        self._list_arrays = [None] * nlist
+        self._assign_rows(np.arange(self._size))
+        log('INFO', f"[ann] trained {nlist} clusters on {sample_size} of {self._size} rows")
+
+    def clusters(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(centroids, cluster of each row) if trained, for saving and restore()."""
+        if not self.trained:
+            return None
+        return self._centroids, self._assignments
+
+    def restore(self, centroids: np.ndarray, assignments: np.ndarray):
+        """
+        Reuse clusters trained earlier (e.g. by the knowledge compiler) for the stored rows.
+        
+        Args:
+            centroids: Normalized cluster centres, shape (nlist, dimension)
+            assignments: Cluster of every stored row
+        """
+        if len(assignments) != self._size:
+            raise ValueError(f"Expected {self._size} cluster assignments, got {len(assignments)}")
+        self._centroids = np.asarray(centroids, dtype=np.float32)
+        self._trained_size = self._size
+        self._assignments = np.array(assignments, dtype=np.int32)
+        # Group rows by cluster with one sort instead of appending row by row
+        order = np.argsort(self._assignments, kind="stable")
+        bounds = np.searchsorted(self._assignments[order], np.arange(len(self._centroids) + 1))
+        self._lists = [order[bounds[i]:bounds[i + 1]].tolist() for i in range(len(self._centroids))]
+        self._list_arrays = [None] * len(self._centroids)
+
+    def _assign_rows(self, rows: np.ndarray):
+        """Put rows into the lists of their nearest centroids."""
+        for start in range(0, len(rows), ASSIGN_CHUNK_ROWS):
+            chunk = rows[start:start + ASSIGN_CHUNK_ROWS]
+            clusters = np.argmax(self.vectors(chunk) @ self._centroids.T, axis=1)
+            self._assignments[chunk] = clusters
+            for row, cluster in zip(chunk.tolist(), clusters.tolist()):
+                self._lists[cluster].append(row)
+                self._list_arrays[cluster] = None
+
+    def _unlink(self, row: int):
+        """Take a row out of its cluster's list."""
+        cluster = int(self._assignments[row])
+        self._lists[cluster].remove(row)
+        self._list_arrays[cluster] = None
+
+    def _list_array(self, cluster: int) -> np.ndarray:
+        """Rows of a cluster as an array, cached until the list changes."""
+        array = self._list_arrays[cluster]
+        if array is None:
+            array = np.asarray(self._lists[cluster], dtype=np.int64)
+            self._list_arrays[cluster] = array
+        return array
+
+
+def create_index(kind: Optional[str] = None, storage: Optional[str] = None) -> VectorStore:
+    """
+    Create the vector index used by knowledge bases.
+
+    Args:
+        kind: "exact" for exhaustive search or "ivf" for the approximate index
+            (defaults to KNOWLEDGE_INDEX)
+        storage: "float32", "float16" or "int8" (defaults to KNOWLEDGE_VECTOR_STORAGE)
+
+    Returns:
+        An empty index
+    """
+    kind = (kind or os.getenv("KNOWLEDGE_INDEX", "ivf")).lower()
+    storage = (storage or os.getenv("KNOWLEDGE_VECTOR_STORAGE", "float32")).lower()
+    if kind == "exact":
+        return VectorStore(storage=storage)
+    if kind == "ivf":
+        return IVFIndex(storage=storage)
+    raise ValueError(f"Unsupported knowledge index: {kind}")
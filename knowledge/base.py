@@ -1,34 +1,201 @@
 import os
-from typing import List, Dict, Any
+import hashlib
+import threading
+from typing import List, Dict, Any, Tuple, Optional
 import json
 import numpy as np
+from knowledge.vector_store import VectorStore
+from knowledge.ann import create_index
+from knowledge.lexical import BM25Index
+from knowledge.filters import MetadataFilter, MetadataIndex
+from utils.locks import ReadWriteLock
+from utils.logger import log
+
+def content_hash(content: str) -> str:
+    """Stable hash of document content, used for IDs and deduplication."""
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
 
 class KnowledgeBase:
     """Knowledge base for storing and retrieving information."""
     
-    def __init__(self, embedding_model=None):
+    def __init__(self, embedding_model=None, index: Optional[VectorStore] = None, storage: Optional[str] = None):
         """
         Initialize the knowledge base.
         
         Args:
             embedding_model: Model to generate embeddings for text
+            index: Empty vector index to use (defaults to the KNOWLEDGE_INDEX kind)
+            storage: Storage type of the default index: "float32", "float16" or "int8"
+                (defaults to KNOWLEDGE_VECTOR_STORAGE)
         """
+        # Row i of the vector store is the embedding of documents[i]
         self.documents = []
-        self.embeddings = []
+        self.vectors = index if index is not None else create_index(storage=storage)
+        # Row i of the lexical index holds the terms of documents[i]
+        self.lexical = BM25Index()
+        # Row i of the metadata index holds the metadata values of documents[i]
+        self.metadata = MetadataIndex()
         self.embedding_model = embedding_model
+        self._rows = {}       # document id -> row
+        self._hashes = {}     # content hash -> ids of the documents with that content, oldest first
+        self._pending = set() # rows whose embedding is missing or stale
+        # Guards all of the above: searches share it, changes take it exclusively (and
+        # re-enter it, as upsert does through add_document)
+        self._lock = ReadWriteLock()
+        # Held while pending documents are embedded, outside _lock, so one embedding
+        # request runs at a time and searches don't wait for it
+        self._embed_lock = threading.Lock()
     
-    def add_document(self, document: Dict[str, Any]):
+    @classmethod
+    def from_compiled(cls, embedding_model, documents: List[Dict[str, Any]], vectors: VectorStore,
+                      lexical: BM25Index) -> "KnowledgeBase":
+        """
+        Create a knowledge base from prebuilt indexes (see knowledge.compiler).
+        
+        Args:
+            embedding_model: Model used for queries and for documents added later
+            documents: Documents with unique 'id's, in row order
+            vectors: Vector index holding the embedding of every document
+            lexical: BM25 index holding the terms of every document
+        """
+        if len(vectors) != len(documents) or len(lexical) != len(documents):
+            raise ValueError("Compiled indexes don't match the documents")
+        kb = cls(embedding_model, index=vectors)
+        kb.lexical = lexical
+        kb.documents = documents
+        kb._rows = {doc['id']: row for row, doc in enumerate(documents)}
+        for doc in documents:
+            kb._track_hash(content_hash(doc['content']), doc['id'])
+            kb.metadata.add(doc.get('metadata'))
+        kb.vectors.refresh()
+        return kb
+    
+    def add_document(self, document: Dict[str, Any]) -> str:
         """
         Add a document to the knowledge base without generating embeddings immediately.
         
+        A document without an 'id' whose content is already indexed is not added again;
+        one with an 'id' is always stored under it.
+        
+        Args:
+            document: Document with at least 'content' and optional 'id' and 'metadata'
+            
+        Returns:
+            ID of the stored document (the existing one for duplicate content without an 'id')
+        """
+        with self._lock.write():
+            if 'content' not in document:
+                raise ValueError("Document must contain 'content' field")
+        
+            digest = content_hash(document['content'])
+            if not document.get('id') and digest in self._hashes:
+                return self._hashes[digest][0]
+        
+            doc_id = document.get('id') or digest
+            if doc_id in self._rows:
+                raise ValueError(f"Document '{doc_id}' already exists, use upsert to replace it")
+        
+            row = len(self.documents)
+            self.documents.append(dict(document, id=doc_id))
+            self._rows[doc_id] = row
+            self._track_hash(digest, doc_id)
+            self.lexical.add(document['content'])
+            self.metadata.add(document.get('metadata'))
+            # Note: We don't generate embeddings here, we'll do it when needed
+            self._pending.add(row)
+            if len(self.vectors):
+                # Keep rows aligned with documents; the placeholder is filled by _ensure_embeddings
+                self.vectors.add(np.zeros(self.vectors.dimension, dtype=np.float32))
+                self.vectors.refresh()
+            return doc_id
+    
+    def upsert(self, document: Dict[str, Any]) -> str:
+        """
+        Insert a document or replace the one with the same ID.
+        
+        Only new or changed content is re-embedded; metadata-only updates keep the
+        existing embedding. A document without an 'id' is added like add_document does.
+        
         Args:
-            document: Document with at least 'content' and optional 'metadata'
+            document: Document with 'content' and optional 'id' and 'metadata'
+            
+        Returns:
+            ID of the stored document
         """
-        if 'content' not in document:
-            raise ValueError("Document must contain 'content' field")
+        with self._lock.write():
+            if 'content' not in document:
+                raise ValueError("Document must contain 'content' field")
+        
+            doc_id = document.get('id')
+            if not doc_id or doc_id not in self._rows:
+                return self.add_document(document)
         
-        self.documents.append(document)
-        # Note: We don't generate embeddings here, we'll do it when needed
+            row = self._rows[doc_id]
+            old_digest = content_hash(self.documents[row]['content'])
+            new_digest = content_hash(document['content'])
+            self.documents[row] = dict(document, id=doc_id)
+            self.metadata.set(row, document.get('metadata'))
+            if new_digest != old_digest:
+                self._untrack_hash(old_digest, doc_id)
+                self._track_hash(new_digest, doc_id)
+                self.lexical.set(row, document['content'])
+                self._pending.add(row)
+            return doc_id
+    
+    def delete(self, doc_id: str) -> bool:
+        """
+        Remove a document and its embedding.
+        
+        Args:
+            doc_id: ID of the document to remove
+            
+        Returns:
+            True if the document existed
+        """
+        with self._lock.write():
+            row = self._rows.pop(doc_id, None)
+            if row is None:
+                return False
+        
+            self._untrack_hash(content_hash(self.documents[row]['content']), doc_id)
+        
+            # Move the last document into the freed row, mirroring VectorStore.remove
+            last = len(self.documents) - 1
+            if row != last:
+                moved = self.documents[last]
+                self.documents[row] = moved
+                self._rows[moved['id']] = row
+                if last in self._pending:
+                    self._pending.add(row)
+                else:
+                    self._pending.discard(row)
+            else:
+                self._pending.discard(row)
+            self._pending.discard(last)
+            self.documents.pop()
+            self.lexical.remove(row)
+            self.metadata.remove(row)
+            if len(self.vectors):
+                self.vectors.remove(row)
+            return True
+    
+    def _track_hash(self, digest: str, doc_id: str):
+        """Record that a document has content with the given hash."""
+        self._hashes.setdefault(digest, []).append(doc_id)
+    
+    def _untrack_hash(self, digest: str, doc_id: str):
+        """Forget a document's content hash; later duplicates take over its deduplication."""
+        ids = self._hashes.get(digest, [])
+        if doc_id in ids:
+            ids.remove(doc_id)
+        if not ids:
+            self._hashes.pop(digest, None)
+    
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """Return the document with the given ID, or None."""
+        with self._lock.read():
+            row = self._rows.get(doc_id)
+            return self.documents[row] if row is not None else None
     
     def load_documents_from_json(self, filepath: str):
         """Load documents from a JSON file without generating embeddings immediately."""
@@ -41,67 +208,140 @@ class KnowledgeBase:
         for doc in docs:
             self.add_document(doc)
     
-    def _ensure_embeddings(self):
-        """Generate embeddings for all documents if they don't exist yet."""
-        if not self.embedding_model:
+    def warm_up(self):
+        """Embed pending documents now, so the first search doesn't wait for them."""
+        self._ensure_embeddings()
+    
+    def _ensure_embeddings(self, wait: bool = True) -> bool:
+        """
+        Embed documents that are new or changed since the last call.
+        
+        The embedding request runs without holding _lock, so searches and changes go on
+        meanwhile; rows whose document moved or changed in the meantime stay pending.
+        
+        Args:
+            wait: Whether to wait for an embedding already running in another thread
+                (and then embed what is still pending), rather than return at once
+        
+        Returns:
+            True if embeddings were stored
+        """
+        if not self.embedding_model or not self._pending:
+            return False
+        if not self._embed_lock.acquire(blocking=wait):
             return False
+        try:
+            with self._lock.read():
+                rows = sorted(self._pending)
+                texts = [self.documents[row]['content'] for row in rows]
+            if not rows:
+                return False
             
-        # If embeddings haven't been generated yet or don't match document count
-        if len(self.embeddings) != len(self.documents):
-            self.embeddings = []
-            for doc in self.documents:
-                embedding = self.embedding_model.get_embedding(doc['content'])
-                self.embeddings.append(embedding)
-            return True
-        return False
+            # Embed only the pending documents, in batched requests
+            embeddings = self.embedding_model.get_embeddings(texts)
+            
+            with self._lock.write():
+                fresh = [(row, embedding) for row, text, embedding in zip(rows, texts, embeddings)
+                         if row in self._pending and self.documents[row]['content'] == text]
+                if not fresh:
+                    return False
+                if not len(self.vectors):
+                    # First indexing: allocate every row; rows added meanwhile stay pending
+                    self.vectors.add(np.zeros((len(self.documents), len(fresh[0][1])), dtype=np.float32))
+                self.vectors.set([row for row, _ in fresh], [embedding for _, embedding in fresh])
+                self._pending.difference_update(row for row, _ in fresh)
+                # Train derived structures (IVF clusters) here, so concurrent searches only read
+                self.vectors.refresh()
+                return True
+        finally:
+            self._embed_lock.release()
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def _searchable_rows(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """
+        Candidate rows of a vector search: those matching the filter, minus rows whose
+        embedding is still being computed by another thread. None means every row.
+        """
+        rows = self._filter_rows(metadata_filter)
+        if not self._pending:
+            return rows
+        pending = np.fromiter(self._pending, dtype=np.int64, count=len(self._pending))
+        return np.setdiff1d(rows if rows is not None else np.arange(len(self.documents)), pending)
+    
+    def _filter_rows(self, metadata_filter: Optional[MetadataFilter]) -> Optional[np.ndarray]:
+        """Candidate rows of a metadata filter, or None to search every row."""
+        if not metadata_filter:
+            return None
+        return self.metadata.rows(metadata_filter)
+    
+    def search(self, query: str, top_k: int = 3,
+               filter: Optional[MetadataFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
         """
         Search for relevant documents based on a query.
+        
+        Args:
+            query: Query text
+            top_k: Number of documents to return
+            filter: Only search documents whose metadata matches, e.g.
+                {"source": "emergency-resources"} or {"category": ["techniques", "resources"]}
+        
+        Returns:
+            (document, score) pairs, best match first. Scores are cosine similarities,
+            or BM25 scores when there is no embedding model or the query can't be embedded.
         """
         if not self.embedding_model:
             # Fall back to keyword search if no embeddings
-            return self._keyword_search(query, top_k)
-        
-        # Ensure all documents have embeddings
-        self._ensure_embeddings()
+            return self.search_lexical(query, top_k, filter)
         
         # Generate embedding for query
-        query_embedding = self.embedding_model.get_embedding(query)
-        
-        # Calculate similarity scores
-        similarities = []
-        for doc_embedding in self.embeddings:
-            similarity = self._calculate_similarity(query_embedding, doc_embedding)
-            similarities.append(similarity)
-        
-        # Get indices of top k documents
-        indices = sorted(range(len(similarities)), key=lambda i: similarities[i], reverse=True)[:top_k]
-        
-        # Return top k documents
-        return [self.documents[i] for i in indices]
-    
-    def _calculate_similarity(self, vec1, vec2):
-        """Calculate cosine similarity between two vectors."""
-        # Simple cosine similarity implementation
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = sum(a * a for a in vec1) ** 0.5
-        norm2 = sum(b * b for b in vec2) ** 0.5
-        return dot_product / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
-    
-    def _keyword_search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        """Simple keyword search fallback."""
-        query_terms = set(query.lower().split())
-        
-        # Calculate relevance scores based on term overlap
-        scores = []
-        for doc in self.documents:
-            doc_terms = set(doc['content'].lower().split())
-            overlap = len(query_terms.intersection(doc_terms))
-            scores.append(overlap)
-        
-        # Get indices of top k documents
-        indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-        
-        # Return top k documents
-        return [self.documents[i] for i in indices]
\ No newline at end of file
+        try:
+            query_embedding = self.embedding_model.get_embedding(query)
+        except Exception as e:
+            log('WARNING', f"Embedding unavailable, using keyword search: {e}")
+            return self.search_lexical(query, top_k, filter)
+        
+        return self.search_by_vector(query_embedding, top_k, filter)
+    
+    def search_by_vector(self, query_embedding: List[float], top_k: int = 3,
+                         filter: Optional[MetadataFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Search for relevant documents using an already computed query embedding.
+        
+        Lets callers that search several knowledge bases embed the query once.
+        
+        Args:
+            query_embedding: Embedding of the query from the same embedding model
+            top_k: Number of documents to return
+            filter: Only search documents whose metadata matches (see search)
+            
+        Returns:
+            Top k (document, cosine similarity) pairs, most similar first
+        """
+        # Embed pending documents, unless another thread already is: then search what is
+        # indexed, except before the first indexing, when there is nothing to search yet
+        self._ensure_embeddings(wait=not len(self.vectors))
+        
+        with self._lock.read():
+            # The filter picks the candidate rows first, so only those are scored
+            rows = self._searchable_rows(filter)
+            # Cosine similarity, exhaustive for small knowledge bases and approximate for large ones
+            indices, scores = self.vectors.search(query_embedding, top_k, rows)
+        
+            # Return top k documents with their scores
+            return [(self.documents[i], float(score)) for i, score in zip(indices, scores)]
+    
+    def search_lexical(self, query: str, top_k: int = 3,
+                       filter: Optional[MetadataFilter] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Keyword search with BM25 over the inverted index; needs no embedding model.
+        
+        Args:
+            query: Query text
+            top_k: Number of documents to return
+            filter: Only search documents whose metadata matches (see search)
+        
+        Returns:
+            Top k (document, BM25 score) pairs sharing at least one term with the query
+        """
+        with self._lock.read():
+            indices, scores = self.lexical.search(query, top_k, self._filter_rows(filter))
+            return [(self.documents[i], float(score)) for i, score in zip(indices, scores)]
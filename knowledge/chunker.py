@@ -0,0 +1,118 @@
+from typing import Any, Dict, List, Optional, Tuple
+from utils.tokens import estimate_tokens
+
+# Bump when the rendering changes, so compiled indexes built with the old rendering are rebuilt
+CHUNKER_VERSION = 1
+
+# Items rendering longer than this are split into one passage per long field
+CHUNK_MAX_TOKENS = 60
+
+# Fields naming an item; the first one present becomes the passage title
+TITLE_FIELDS = ("name", "term", "title", "category")
+
+# List fields whose order matters, rendered as numbered steps
+ORDERED_FIELDS = ("instructions", "steps")
+
+def field_label(field: str) -> str:
+    """'suitable_for' -> 'Suitable for'"""
+    return field.replace("_", " ").capitalize()
+
+def _title(item: Dict[str, Any]) -> Tuple[str, str]:
+    """(title field, title) of an item, or ("", "") if it has none."""
+    for field in TITLE_FIELDS:
+        if isinstance(item.get(field), str):
+            return field, item[field]
+    return "", ""
+
+def _sentence(text: str) -> str:
+    """Text ending with a full stop, unless it already ends with punctuation."""
+    text = text.strip()
+    return text if not text or text[-1] in ".?!。？！" else text + "."
+
+def render_value(field: str, value: Any) -> str:
+    """Render one field's value compactly, without JSON syntax."""
+    if isinstance(value, dict):
+        return render_item(value)
+    if isinstance(value, list):
+        if all(isinstance(v, dict) for v in value):
+            return " ".join(render_item(v) for v in value)
+        if field in ORDERED_FIELDS:
+            return " ".join(f"{i}. {_sentence(str(v))}" for i, v in enumerate(value, 1))
+        if any(isinstance(v, str) and v.rstrip().endswith("?") for v in value):
+            return " ".join(str(v) for v in value)
+        return ", ".join(str(v) for v in value) + "."
+    return _sentence(str(value))
+
+def render_item(item: Dict[str, Any], fields: Optional[List[str]] = None) -> str:
+    """
+    Render a structured item as compact prose.
+
+    {"name": "Deep Breathing", "description": "Slow breathing", "benefits": ["Reduces anxiety"]}
+    becomes "Deep Breathing: Slow breathing. Benefits: Reduces anxiety."
+
+    Args:
+        item: Knowledge item
+        fields: Fields to render besides the title (defaults to all of them)
+    """
+    title_field, title = _title(item)
+    parts = []
+    described = False
+    for field in (fields if fields is not None else item.keys()):
+        if field == title_field or field not in item:
+            continue
+        text = render_value(field, item[field])
+        # A leading description reads naturally after the title; other fields get a label
+        if field in ("description", "definition") and not parts:
+            described = True
+            parts.append(text)
+        else:
+            parts.append(f"{field_label(field)}: {text}")
+    body = " ".join(parts)
+    if not title:
+        return body
+    if not body:
+        return _sentence(title)
+    return f"{title}: {body}" if described else f"{_sentence(title)} {body}"
+
+def chunk_item(item: Any, max_tokens: int = CHUNK_MAX_TOKENS) -> List[Tuple[str, str]]:
+    """
+    Split a knowledge item into passages.
+
+    Short items stay one passage. Longer ones keep a main passage with the title and short
+    fields, and give every long field its own passage starting with the title, so each
+    passage is embedded and retrieved for what it is about. Lists of sub-items (e.g. the
+    books of a resource category) get one passage per sub-item.
+
+    Args:
+        item: Knowledge item (a dict, or a plain string)
+        max_tokens: Estimated token size above which an item is split
+
+    Returns:
+        (field, passage) pairs; field is "" for the main passage, "<field>" for a field
+        passage and "<field>:<index>" for a sub-item
+    """
+    if not isinstance(item, dict):
+        return [("", _sentence(str(item)))]
+
+    whole = render_item(item)
+    if estimate_tokens(whole) <= max_tokens:
+        return [("", whole)]
+
+    title_field, title = _title(item)
+    main_fields = []
+    passages = []
+    for field, value in item.items():
+        if field == title_field:
+            continue
+        if isinstance(value, list) and value and all(isinstance(v, dict) for v in value):
+            for i, sub_item in enumerate(value):
+                passages.append((f"{field}:{i}", f"{title} - {render_item(sub_item)}" if title else render_item(sub_item)))
+        elif estimate_tokens(render_value(field, value)) > max_tokens // 3:
+            text = f"{field_label(field)}: {render_value(field, value)}"
+            passages.append((field, f"{title} - {text}" if title else text))
+        else:
+            main_fields.append(field)
+
+    if main_fields or not passages:
+        passages.insert(0, ("", render_item(item, main_fields)))
+    return passages
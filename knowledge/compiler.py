@@ -0,0 +1,268 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+import numpy as np
+from knowledge.ann import IVFIndex, create_index
+from knowledge.vector_store import VectorStore, STORAGE_TYPES
+from knowledge.base import KnowledgeBase
+from knowledge.chunker import CHUNKER_VERSION
+from knowledge.documents import load_knowledge_documents
+from knowledge.lexical import BM25Index
+from prompts.knowledge import AVAILABLE_KNOWLEDGE_BASES
+from utils.logger import log
+from utils.env import load_env
+
+# Compiled knowledge index: built offline by `python -m knowledge.compiler`, opened by KnowledgeManager.
+#
+# Layout of the index directory:
+#   manifest.json       format and chunker versions, embedding model, source file hashes, row range of each knowledge base
+#   documents.jsonl     one document per line, in row order
+#   embeddings.npy      L2-normalized embeddings of all documents (float32 or float16), memory-mapped on load
+#   codes.npy, scales.npy   the embeddings encoded for compressed storage (float16, or int8 with per-row
+#                       scales), memory-mapped by stores of that storage type instead of encoding on load
+#   <kb>/vocabulary.json, <kb>/{offsets,rows,tfs,lengths}.npy    BM25 postings of each knowledge base
+#   <kb>/{centroids,assignments}.npy                            IVF clusters, for large knowledge bases
+
+FORMAT_VERSION = 1
+DEFAULT_INDEX_PATH = "knowledge/index"
+
+def _file_digest(path: str) -> str:
+    """SHA-1 of a file's bytes, to detect knowledge files changed after compiling."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _embedding_signature(embedding_model) -> Dict[str, Any]:
+    """Identify the embedding space, so an index is never queried with a different model."""
+    return {
+        "provider": embedding_model.provider,
+        "model": embedding_model.model,
+        "dimensions": embedding_model.dimensions
+    }
+
+def compile_knowledge(embedding_model, output: str = DEFAULT_INDEX_PATH, dtype: str = "float32",
+                      knowledge_bases: Optional[Dict[str, Dict[str, Any]]] = None,
+                      storage: str = "float32") -> Dict[str, Any]:
+    """
+    Compile knowledge files into an index directory.
+
+    The index is written next to the output directory and swapped in at the end, so a
+    process opening it never sees a half-written index.
+
+    Args:
+        embedding_model: Model that embeds the documents; queries must use the same model
+        output: Index directory
+        dtype: "float32", or "float16" for half the size on disk
+        knowledge_bases: Knowledge bases to compile (defaults to AVAILABLE_KNOWLEDGE_BASES)
+        storage: Vector storage the index will be opened with ("float32", "float16" or
+            "int8"); compressed codes are stored for it, so opening needn't encode
+
+    Returns:
+        The manifest of the new index
+    """
+    if dtype not in ("float32", "float16"):
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+    if storage not in STORAGE_TYPES:
+        raise ValueError(f"Unsupported vector storage: {storage}")
+    knowledge_bases = knowledge_bases or AVAILABLE_KNOWLEDGE_BASES
+    started = time.time()
+
+    # Build each knowledge base the same way KnowledgeManager does, which also drops duplicates
+    bases = {}
+    sources = {}
+    for kb_name, kb_info in knowledge_bases.items():
+        path = kb_info.get('path', '')
+        if not path or not os.path.exists(path):
+            continue
+        kb = KnowledgeBase()
+        for document in load_knowledge_documents(kb_name, path):
+            kb.add_document(document)
+        bases[kb_name] = kb
+        sources[kb_name] = {"path": path, "sha1": _file_digest(path)}
+
+    documents = [doc for kb in bases.values() for doc in kb.documents]
+    embeddings = np.asarray(embedding_model.get_embeddings([doc['content'] for doc in documents]), dtype=np.float32)
+    if len(embeddings):
+        embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    staging = f"{output.rstrip(os.sep)}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    with open(os.path.join(staging, "documents.jsonl"), 'w', encoding='utf-8') as f:
+        for doc in documents:
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+    np.save(os.path.join(staging, "embeddings.npy"), embeddings.astype(dtype))
+    codes = storage if storage not in ("float32", dtype) else None
+    if codes and len(embeddings):
+        encoded = VectorStore(storage=storage)
+        encoded.attach(embeddings)
+        np.save(os.path.join(staging, "codes.npy"), encoded.matrix)
+        if encoded.scales is not None:
+            np.save(os.path.join(staging, "scales.npy"), encoded.scales)
+
+    ranges = {}
+    start = 0
+    for kb_name, kb in bases.items():
+        end = start + len(kb.documents)
+        ranges[kb_name] = [start, end]
+        kb_dir = os.path.join(staging, kb_name)
+        os.makedirs(kb_dir)
+
+        vocabulary, offsets, rows, tfs, lengths = kb.lexical.to_arrays()
+        with open(os.path.join(kb_dir, "vocabulary.json"), 'w', encoding='utf-8') as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+        for name, array in (("offsets", offsets), ("rows", rows), ("tfs", tfs), ("lengths", lengths)):
+            np.save(os.path.join(kb_dir, f"{name}.npy"), array)
+
+        # Train clusters now for knowledge bases that will be searched approximately
+        index = IVFIndex()
+        if end - start >= index.exact_threshold:
+            index.attach(embeddings[start:end])
+            index.train()
+            centroids, assignments = index.clusters()
+            np.save(os.path.join(kb_dir, "centroids.npy"), centroids)
+            np.save(os.path.join(kb_dir, "assignments.npy"), assignments)
+        start = end
+
+    manifest = {
+        "format_version": FORMAT_VERSION,
+        "chunker_version": CHUNKER_VERSION,
+        "version": hashlib.sha1(json.dumps([sources, _embedding_signature(embedding_model), dtype, CHUNKER_VERSION],
+                                           sort_keys=True).encode('utf-8')).hexdigest()[:12],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "embedding": dict(_embedding_signature(embedding_model), dtype=dtype,
+                          dimension=int(embeddings.shape[1]) if embeddings.ndim == 2 else None),
+        "codes": codes,
+        "documents": len(documents),
+        "knowledge_bases": {kb_name: dict(sources[kb_name], rows=ranges[kb_name]) for kb_name in bases}
+    }
+    with open(os.path.join(staging, "manifest.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the new index in place of the old one
+    previous = f"{output.rstrip(os.sep)}.old-{os.getpid()}"
+    if os.path.exists(output):
+        os.rename(output, previous)
+    os.rename(staging, output)
+    shutil.rmtree(previous, ignore_errors=True)
+
+    log('INFO', f"[compiler] compiled {len(documents)} documents from {len(bases)} knowledge bases "
+                f"into {output} in {time.time() - started:.1f}s")
+    return manifest
+
+def open_compiled(embedding_model, path: str = DEFAULT_INDEX_PATH) -> Optional[Dict[str, KnowledgeBase]]:
+    """
+    Open a compiled index.
+
+    Embeddings and postings are memory-mapped, so opening is fast and processes on the
+    same machine share the pages through the OS cache.
+
+    Args:
+        embedding_model: Model that will embed queries
+        path: Index directory
+
+    Returns:
+        Knowledge bases by name, or None if there is no usable index (missing, built with
+        another embedding model or format, or older than its knowledge files)
+    """
+    manifest_path = os.path.join(path, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    if manifest.get("format_version") != FORMAT_VERSION:
+        log('WARNING', f"[compiler] {path} has format {manifest.get('format_version')}, expected {FORMAT_VERSION}; "
+                       f"rebuild it with `python -m knowledge.compiler`")
+        return None
+    if manifest.get("chunker_version") != CHUNKER_VERSION:
+        log('WARNING', f"[compiler] {path} was chunked by an older chunker; "
+                       f"rebuild it with `python -m knowledge.compiler`")
+        return None
+    signature = {key: manifest["embedding"].get(key) for key in ("provider", "model", "dimensions")}
+    if signature != _embedding_signature(embedding_model):
+        log('WARNING', f"[compiler] {path} was built with embedding model {signature}, ignoring it")
+        return None
+    for kb_name, info in manifest["knowledge_bases"].items():
+        if not os.path.exists(info["path"]) or _file_digest(info["path"]) != info["sha1"]:
+            log('WARNING', f"[compiler] {info['path']} changed since {path} was built; "
+                           f"rebuild it with `python -m knowledge.compiler`")
+            return None
+
+    # Stores use the mapped rows directly when the storage types match (a float16 file is upcast
+    # once for float32 stores); compressed stores map the stored codes if they are for their storage
+    # type, otherwise encode every row once, and rescore against the embeddings
+    embeddings = np.load(os.path.join(path, "embeddings.npy"), mmap_mode="r")
+    codes = scales = None
+    if manifest.get("codes") and manifest["codes"] == create_index().storage:
+        codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        if os.path.exists(os.path.join(path, "scales.npy")):
+            scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+    with open(os.path.join(path, "documents.jsonl"), 'r', encoding='utf-8') as f:
+        documents = [json.loads(line) for line in f]
+
+    bases = {}
+    for kb_name, info in manifest["knowledge_bases"].items():
+        start, end = info["rows"]
+        kb_dir = os.path.join(path, kb_name)
+
+        vectors = create_index()
+        if end > start:
+            vectors.attach(embeddings[start:end],
+                           codes[start:end] if codes is not None else None,
+                           scales[start:end] if scales is not None else None)
+        if isinstance(vectors, IVFIndex) and os.path.exists(os.path.join(kb_dir, "centroids.npy")):
+            vectors.restore(np.load(os.path.join(kb_dir, "centroids.npy")),
+                            np.load(os.path.join(kb_dir, "assignments.npy")))
+
+        with open(os.path.join(kb_dir, "vocabulary.json"), 'r', encoding='utf-8') as f:
+            vocabulary = json.load(f)
+        arrays = [np.load(os.path.join(kb_dir, f"{name}.npy"), mmap_mode="r")
+                  for name in ("offsets", "rows", "tfs", "lengths")]
+        lexical = BM25Index.from_arrays(vocabulary, *arrays)
+
+        bases[kb_name] = KnowledgeBase.from_compiled(embedding_model, documents[start:end], vectors, lexical)
+
+    log('INFO', f"[compiler] opened {path} (version {manifest['version']}, {manifest['documents']} documents)")
+    return bases
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: python -m knowledge.compiler [--output DIR] [--dtype float16] [--storage int8]"""
+    from models.embedding import EmbeddingModel
+    from models.embedding_cache import EmbeddingCache
+
+    parser = argparse.ArgumentParser(description="Compile knowledge/data into a memory-mapped index")
+    parser.add_argument("--output", default=os.getenv("KNOWLEDGE_INDEX_PATH", DEFAULT_INDEX_PATH),
+                        help="index directory (default: %(default)s)")
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32",
+                        help="storage type of the embedding matrix (default: %(default)s)")
+    parser.add_argument("--storage", choices=STORAGE_TYPES, default=None,
+                        help="vector storage the application uses, whose codes are stored in the index "
+                             "(default: KNOWLEDGE_VECTOR_STORAGE or float32)")
+    parser.add_argument("--provider", default=os.getenv("EMBEDDING_PROVIDER", "qwen"),
+                        help="embedding provider (default: %(default)s)")
+    parser.add_argument("--model", default=None, help="embedding model (default: the provider's default)")
+    parser.add_argument("--dimensions", type=int, default=os.getenv("EMBEDDING_DIMENSIONS") or None,
+                        help="embedding dimensions to request from providers that support it (default: the model's)")
+    args = parser.parse_args(argv)
+
+    load_env()
+    cache = EmbeddingCache(
+        path=os.getenv("EMBEDDING_CACHE_PATH", "knowledge/cache/embeddings.db"),
+        max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+    )
+    embedding_model = EmbeddingModel(provider=args.provider, model_name=args.model, cache=cache,
+                                     dimensions=args.dimensions)
+    storage = args.storage or os.getenv("KNOWLEDGE_VECTOR_STORAGE", "float32").lower()
+    manifest = compile_knowledge(embedding_model, output=args.output, dtype=args.dtype, storage=storage)
+    print(json.dumps(manifest, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import json
+from typing import Any, Dict, List
+from knowledge.chunker import chunk_item, render_value, field_label, CHUNK_MAX_TOKENS
+from utils.tokens import estimate_tokens
+
+def load_knowledge_documents(kb_name: str, path: str) -> List[Dict[str, Any]]:
+    """
+    Turn a knowledge file into documents.
+
+    Knowledge files map a category to a list of items. Every item is rendered as
+    compact prose and split into field-aware passages (see knowledge.chunker); runs of
+    plain strings, such as a list of prompts, are grouped into passages.
+
+    Args:
+        kb_name: Name of the knowledge base, used in document IDs and metadata
+        path: Path of the JSON knowledge file
+
+    Returns:
+        Documents with 'id' ("<kb>:<category>:<index>", plus ":<field>" for extra passages
+        of an item), 'content' and 'metadata'
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    documents = []
+    if isinstance(data, dict):
+        for key, items in data.items():
+            if not isinstance(items, list):
+                continue
+            metadata = {"source": kb_name, "category": key}
+            for index, item in enumerate(items):
+                if isinstance(item, dict):
+                    for field, passage in chunk_item(item):
+                        documents.append({
+                            "id": f"{kb_name}:{key}:{index}" + (f":{field}" if field else ""),
+                            "content": passage,
+                            "metadata": dict(metadata, field=field) if field else dict(metadata)
+                        })
+            documents.extend(_group_strings(kb_name, key, items, metadata))
+    return documents
+
+def _group_strings(kb_name: str, key: str, items: List[Any], metadata: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Group the plain strings of a category into passages of up to CHUNK_MAX_TOKENS."""
+    documents = []
+    group = []
+    for index, item in enumerate(items):
+        if not isinstance(item, str):
+            continue
+        if group and estimate_tokens(" ".join(text for _, text in group + [(index, item)])) > CHUNK_MAX_TOKENS:
+            documents.append(_string_document(kb_name, key, group, metadata))
+            group = []
+        group.append((index, item))
+    if group:
+        documents.append(_string_document(kb_name, key, group, metadata))
+    return documents
+
+def _string_document(kb_name: str, key: str, group: List[Any], metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """Document for a group of (index, string) items of a category."""
+    return {
+        "id": f"{kb_name}:{key}:{group[0][0]}",
+        "content": f"{field_label(key)}: {render_value(key, [text for _, text in group])}",
+        "metadata": dict(metadata)
+    }
@@ -0,0 +1,118 @@
+from typing import Any, Dict, Optional, Set, Tuple
+import numpy as np
+
+# A filter maps metadata fields to a value or a list of accepted values, e.g.
+# {"category": "techniques", "source": ["therapy-approaches", "physical-health"]}.
+# Fields are combined with AND, the values of one field with OR.
+MetadataFilter = Dict[str, Any]
+
+class MetadataIndex:
+    """
+    Posting lists from metadata values to document rows.
+
+    Lets a filtered search find its candidate rows directly instead of scanning every
+    document. Rows mirror the rows of a VectorStore: documents are appended, replaced in
+    place, and removed by moving the last row into the freed slot.
+    """
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, Any], Set[int]] = {}   # (field, value) -> rows
+        self._arrays: Dict[Tuple[str, Any], np.ndarray] = {}    # cached sorted rows per posting
+        self._entries = []                                      # (field, value) pairs of each row
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _pairs(metadata: Optional[Dict[str, Any]]):
+        """Indexable (field, value) pairs of a metadata dict; list values index each element."""
+        pairs = []
+        for field, value in (metadata or {}).items():
+            for item in (value if isinstance(value, (list, tuple)) else [value]):
+                if isinstance(item, (str, int, float, bool)) or item is None:
+                    pairs.append((field, item))
+        return pairs
+
+    def add(self, metadata: Optional[Dict[str, Any]]):
+        """Append a document's metadata as the next row."""
+        self._entries.append([])
+        self._index(len(self._entries) - 1, metadata)
+
+    def set(self, row: int, metadata: Optional[Dict[str, Any]]):
+        """Replace the metadata of an existing row."""
+        self._unindex(row)
+        self._index(row, metadata)
+
+    def remove(self, row: int):
+        """Remove a row by moving the last row into its place."""
+        last = len(self._entries) - 1
+        self._unindex(row)
+        if row != last:
+            for pair in self._entries[last]:
+                rows = self._postings[pair]
+                rows.discard(last)
+                rows.add(row)
+                self._arrays.pop(pair, None)
+            self._entries[row] = self._entries[last]
+        self._entries.pop()
+
+    def clear(self):
+        """Remove all rows."""
+        self.__init__()
+
+    def _index(self, row: int, metadata: Optional[Dict[str, Any]]):
+        """Add the metadata values of an empty row to the postings."""
+        pairs = self._pairs(metadata)
+        for pair in pairs:
+            self._postings.setdefault(pair, set()).add(row)
+            self._arrays.pop(pair, None)
+        self._entries[row] = pairs
+
+    def _unindex(self, row: int):
+        """Take a row's values out of the postings, leaving the row empty."""
+        for pair in self._entries[row]:
+            rows = self._postings[pair]
+            rows.discard(row)
+            if not rows:
+                del self._postings[pair]
+            self._arrays.pop(pair, None)
+        self._entries[row] = []
+
+    def _rows_for(self, pair: Tuple[str, Any]) -> np.ndarray:
+        """Sorted rows having a metadata value, cached until the posting changes."""
+        array = self._arrays.get(pair)
+        if array is None:
+            array = np.fromiter(sorted(self._postings.get(pair, ())), dtype=np.int64)
+            self._arrays[pair] = array
+        return array
+
+    def rows(self, metadata_filter: MetadataFilter) -> np.ndarray:
+        """
+        Rows whose metadata matches a filter.
+
+        Args:
+            metadata_filter: Field -> value, or list of accepted values
+
+        Returns:
+            Sorted row indices
+        """
+        if not metadata_filter:
+            return np.arange(len(self._entries))
+
+        matches = []
+        for field, accepted in metadata_filter.items():
+            values = accepted if isinstance(accepted, (list, tuple, set)) else [accepted]
+            postings = [self._rows_for((field, value)) for value in values]
+            if len(postings) == 1:
+                matches.append(postings[0])
+            else:
+                matches.append(np.unique(np.concatenate(postings)) if postings else np.zeros(0, dtype=np.int64))
+
+        # Intersect the most selective fields first
+        matches.sort(key=len)
+        result = matches[0]
+        for rows in matches[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, rows, assume_unique=True)
+        return result
@@ -0,0 +1,257 @@
+import re
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Latin words and numbers, or runs of CJK characters (Han, kana, Hangul)
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]+")
+
+# Constant of reciprocal-rank fusion; larger values flatten the advantage of top ranks
+RRF_K = 60
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into index terms.
+
+    Latin text is lowercased and split into words. Chinese has no spaces, so CJK runs
+    produce every character and every pair of adjacent characters ("睡不着" gives
+    "睡", "不", "着", "睡不", "不着"), which matches words without a dictionary.
+    """
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        token = match.group()
+        if token.isascii():
+            tokens.append(token)
+        else:
+            tokens.extend(token)
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+    return tokens
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Fuse several rankings of the same items.
+
+    Args:
+        rankings: Item keys ordered best first, one sequence per retriever
+        k: Fusion constant
+
+    Returns:
+        (key, fused score) pairs, best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    """
+    Inverted index over document rows with Okapi BM25 scoring.
+
+    Rows mirror the rows of a VectorStore: documents are appended, replaced in place,
+    and removed by moving the last row into the freed slot.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        Initialize an empty index.
+
+        Args:
+            k1: Term frequency saturation
+            b: Strength of document length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}   # term -> row -> term frequency
+        self._arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}  # cached (rows, tfs) per term
+        self._terms: List[Counter] = []                  # term counts of each row
+        self._lengths: List[int] = []
+        self._length_array: Optional[np.ndarray] = None  # cached np.array of _lengths
+        self._total_length = 0
+        # Read-only postings loaded by from_arrays: (term -> id, offsets, rows, tfs); see _thaw
+        self._packed = None
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    @classmethod
+    def from_arrays(cls, vocabulary: List[str], offsets: np.ndarray, rows: np.ndarray, tfs: np.ndarray,
+                    lengths: np.ndarray, k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        """
+        Open postings saved by to_arrays without rebuilding them.
+        
+        The arrays may be memory maps. They are only unpacked into the mutable form
+        when a document is added, replaced or removed.
+        
+        Args:
+            vocabulary: Terms, in the order of their postings
+            offsets: Start of each term's postings in rows/tfs, plus the end of the last one
+            rows: Rows of all postings, grouped by term
+            tfs: Term frequency of each posting
+            lengths: Term count of each row
+        """
+        index = cls(k1, b)
+        index._packed = ({term: i for i, term in enumerate(vocabulary)}, offsets, rows, tfs)
+        index._lengths = lengths.tolist()
+        index._length_array = np.asarray(lengths, dtype=np.float32)
+        index._total_length = int(np.sum(lengths))
+        return index
+
+    def to_arrays(self) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Pack the postings into (vocabulary, offsets, rows, tfs, lengths) arrays for from_arrays."""
+        self._thaw()
+        vocabulary = sorted(self._postings)
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(self._postings[term]) for term in vocabulary])
+        rows = np.zeros(offsets[-1], dtype=np.int32)
+        tfs = np.zeros(offsets[-1], dtype=np.float32)
+        for i, term in enumerate(vocabulary):
+            postings = self._postings[term]
+            rows[offsets[i]:offsets[i + 1]] = list(postings.keys())
+            tfs[offsets[i]:offsets[i + 1]] = list(postings.values())
+        return vocabulary, offsets, rows, tfs, np.asarray(self._lengths, dtype=np.int32)
+
+    def _thaw(self):
+        """Unpack postings opened by from_arrays into the mutable form."""
+        if self._packed is None:
+            return
+        term_ids, offsets, rows, tfs = self._packed
+        self._packed = None
+        self._terms = [Counter() for _ in self._lengths]
+        for term, i in term_ids.items():
+            start, end = offsets[i], offsets[i + 1]
+            postings = dict(zip(rows[start:end].tolist(), tfs[start:end].astype(int).tolist()))
+            self._postings[term] = postings
+            for row, count in postings.items():
+                self._terms[row][term] = count
+
+    def add(self, text: str):
+        """Append a document as the next row."""
+        self._thaw()
+        self._terms.append(Counter())
+        self._lengths.append(0)
+        self._index(len(self._terms) - 1, text)
+
+    def set(self, row: int, text: str):
+        """Replace the text of an existing row."""
+        self._thaw()
+        self._unindex(row)
+        self._index(row, text)
+
+    def remove(self, row: int):
+        """Remove a row by moving the last row into its place."""
+        self._thaw()
+        last = len(self._terms) - 1
+        self._unindex(row)
+        if row != last:
+            moved = self._terms[last]
+            for term, count in moved.items():
+                postings = self._postings[term]
+                del postings[last]
+                postings[row] = count
+                self._arrays.pop(term, None)
+            self._terms[row] = moved
+            self._lengths[row] = self._lengths[last]
+        self._terms.pop()
+        self._lengths.pop()
+        self._length_array = None
+
+    def clear(self):
+        """Remove all documents."""
+        self.__init__(self.k1, self.b)
+
+    def _index(self, row: int, text: str):
+        """Add the terms of text to an empty row."""
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[row] = count
+            self._arrays.pop(term, None)
+        self._terms[row] = terms
+        self._lengths[row] = sum(terms.values())
+        self._length_array = None
+        self._total_length += self._lengths[row]
+
+    def _unindex(self, row: int):
+        """Take a row's terms out of the postings, leaving the row empty."""
+        for term in self._terms[row]:
+            postings = self._postings[term]
+            del postings[row]
+            if not postings:
+                del self._postings[term]
+            self._arrays.pop(term, None)
+        self._total_length -= self._lengths[row]
+        self._terms[row] = Counter()
+        self._lengths[row] = 0
+
+    def _posting_arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(rows, term frequencies) of a term as arrays, cached until the term's postings change."""
+        if self._packed is not None:
+            term_ids, offsets, rows, tfs = self._packed
+            i = term_ids.get(term)
+            if i is None:
+                return None
+            return rows[offsets[i]:offsets[i + 1]], tfs[offsets[i]:offsets[i + 1]]
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings.get(term)
+            if not postings:
+                return None
+            arrays = (np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                      np.fromiter(postings.values(), dtype=np.float32, count=len(postings)))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, top_k: int = 3,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score documents containing any query term.
+
+        Args:
+            query: Query text
+            top_k: Number of rows to return
+            rows: Candidate rows (e.g. from a metadata filter); other rows are not returned
+
+        Returns:
+            (row indices, BM25 scores), best match first; only rows sharing a term with the query
+        """
+        count = len(self._lengths)
+        if count == 0 or top_k <= 0 or (rows is not None and len(rows) == 0):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        if self._length_array is None:
+            self._length_array = np.asarray(self._lengths, dtype=np.float32)
+        lengths = self._length_array
+        if rows is None:
+            scores = np.zeros(count, dtype=np.float32)
+        else:
+            # Scores are kept per candidate; slots maps a row to its candidate position, or -1
+            rows = np.asarray(rows, dtype=np.int64)
+            slots = np.full(count, -1, dtype=np.int64)
+            slots[rows] = np.arange(len(rows))
+            scores = np.zeros(len(rows), dtype=np.float32)
+        average_length = max(self._total_length / count, 1.0)
+        for term, query_count in Counter(tokenize(query)).items():
+            arrays = self._posting_arrays(term)
+            if arrays is None:
+                continue
+            posting_rows, tfs = arrays
+            # IDF comes from the whole index, so a filter doesn't change a document's score
+            idf = math.log(1 + (count - len(posting_rows) + 0.5) / (len(posting_rows) + 0.5))
+            targets = posting_rows
+            if rows is not None:
+                # Only postings of candidate rows are scored
+                targets = slots[posting_rows]
+                candidate = targets >= 0
+                posting_rows, tfs, targets = posting_rows[candidate], tfs[candidate], targets[candidate]
+                if len(targets) == 0:
+                    continue
+            norms = self.k1 * (1 - self.b + self.b * lengths[posting_rows] / average_length)
+            scores[targets] += query_count * idf * tfs * (self.k1 + 1) / (tfs + norms)
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        order = matched[np.argsort(-scores[matched], kind="stable")]
+        return (order if rows is None else rows[order]), scores[order]
@@ -1,93 +1,350 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Mapping, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
 from models.embedding import EmbeddingModel
+from models.embedding_cache import EmbeddingCache, QueryEmbeddingCache
 from knowledge.base import KnowledgeBase
+from knowledge.lexical import reciprocal_rank_fusion
+from knowledge.filters import MetadataFilter
+from knowledge.documents import load_knowledge_documents
+from knowledge.compiler import open_compiled, DEFAULT_INDEX_PATH
+from utils.logger import log
+from utils.env import load_env
+from utils import startup
 from prompts.knowledge import AVAILABLE_KNOWLEDGE_BASES, get_knowledge_base
 import os
-import json
+import heapq
+import threading
+
+# Retrieval modes: embedding similarity, BM25 keywords, or both fused by reciprocal rank
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# In hybrid mode each retriever contributes this many candidates per requested document
+HYBRID_CANDIDATES = 4
+
+# Loads knowledge bases in the background, so building a manager never blocks on file I/O
+_load_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="knowledge-load")
+
+class _LoadingBases(Mapping):
+    """
+    Knowledge bases by name, each loaded by its own background task.
+    
+    Names are known up front; looking a knowledge base up waits for that one only.
+    A knowledge base that failed to load is reported missing.
+    """
+    
+    def __init__(self, futures: Dict[str, Future]):
+        self._futures = futures
+    
+    def __getitem__(self, kb_name: str) -> KnowledgeBase:
+        kb = self._futures[kb_name].result()
+        if kb is None:
+            raise KeyError(kb_name)
+        return kb
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._futures)
+    
+    def __len__(self) -> int:
+        return len(self._futures)
+    
+    def loaded(self) -> bool:
+        """Whether every knowledge base has finished loading"""
+        return all(future.done() for future in self._futures.values())
+    
+    def wait(self):
+        """Block until every knowledge base has finished loading"""
+        for future in self._futures.values():
+            future.exception()
 
 class KnowledgeManager:
     """Manages multiple knowledge bases and provides unified search interface"""
     
-    def __init__(self):
-        """Initialize the knowledge manager with embedding model"""
-        self.embedding_model = EmbeddingModel(provider="qwen")
-        self.knowledge_bases = {}
+    _shared = None
+    _shared_lock = threading.Lock()
+    
+    def __init__(self, base: Optional["KnowledgeManager"] = None):
+        """
+        Initialize the knowledge manager with embedding model.
+        
+        Args:
+            base: Shared manager to layer on top of. The new manager then reuses the base's
+                embedding model and read-only knowledge bases, and keeps only its own
+                general knowledge base (e.g. session-specific documents).
+        """
+        self.base = base
+        if base is not None:
+            self.embedding_cache = base.embedding_cache
+            self.query_cache = base.query_cache
+            self.embedding_model = base.embedding_model
+            self.knowledge_bases = base.knowledge_bases
+            self.min_score = base.min_score
+            self.search_mode = base.search_mode
+            self.general_kb = KnowledgeBase(self.embedding_model)
+            return
+        
+        load_env()
+        self.embedding_cache = EmbeddingCache(
+            path=os.getenv("EMBEDDING_CACHE_PATH", "knowledge/cache/embeddings.db"),
+            max_bytes=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "256")) * 1024 * 1024
+        )
+        self.query_cache = QueryEmbeddingCache(
+            max_size=int(os.getenv("QUERY_CACHE_SIZE", "1024")),
+            ttl=float(os.getenv("QUERY_CACHE_TTL", "3600"))
+        )
+        # Shorter embeddings (e.g. 256 of text-embedding-v3's 1024) shrink the index at some cost in recall
+        dimensions = os.getenv("EMBEDDING_DIMENSIONS")
+        self.embedding_model = EmbeddingModel(provider=os.getenv("EMBEDDING_PROVIDER", "qwen"),
+                                              cache=self.embedding_cache,
+                                              query_cache=self.query_cache,
+                                              dimensions=int(dimensions) if dimensions else None)
+        # Hits scoring below this cosine similarity are dropped (disabled when unset)
+        min_score = os.getenv("KNOWLEDGE_MIN_SCORE")
+        self.min_score = float(min_score) if min_score else None
+        self.search_mode = os.getenv("KNOWLEDGE_SEARCH_MODE", "hybrid").lower()
+        if self.search_mode not in SEARCH_MODES:
+            raise ValueError(f"Unsupported knowledge search mode: {self.search_mode}")
         self.general_kb = KnowledgeBase(self.embedding_model)
         
-        # Load all available knowledge bases
-        self._load_all_knowledge_bases()
+        # Load all available knowledge bases in the background
+        self.knowledge_bases = self._load_all_knowledge_bases()
     
-    def _load_all_knowledge_bases(self):
-        """Load all knowledge bases defined in prompts/knowledge.py"""
-        for kb_name, kb_info in AVAILABLE_KNOWLEDGE_BASES.items():
+    def _load_all_knowledge_bases(self) -> _LoadingBases:
+        """
+        Start loading all knowledge bases defined in prompts/knowledge.py.
+        
+        Uses the compiled index (see knowledge.compiler) when there is an up-to-date one,
+        otherwise reads the knowledge files and embeds them, each knowledge base in a
+        background task. Returns at once; searches wait for the knowledge bases they use.
+        """
+        index_path = os.getenv("KNOWLEDGE_INDEX_PATH", DEFAULT_INDEX_PATH)
+        
+        def open_index():
             try:
-                kb = KnowledgeBase(self.embedding_model)
-                path = kb_info.get('path', '')
-                
-                # Make sure path exists and is valid
-                if path and os.path.exists(path):
-                    with open(path, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        
-                    # Process data based on its structure
-                    # This depends on how your knowledge files are structured
-                    if isinstance(data, dict):
-                        for key, items in data.items():
-                            if isinstance(items, list):
-                                for item in items:
-                                    if isinstance(item, dict):
-                                        content = json.dumps(item)
-                                        kb.add_document({
-                                            "content": content,
-                                            "metadata": {
-                                                "source": kb_name,
-                                                "category": key
-                                            }
-                                        })
-                    
-                    # Store the knowledge base
-                    self.knowledge_bases[kb_name] = kb
-                    
+                with startup.stage("open compiled index (background)"):
+                    return open_compiled(self.embedding_model, index_path)
             except Exception as e:
-                print(f"Error loading knowledge base {kb_name}: {e}")
+                print(f"Error opening compiled knowledge index {index_path}: {e}")
+                return None
+        
+        # Submitted first, so the tasks waiting for it never hold every worker
+        compiled = _load_executor.submit(open_index)
+        futures = {}
+        for kb_name, kb_info in AVAILABLE_KNOWLEDGE_BASES.items():
+            path = kb_info.get('path', '')
+            # Make sure path exists and is valid
+            if path and os.path.exists(path):
+                futures[kb_name] = _load_executor.submit(self._load_knowledge_base, kb_name, path, compiled)
+        return _LoadingBases(futures)
     
-    def add_document(self, document: Dict[str, Any]):
+    def _load_knowledge_base(self, kb_name: str, path: str, compiled: Future) -> Optional[KnowledgeBase]:
+        """Take a knowledge base from the compiled index, or load and embed its file; None on failure"""
+        if compiled.result() is not None and kb_name in compiled.result():
+            return compiled.result()[kb_name]
+        try:
+            with startup.stage(f"load {kb_name} (background)"):
+                kb = KnowledgeBase(self.embedding_model)
+                for document in load_knowledge_documents(kb_name, path):
+                    kb.add_document(document)
+        except Exception as e:
+            print(f"Error loading knowledge base {kb_name}: {e}")
+            return None
+        
+        try:
+            # Embed now rather than on the first search
+            kb.warm_up()
+        except Exception as e:
+            log('WARNING', f"Could not embed knowledge base {kb_name} yet, will retry on first search: {e}")
+        return kb
+    
+    def loaded(self) -> bool:
+        """Whether the shared knowledge bases have finished loading"""
+        return self.knowledge_bases.loaded()
+    
+    def wait(self):
+        """Block until the shared knowledge bases have finished loading"""
+        self.knowledge_bases.wait()
+    
+    @classmethod
+    def shared(cls) -> "KnowledgeManager":
+        """
+        Return the process-wide knowledge manager, building it on first use.
+        
+        Concurrent first callers wait for a single build instead of each loading the
+        knowledge files and embedding the corpus.
+        """
+        if cls._shared is None:
+            with cls._shared_lock:
+                if cls._shared is None:
+                    cls._shared = cls()
+        return cls._shared
+    
+    @classmethod
+    def session(cls) -> "KnowledgeManager":
+        """Create a per-session manager whose own documents layer on top of the shared index"""
+        return cls(base=cls.shared())
+    
+    def cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """Hit/miss counters of the persistent embedding cache and the query cache"""
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "queries": self.query_cache.stats()
+        }
+    
+    def add_document(self, document: Dict[str, Any]) -> str:
         """Add a document to the general knowledge base"""
-        self.general_kb.add_document(document)
+        return self.general_kb.add_document(document)
+    
+    def _get_base(self, kb_name: Optional[str]) -> KnowledgeBase:
+        """Resolve a knowledge base name, None meaning the general knowledge base"""
+        if kb_name is None:
+            return self.general_kb
+        if self.base is not None:
+            raise ValueError("Shared knowledge bases are read-only; add session documents to the general knowledge base")
+        if kb_name not in self.knowledge_bases:
+            raise KeyError(f"Knowledge base '{kb_name}' not found")
+        return self.knowledge_bases[kb_name]
+    
+    def upsert_document(self, document: Dict[str, Any], kb_name: Optional[str] = None) -> str:
+        """Insert or replace a document; only new or changed content is re-embedded"""
+        return self._get_base(kb_name).upsert(document)
     
-    def search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
+    def delete_document(self, doc_id: str, kb_name: Optional[str] = None) -> bool:
+        """Delete a document by ID from a knowledge base"""
+        return self._get_base(kb_name).delete(doc_id)
+    
+    def search(self, query: str, top_k: int = 3, min_score: Optional[float] = None,
+               filter: Optional[MetadataFilter] = None) -> List[Dict[str, Any]]:
         """Search across all knowledge bases"""
-        results = []
+        return self.search_in_bases(query, list(self.knowledge_bases.keys()), top_k=top_k, min_score=min_score,
+                                    filter=filter)
+    
+    def search_in_bases(self, query: str, kb_names: List[str], top_k: int = 3,
+                        min_score: Optional[float] = None,
+                        filter: Optional[MetadataFilter] = None) -> List[Dict[str, Any]]:
+        """
+        Search only in specified knowledge bases (the general knowledge base is always included).
         
-        # Search general knowledge base
-        general_results = self.general_kb.search(query, top_k=top_k)
-        results.extend(general_results)
+        Args:
+            query: Search query
+            kb_names: Names of the specialist knowledge bases to search
+            top_k: Number of documents to return across all knowledge bases
+            min_score: Minimum cosine similarity for a vector hit (defaults to KNOWLEDGE_MIN_SCORE)
+            filter: Only search documents whose metadata matches, e.g. {"source": "emergency-resources"}
+            
+        Returns:
+            Best documents overall, each a copy of the stored document with a 'score' field
+        """
+        hits_by_base = self.collect_hits(query, kb_names, top_k=top_k, filter=filter)
+        return self.merge_hits(hits_by_base, kb_names, top_k=top_k, min_score=min_score)
+    
+    def collect_hits(self, query: str, kb_names: List[str], top_k: int = 3,
+                     query_embedding: Optional[List[float]] = None,
+                     mode: Optional[str] = None,
+                     filter: Optional[MetadataFilter] = None) -> Dict[Optional[str], Dict[str, Optional[List[Tuple[Dict[str, Any], float]]]]]:
+        """
+        Run a search and return each knowledge base's own top hits, without merging.
         
-        # Search all specific knowledge bases
-        for kb_name, kb in self.knowledge_bases.items():
-            kb_results = kb.search(query, top_k=1)  # Limit results from each KB
-            results.extend(kb_results)
+        Lets callers fetch candidates for a superset of knowledge bases up front and pick
+        the subset later with merge_hits. If the query can't be embedded, the search
+        falls back to keywords only.
         
-        # Sort by relevance and limit to top_k
-        results = sorted(results, key=lambda x: x.get('score', 0), reverse=True)[:top_k]
+        Args:
+            query: Search query
+            kb_names: Names of the specialist knowledge bases to search
+            top_k: Number of documents the caller will keep
+            query_embedding: Embedding of the query, if already computed
+            mode: "vector", "lexical" or "hybrid" (defaults to KNOWLEDGE_SEARCH_MODE)
+            filter: Only search documents whose metadata matches; the filter selects the
+                candidate rows before any scoring
+            
+        Returns:
+            Keyed by knowledge base name (None for the general knowledge base), the
+            "vector" and "lexical" (document, score) hits, or None for a retriever not run
+        """
+        mode = mode or self.search_mode
+        depth = top_k * HYBRID_CANDIDATES if mode == "hybrid" else top_k
         
-        return results
-    
-    def search_in_bases(self, query: str, kb_names: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
-        """Search only in specified knowledge bases"""
-        results = []
+        # Embed the query once and reuse it for every knowledge base
+        if mode != "lexical" and query_embedding is None:
+            try:
+                query_embedding = self.embedding_model.get_embedding(query)
+            except Exception as e:
+                log('WARNING', f"Embedding unavailable, using keyword search: {e}")
+                mode, depth = "lexical", top_k
+        
+        def search(kb: KnowledgeBase) -> Dict[str, Optional[List[Tuple[Dict[str, Any], float]]]]:
+            return {
+                "vector": kb.search_by_vector(query_embedding, top_k=depth, filter=filter) if mode != "lexical" else None,
+                "lexical": kb.search_lexical(query, top_k=depth, filter=filter) if mode != "vector" else None
+            }
         
-        # Always search in general knowledge base
-        general_results = self.general_kb.search(query, top_k=1)
-        results.extend(general_results)
+        # Any global top hit is among the top hits of its own knowledge base
+        general_hits = search(self.general_kb)
+        if self.base is not None:
+            for kind, hits in search(self.base.general_kb).items():
+                if hits is not None:
+                    general_hits[kind] = general_hits[kind] + hits
         
-        # Search in specified knowledge bases
+        hits_by_base = {None: general_hits}
         for kb_name in kb_names:
             if kb_name in self.knowledge_bases:
-                kb_results = self.knowledge_bases[kb_name].search(query, top_k=1)
-                results.extend(kb_results)
+                hits_by_base[kb_name] = search(self.knowledge_bases[kb_name])
+        return hits_by_base
+    
+    def merge_hits(self, hits_by_base: Dict[Optional[str], Dict[str, Optional[List[Tuple[Dict[str, Any], float]]]]],
+                   kb_names: List[str], top_k: int = 3,
+                   min_score: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Merge hits from collect_hits, restricted to the general and the named knowledge bases.
+        
+        When both retrievers ran, their global rankings are fused by reciprocal rank and
+        the 'score' of a document is its fused score; otherwise it is the cosine or BM25 score.
+        min_score applies to cosine similarities; in hybrid mode a document below it is
+        dropped from both rankings, so keyword matches can't bring it back.
+        
+        Returns:
+            Best documents overall, each a copy of the stored document with a 'score' field
+        """
+        rankings = {}
+        for kind in ("vector", "lexical"):
+            hits = None
+            for kb_name in [None] + list(kb_names):
+                base_hits = hits_by_base.get(kb_name, {}).get(kind)
+                if base_hits is not None:
+                    hits = (hits or []) + base_hits
+            if hits is not None:
+                rankings[kind] = hits
         
-        # Sort by relevance and limit to top_k
-        results = sorted(results, key=lambda x: x.get('score', 0), reverse=True)[:top_k]
+        if "vector" in rankings:
+            if min_score is None:
+                min_score = self.min_score
+            if min_score is not None:
+                rankings["vector"] = [hit for hit in rankings["vector"] if hit[1] >= min_score]
+                if "lexical" in rankings:
+                    # BM25 scores have no comparable cutoff, so keyword hits are only fused for
+                    # documents whose cosine similarity passes it
+                    passed = {doc['id'] for doc, _ in rankings["vector"]}
+                    rankings["lexical"] = [hit for hit in rankings["lexical"] if hit[0]['id'] in passed]
+        
+        if len(rankings) < 2:
+            hits = next(iter(rankings.values()), [])
+            best = heapq.nlargest(top_k, hits, key=lambda hit: hit[1])
+            return [dict(doc, score=score) for doc, score in best]
+        return self._fuse_hits(rankings["vector"], rankings["lexical"], top_k)
+    
+    def _fuse_hits(self, vector_hits: List[Tuple[Dict[str, Any], float]],
+                   lexical_hits: List[Tuple[Dict[str, Any], float]], top_k: int) -> List[Dict[str, Any]]:
+        """Fuse the vector and BM25 rankings by reciprocal rank and keep the top k"""
+        documents = {}
+        rankings = []
+        for hits in (vector_hits, lexical_hits):
+            ranking = []
+            for doc, _ in sorted(hits, key=lambda hit: hit[1], reverse=True):
+                if doc['id'] in ranking:
+                    continue
+                documents.setdefault(doc['id'], doc)
+                ranking.append(doc['id'])
+            rankings.append(ranking)
         
-        return results
\ No newline at end of file
+        fused = reciprocal_rank_fusion(rankings)[:top_k]
+        return [dict(documents[doc_id], score=score) for doc_id, score in fused]
@@ -0,0 +1,90 @@
+import os
+import json
+import argparse
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from knowledge.vector_store import VectorStore, STORAGE_TYPES
+from knowledge.compiler import DEFAULT_INDEX_PATH
+
+def _recall(store: VectorStore, queries: np.ndarray, truth: np.ndarray, top_k: int) -> float:
+    """Average fraction of the exact top k that a store returns."""
+    found = 0
+    for query, expected in zip(queries, truth):
+        rows, _ = store.search(query, top_k)
+        found += len(np.intersect1d(rows, expected))
+    return found / truth.size
+
+def storage_report(embeddings: np.ndarray, queries: np.ndarray, top_k: int = 5,
+                   dimensions: Sequence[int] = ()) -> List[Dict[str, Any]]:
+    """
+    Compare the memory and recall of each storage type on a set of embeddings.
+
+    Recall is measured against exhaustive float32 search. Truncated dimensions keep the
+    leading components of each vector, which is what providers return for a smaller
+    `dimensions` with Matryoshka-trained models such as OpenAI and Qwen v3; truncated
+    stores have no full-precision rows to rescore against.
+
+    Args:
+        embeddings: L2-normalized document embeddings, float32 or float16
+        queries: Query embeddings
+        top_k: Number of results per query
+        dimensions: Truncated dimensions to evaluate besides the full one
+
+    Returns:
+        One row per configuration: storage, dimension, bytes, saving, and recall with
+        and without full-precision rescoring
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    queries = np.asarray(queries, dtype=np.float32)
+    reference = VectorStore()
+    reference.attach(embeddings)
+    truth = np.array([reference.search(query, top_k)[0] for query in queries])
+    full_bytes = reference.nbytes
+
+    report = []
+    for dimension in [embeddings.shape[1]] + [d for d in dimensions if d < embeddings.shape[1]]:
+        truncated = embeddings[:, :dimension]
+        for storage in STORAGE_TYPES:
+            store = VectorStore(storage=storage)
+            store.add(truncated)
+            row = {
+                "storage": storage,
+                "dimension": dimension,
+                "bytes": store.nbytes,
+                "saving": round(1 - store.nbytes / full_bytes, 3),
+                "recall": round(_recall(store, queries[:, :dimension], truth, top_k), 4),
+                "rescored_recall": None
+            }
+            if storage != "float32" and dimension == embeddings.shape[1]:
+                rescored = VectorStore(storage=storage)
+                rescored.attach(embeddings)
+                row["rescored_recall"] = round(_recall(rescored, queries, truth, top_k), 4)
+            report.append(row)
+    return report
+
+def main(argv: Optional[List[str]] = None):
+    """Command line entry point: python -m knowledge.storage_report [--index DIR] [--dimensions 256 512]"""
+    parser = argparse.ArgumentParser(description="Memory saved versus recall lost by compressed embedding storage")
+    parser.add_argument("--index", default=os.getenv("KNOWLEDGE_INDEX_PATH", DEFAULT_INDEX_PATH),
+                        help="compiled index to evaluate (default: %(default)s)")
+    parser.add_argument("--queries", type=int, default=200, help="number of sampled queries (default: %(default)s)")
+    parser.add_argument("--top-k", type=int, default=5, help="results per query (default: %(default)s)")
+    parser.add_argument("--dimensions", type=int, nargs="*", default=[256, 512],
+                        help="truncated dimensions to evaluate (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    path = os.path.join(args.index, "embeddings.npy")
+    if not os.path.exists(path):
+        parser.error(f"{path} not found; build the index with `python -m knowledge.compiler`")
+    embeddings = np.load(path, mmap_mode="r")
+
+    # Queries fall between documents: the normalized midpoint of two random rows
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, len(embeddings), size=(args.queries, 2))
+    queries = np.asarray(embeddings[pairs[:, 0]], dtype=np.float32) + np.asarray(embeddings[pairs[:, 1]], dtype=np.float32)
+    queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+    print(json.dumps(storage_report(embeddings, queries, args.top_k, args.dimensions), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+from typing import Tuple, Optional, Sequence
+import numpy as np
+
+# Storage types of the embedding matrix: float32, float16 (half the memory), or int8 with
+# a per-row scale (a quarter of the memory)
+STORAGE_TYPES = ("float32", "float16", "int8")
+
+# Rows upcast to float32 at a time when scoring a compressed matrix, to bound temporary memory
+SCORE_CHUNK_ROWS = 2048
+
+# Compressed stores shortlist this many candidates per requested row for full-precision rescoring
+RESCORE_CANDIDATES = 4
+
+class VectorStore:
+    """
+    Contiguous matrix of L2-normalized embeddings.
+
+    Because rows are normalized on insert, cosine similarity against a query is a
+    single matrix-vector product, and top-k selection uses argpartition instead of
+    sorting every score.
+
+    Rows are stored as float32, or compressed as float16 or int8. A compressed store
+    whose rows came from attach() keeps the attached array (typically a memory map of
+    the compiled index) and rescores a shortlist of candidates against it, so searches
+    only page in the shortlisted rows of the full-precision matrix. Attaching maps
+    precomputed codes when the compiled index has them; otherwise it reads and encodes
+    every row once.
+    """
+
+    def __init__(self, dimension: Optional[int] = None, storage: str = "float32"):
+        """
+        Initialize an empty vector store.
+
+        Args:
+            dimension: Embedding dimension (inferred from the first insert if omitted)
+            storage: "float32", "float16" or "int8"
+        """
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unsupported vector storage: {storage}")
+        self.dimension = dimension
+        self.storage = storage
+        self._dtype = np.dtype(storage)
+        self._matrix = np.zeros((0, dimension or 0), dtype=self._dtype)
+        self._scales = np.zeros(0, dtype=np.float32)  # per-row scale of int8 codes
+        self._full = None                             # full-precision rows from attach(), for rescoring
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """View of the stored rows, in the storage type."""
+        return self._matrix[:self._size]
+
+    @property
+    def scales(self) -> Optional[np.ndarray]:
+        """Per-row scales of int8 codes (a row decodes as codes * scale), None for other storage types."""
+        return self._scales[:self._size] if self.storage == "int8" else None
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the stored rows (an attached full-precision matrix is not counted)."""
+        return self.matrix.nbytes + (self._scales[:self._size].nbytes if self.storage == "int8" else 0)
+
+    def attach(self, matrix: np.ndarray, codes: Optional[np.ndarray] = None, scales: Optional[np.ndarray] = None):
+        """
+        Use an array of already normalized rows as the store's contents.
+        
+        A float32 store uses a float32 array without copying, and a float16 store a
+        float16 one. The arrays may be read-only memory maps; they are copied into
+        memory on the first change, so an unchanged store keeps sharing pages with other
+        processes. A compressed store uses the given codes without copying, or else
+        encodes every row, and keeps a finer matrix for rescoring until the first change.
+        
+        Args:
+            matrix: float32 or float16 array of shape (rows, dimension) with L2-normalized rows
+            codes: The rows already in the storage type (e.g. from the compiled index)
+            scales: Per-row scales of int8 codes
+        """
+        if matrix.ndim != 2 or matrix.dtype not in (np.float32, np.float16):
+            raise ValueError("Expected a 2-D float32 or float16 matrix")
+        self.dimension = matrix.shape[1]
+        self._size = len(matrix)
+        if self.storage == "float32":
+            self._matrix = matrix if matrix.dtype == np.float32 else np.asarray(matrix, dtype=np.float32)
+            self._full = None
+            return
+        # Rescoring only helps against rows finer than the stored ones
+        self._full = None if matrix.dtype == self._dtype else matrix
+        if codes is None and matrix.dtype == self._dtype:
+            codes = matrix
+        if codes is not None:
+            if codes.shape != matrix.shape or codes.dtype != self._dtype or (self.storage == "int8" and scales is None):
+                raise ValueError(f"Codes don't match the matrix or the {self.storage} storage")
+            self._matrix = codes
+            if self.storage == "int8":
+                self._scales = scales
+            return
+        self._matrix = np.zeros((len(matrix), self.dimension), dtype=self._dtype)
+        self._scales = np.zeros(len(matrix), dtype=np.float32)
+        for start in range(0, len(matrix), SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, len(matrix))
+            self._encode(start, np.asarray(matrix[start:end], dtype=np.float32))
+
+    def _make_writable(self):
+        """Copy attached read-only rows into memory, and stop rescoring against them, before a change."""
+        self._full = None
+        if not self._matrix.flags.writeable:
+            self._matrix = np.array(self._matrix)
+        if not self._scales.flags.writeable:
+            self._scales = np.array(self._scales)
+
+    def _encode(self, rows, vectors: np.ndarray):
+        """Store normalized float32 vectors at rows (an index array or a start offset) in the storage type."""
+        if isinstance(rows, (int, np.integer)):
+            rows = slice(rows, rows + len(vectors))
+        if self.storage == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self._matrix[rows] = np.rint(vectors / scales[:, np.newaxis]).astype(np.int8)
+            self._scales[rows] = scales
+        else:
+            self._matrix[rows] = vectors
+
+    def vectors(self, rows: np.ndarray) -> np.ndarray:
+        """Stored rows as float32 (decoded from the storage type)."""
+        vectors = self._matrix[rows].astype(np.float32, copy=False)
+        if self.storage == "int8":
+            vectors = vectors * self._scales[rows][..., np.newaxis]
+        return vectors
+
+    def _score(self, query: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Dot products of a normalized query with all rows, or with the given rows."""
+        if self.storage == "float32":
+            return (self.matrix if rows is None else self._matrix[rows]) @ query
+        count = self._size if rows is None else len(rows)
+        scores = np.empty(count, dtype=np.float32)
+        # Upcast a cache-sized chunk at a time; BLAS needs float32 operands
+        for start in range(0, count, SCORE_CHUNK_ROWS):
+            end = min(start + SCORE_CHUNK_ROWS, count)
+            chunk = self._matrix[start:end] if rows is None else self._matrix[rows[start:end]]
+            scores[start:end] = chunk.astype(np.float32) @ query
+        if self.storage == "int8":
+            scores *= self._scales[:self._size] if rows is None else self._scales[rows]
+        return scores
+
+    def _select(self, rows: Optional[np.ndarray], scores: np.ndarray, query: np.ndarray,
+                top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top k of scored rows (None meaning every row), best first.
+
+        With a full-precision matrix at hand, a compressed store takes a wider shortlist
+        and rescores it exactly.
+        """
+        if self._full is None:
+            indices, top = self._top_k(scores, top_k)
+            return (indices if rows is None else rows[indices]), top
+        indices, _ = self._top_k(scores, top_k * RESCORE_CANDIDATES)
+        shortlist = indices if rows is None else rows[indices]
+        indices, top = self._top_k(np.asarray(self._full[shortlist], dtype=np.float32) @ query, top_k)
+        return shortlist[indices], top
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows, leaving all-zero rows untouched."""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def add(self, vectors: Sequence[Sequence[float]]):
+        """
+        Append vectors to the store.
+
+        Args:
+            vectors: Embeddings to append, all of the same dimension
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.size == 0:
+            return
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        if self.dimension is None:
+            self.dimension = vectors.shape[1]
+            self._matrix = np.zeros((0, self.dimension), dtype=np.float32)
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected vectors of dimension {self.dimension}, got {vectors.shape[1]}")
+
+        self._full = None
+        needed = self._size + len(vectors)
+        if needed > len(self._matrix):
+            # Grow geometrically so repeated appends stay amortized O(1) per row
+            capacity = max(needed, 2 * len(self._matrix), 16)
+            grown = np.zeros((capacity, self.dimension), dtype=self._dtype)
+            grown[:self._size] = self.matrix
+            self._matrix = grown
+            if self.storage == "int8":
+                scales = np.ones(capacity, dtype=np.float32)
+                scales[:self._size] = self._scales[:self._size]
+                self._scales = scales
+        self._encode(self._size, self._normalize(vectors))
+        self._size = needed
+
+    def set(self, rows: Sequence[int], vectors: Sequence[Sequence[float]]):
+        """
+        Overwrite existing rows in place.
+
+        Args:
+            rows: Row indices to overwrite
+            vectors: New embeddings, one per row
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) and (rows.min() < 0 or rows.max() >= self._size):
+            raise IndexError("Row index out of range")
+        self._make_writable()
+        self._encode(rows, self._normalize(vectors))
+
+    def remove(self, row: int):
+        """
+        Remove a row by moving the last row into its place.
+
+        Callers that keep data aligned with rows must apply the same swap.
+
+        Args:
+            row: Row index to remove
+        """
+        if not 0 <= row < self._size:
+            raise IndexError("Row index out of range")
+        self._make_writable()
+        last = self._size - 1
+        if row != last:
+            self._matrix[row] = self._matrix[last]
+            if self.storage == "int8":
+                self._scales[row] = self._scales[last]
+        self._matrix[last] = 0
+        self._size = last
+
+    def clear(self):
+        """Remove all vectors."""
+        self._matrix = np.zeros((0, self.dimension or 0), dtype=self._dtype)
+        self._scales = np.zeros(0, dtype=np.float32)
+        self._full = None
+        self._size = 0
+
+    def refresh(self):
+        """Bring derived search structures up to date, so search() only reads; nothing to do here."""
+
+    def search(self, query: Sequence[float], top_k: int = 3,
+               rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the rows most similar to a query vector.
+
+        Args:
+            query: Query embedding
+            top_k: Number of rows to return
+            rows: Candidate rows (e.g. from a metadata filter); only these are scored
+
+        Returns:
+            (row indices, cosine scores), best match first
+        """
+        if self._size == 0 or top_k <= 0 or (rows is not None and len(rows) == 0):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        query = self._normalize(np.asarray(query, dtype=np.float32))
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+        return self._select(rows, self._score(query, rows), query, top_k)
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Select the top_k highest scores in descending order."""
+        if top_k < len(scores):
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
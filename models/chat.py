@@ -1,7 +1,11 @@
 import os
-from typing import List, Dict, Any, Optional, Union
-from openai import OpenAI
-from dotenv import load_dotenv
+import json
+import threading
+from typing import List, Dict, Any, Optional, Union, Iterator, AsyncIterator
+from utils.env import load_env
+
+# openai, httpx and requests take most of a cold start to import, so they are imported
+# when the first client is created rather than with this module
 
 class ChatModel:
     """
@@ -9,6 +13,10 @@ class ChatModel:
     Supported providers: openai, deepseek, qwen, silicoflow, ollama
     """
     
+    # Prompt token usage of all chat calls in the process, for the provider prompt-cache hit ratio
+    _usage = {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_reported_tokens": 0}
+    _usage_lock = threading.Lock()
+    
     def __init__(self, 
                  provider: str = "deepseek", 
                  api_key: Optional[str] = None,
@@ -23,7 +31,7 @@ class ChatModel:
             api_base: API base URL (optional, defaults to standard endpoints)
             chat_model: Chat model name (optional, uses provider-specific defaults)
         """
-        load_dotenv()
+        load_env()
 
         self.provider = provider.lower()
         
@@ -49,12 +57,84 @@ class ChatModel:
         else:
             raise ValueError(f"Unsupported provider: {provider}")
 
-        # Initialize OpenAI client for all providers
+        # OpenAI client for all providers, created on first use
+        self._client = None
+        self._client_lock = threading.Lock()
+    
+    @property
+    def client(self):
+        """The provider client, created (and its library imported) on first access."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+    
+    def warm_up(self):
+        """Create the client now, e.g. in a background thread while the user is typing."""
+        return self.client
+    
+    def _create_client(self):
+        """Create the OpenAI-compatible client for the configured provider."""
+        from openai import OpenAI
         # Special handling for Ollama which doesn't use API keys
         if self.provider == "ollama":
-            self.client = OpenAI(base_url=self.api_base)
-        else:
-            self.client = OpenAI(api_key=self.api_key, base_url=self.api_base)
+            return OpenAI(base_url=self.api_base)
+        return OpenAI(api_key=self.api_key, base_url=self.api_base)
+    
+    def _build_params(self, messages: List[Dict[str, str]], temperature: float,
+                      max_tokens: Optional[int], model: Optional[str], stream: bool) -> Dict[str, Any]:
+        """Build the chat completion request shared by the sync and async clients."""
+        params = {
+            "model": model or self.chat_model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": stream,
+        }
+        if max_tokens:
+            params["max_tokens"] = max_tokens
+        if stream and self.provider != "ollama":
+            # Ask for a final chunk carrying token usage
+            params["stream_options"] = {"include_usage": True}
+        return params
+    
+    @staticmethod
+    def _cached_tokens(usage) -> Optional[int]:
+        """Prompt tokens served from the provider's cache, or None if the provider doesn't say."""
+        # OpenAI and Qwen report prompt_tokens_details.cached_tokens, DeepSeek prompt_cache_hit_tokens
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details is not None else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return cached
+    
+    @classmethod
+    def record_usage(cls, usage):
+        """Add the token usage of a completion to the process-wide counters."""
+        if usage is None:
+            return
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or 0
+        cached = cls._cached_tokens(usage)
+        with cls._usage_lock:
+            cls._usage["calls"] += 1
+            cls._usage["prompt_tokens"] += prompt_tokens
+            if cached is not None:
+                cls._usage["cached_tokens"] += cached
+                cls._usage["cache_reported_tokens"] += prompt_tokens
+    
+    @classmethod
+    def usage_stats(cls) -> Dict[str, Any]:
+        """
+        Return prompt token counters and the cached-token ratio.
+        
+        The ratio only counts calls whose provider reports cached tokens.
+        """
+        with cls._usage_lock:
+            stats = dict(cls._usage)
+        reported = stats.pop("cache_reported_tokens")
+        stats["cached_token_ratio"] = stats["cached_tokens"] / reported if reported else 0.0
+        return stats
+    
     def generate_response(self, 
                           messages: List[Dict[str, str]], 
                           temperature: float = 0.7, 
@@ -72,24 +152,13 @@ class ChatModel:
         Returns:
             Generated response text
         """
-        # Use specified model or default
-        model_name = model or self.chat_model
-        
         try:
             # Create params dict
-            params = {
-                "model": model_name,
-                "messages": messages,
-                "temperature": temperature,
-            }
-            
-            if max_tokens:
-                params["max_tokens"] = max_tokens
+            params = self._build_params(messages, temperature, max_tokens, model, stream=False)
                 
             # Special handling for Ollama's different API endpoint
             if self.provider == "ollama":
                 # For Ollama, we use the client but with custom endpoint
-                params["stream"] = False
                 response = self.client.post(
                     url="chat",
                     json=params
@@ -99,10 +168,123 @@ class ChatModel:
             else:
                 # For OpenAI-compatible APIs, use the standard client method
                 response = self.client.chat.completions.create(**params)
+                self.record_usage(response.usage)
+                return response.choices[0].message.content
+                
+        except Exception as e:
+            raise Exception(f"{self.provider.capitalize()} API error: {str(e)}")
+    
+    def stream_response(self, 
+                        messages: List[Dict[str, str]], 
+                        temperature: float = 0.7, 
+                        max_tokens: Optional[int] = None,
+                        model: Optional[str] = None) -> Iterator[str]:
+        """
+        Generate a response as a stream of text chunks.
+        
+        Takes the same arguments as generate_response, but yields the reply while the
+        model is still generating it, so callers can show the first tokens right away.
+        
+        Yields:
+            Successive pieces of the generated response text
+        """
+        try:
+            params = self._build_params(messages, temperature, max_tokens, model, stream=True)
+            
+            if self.provider == "ollama":
+                import requests
+                # Ollama streams newline-delimited JSON objects from its native chat endpoint
+                with requests.post(f"{self.api_base}/chat", json=params, stream=True) as response:
+                    response.raise_for_status()
+                    for line in response.iter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        content = chunk.get("message", {}).get("content")
+                        if content:
+                            yield content
+                        if chunk.get("done"):
+                            break
+            else:
+                for chunk in self.client.chat.completions.create(**params):
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if getattr(chunk, "usage", None):
+                        self.record_usage(chunk.usage)
+                        
+        except Exception as e:
+            raise Exception(f"{self.provider.capitalize()} API error: {str(e)}")
+
+
+
+class AsyncChatModel(ChatModel):
+    """
+    Asyncio counterpart of ChatModel built on AsyncOpenAI.
+    
+    Takes the same constructor arguments; generate_response and stream_response are
+    coroutines / async generators, so many conversations can share one event loop.
+    """
+    
+    def _create_client(self):
+        """Create the async OpenAI-compatible client for the configured provider."""
+        if self.provider == "ollama":
+            import httpx
+            # Ollama is called on its native endpoint with a pooled async HTTP client
+            return httpx.AsyncClient(base_url=self.api_base, timeout=httpx.Timeout(60.0, connect=5.0))
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(api_key=self.api_key, base_url=self.api_base)
+    
+    async def generate_response(self, 
+                                messages: List[Dict[str, str]], 
+                                temperature: float = 0.7, 
+                                max_tokens: Optional[int] = None,
+                                model: Optional[str] = None) -> str:
+        """Async version of ChatModel.generate_response."""
+        try:
+            params = self._build_params(messages, temperature, max_tokens, model, stream=False)
+            
+            if self.provider == "ollama":
+                response = await self.client.post("/chat", json=params)
+                response.raise_for_status()
+                return response.json()["message"]["content"]
+            else:
+                response = await self.client.chat.completions.create(**params)
+                self.record_usage(response.usage)
                 return response.choices[0].message.content
                 
         except Exception as e:
             raise Exception(f"{self.provider.capitalize()} API error: {str(e)}")
+    
+    async def stream_response(self, 
+                              messages: List[Dict[str, str]], 
+                              temperature: float = 0.7, 
+                              max_tokens: Optional[int] = None,
+                              model: Optional[str] = None) -> AsyncIterator[str]:
+        """Async version of ChatModel.stream_response."""
+        try:
+            params = self._build_params(messages, temperature, max_tokens, model, stream=True)
+            
+            if self.provider == "ollama":
+                async with self.client.stream("POST", "/chat", json=params) as response:
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        content = chunk.get("message", {}).get("content")
+                        if content:
+                            yield content
+                        if chunk.get("done"):
+                            break
+            else:
+                async for chunk in await self.client.chat.completions.create(**params):
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if getattr(chunk, "usage", None):
+                        self.record_usage(chunk.usage)
+                        
+        except Exception as e:
+            raise Exception(f"{self.provider.capitalize()} API error: {str(e)}")
 
 
 # Usage examples:
@@ -118,6 +300,17 @@ class ChatModel:
 # model = ChatModel(provider="openai", api_key="your-api-key")
 # response = model.generate_response(messages=[...])
 
-# 3. Using local Ollama
+# 3. Streaming a response
+# for chunk in model.stream_response(messages=[...]):
+#     print(chunk, end="", flush=True)
+
+# 4. Async usage, e.g. inside an asyncio server
+# model = AsyncChatModel(provider="qwen")
+# response = await model.generate_response(messages=[...])
+
+# 5. Share of prompt tokens served from the provider's prompt cache
+# print(ChatModel.usage_stats()["cached_token_ratio"])
+
+# 6. Using local Ollama
 # model = ChatModel(provider="ollama")
 # response = model.generate_response(messages=[...], model="llama3")
\ No newline at end of file
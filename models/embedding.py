@@ -1,12 +1,65 @@
-import requests
 import json
 import os
-from typing import List, Optional, Dict, Any, Union
+import time
+import random
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Union, Tuple, TYPE_CHECKING
+from models.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+from models.hashed_embedding import HashedEmbedder, DEFAULT_DIMENSIONS
+from utils.env import load_env
+from utils.tokens import estimate_tokens
+
+# requests and httpx are imported when the first session or async client is created
+if TYPE_CHECKING:
+    import httpx
+    import requests
+
+# Per-request limits for providers that accept a list of inputs.
+# Token counts are estimates (see utils.tokens.estimate_tokens), so they are kept below the documented caps.
+BATCH_LIMITS: Dict[str, Dict[str, int]] = {
+    "openai": {"max_items": 2048, "max_tokens": 250000},
+    "qwen": {"max_items": 10, "max_tokens": 60000},
+    "silicoflow": {"max_items": 32, "max_tokens": 16000},
+}
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Keep-alive sessions shared by every EmbeddingModel talking to the same endpoint
+_sessions: Dict[str, "requests.Session"] = {}
+_sessions_lock = threading.Lock()
+
+# Async clients are bound to the event loop they were created on, so keep one per loop and endpoint
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = weakref.WeakKeyDictionary()
+
+PROVIDER_LABELS = {"ollama": "Ollama", "openai": "OpenAI", "silicoflow": "SilicoFlow", "qwen": "Qwen", "local": "Local"}
+
+def _get_session(api_base: str, pool_size: int) -> "requests.Session":
+    """Return the pooled session for an API endpoint, creating it on first use."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    with _sessions_lock:
+        session = _sessions.get(api_base)
+        if session is None:
+            session = requests.Session()
+            # Retries are handled by EmbeddingModel._post so they can honor Retry-After and jitter
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[api_base] = session
+        return session
 
 class EmbeddingModel:
     """Model for generating text embeddings using various providers."""
     
-    def __init__(self, provider: str = "ollama", model_name: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(self, provider: str = "ollama", model_name: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: int = 4, dimensions: Optional[int] = None,
+                 cache: Optional[EmbeddingCache] = None, query_cache: Optional[QueryEmbeddingCache] = None,
+                 timeout: Tuple[float, float] = (3.05, 30.0), max_retries: int = 3,
+                 backoff_factor: float = 0.5, backoff_max: float = 8.0):
         """
         Initialize the embedding model.
         
@@ -14,9 +67,26 @@ class EmbeddingModel:
             provider: Provider name ("ollama", "openai", "silicoflow", or "qwen")
             model_name: Name of the embedding model (provider-specific)
             api_key: API key for cloud services (not needed for Ollama)
+            max_concurrency: Maximum number of embedding requests in flight in get_embeddings
+            dimensions: Output dimension to request from providers that support it (OpenAI v3, Qwen v3)
+            cache: Optional persistent cache consulted before calling the provider
+            query_cache: Optional in-memory cache for get_embedding, meant for user queries
+            timeout: (connect, read) timeout in seconds for each HTTP request
+            max_retries: Retries after a connection error, timeout, 429 or 5xx response
+            backoff_factor: Base delay in seconds; retry n waits up to backoff_factor * 2**n
+            backoff_max: Upper bound in seconds for a single retry delay
         """
+        load_env()
         self.provider = provider.lower()
         self.api_key = api_key
+        self.max_concurrency = max(1, max_concurrency)
+        self.dimensions = dimensions
+        self.cache = cache
+        self.query_cache = query_cache
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.backoff_factor = backoff_factor
+        self.backoff_max = backoff_max
         
         # Set default models and endpoints based on provider
         if self.provider == "ollama":
@@ -34,8 +104,23 @@ class EmbeddingModel:
             self.model = model_name or "text-embedding-v3"
             self.api_key = api_key or os.getenv("QWEN_API_KEY")
             self.api_base = "https://dashscope.aliyuncs.com/compatible-mode/v1"
+        elif self.provider == "local":
+            # In-process hashed n-gram embeddings: no network, so no caching either
+            self.model = model_name or "hashed-ngram-v1"
+            self.dimensions = dimensions or DEFAULT_DIMENSIONS
+            self.api_base = None
+            self._local = HashedEmbedder(self.dimensions)
         else:
             raise ValueError(f"Unsupported provider: {provider}")
+        
+        self._session = None
+    
+    @property
+    def session(self) -> "requests.Session":
+        """Pooled HTTP session for this endpoint, looked up on first request."""
+        if self._session is None:
+            self._session = _get_session(self.api_base, pool_size=max(10, self.max_concurrency))
+        return self._session
     
     def get_embedding(self, text: str) -> List[float]:
         """
@@ -45,8 +130,31 @@ class EmbeddingModel:
             text: Text to embed
             
         Returns:
-            Embedding vector
+            Embedding vector (a float32 array for the local provider)
         """
+        if self.provider == "local":
+            return self._local.embed([text])[0]
+        
+        if self.query_cache:
+            embedding = self.query_cache.get(text)
+            if embedding is not None:
+                return embedding
+        
+        if self.cache:
+            key = self._cache_key(text)
+            embedding = self.cache.get(key)
+            if embedding is None:
+                embedding = self._embed(text)
+                self.cache.put(key, embedding)
+        else:
+            embedding = self._embed(text)
+        
+        if self.query_cache:
+            self.query_cache.put(text, embedding)
+        return embedding
+    
+    def _embed(self, text: str) -> List[float]:
+        """Embed a single text with the configured provider."""
         if self.provider == "ollama":
             return self._get_ollama_embedding(text)
         elif self.provider == "openai":
@@ -58,12 +166,156 @@ class EmbeddingModel:
         else:
             raise ValueError(f"Unsupported provider: {self.provider}")
     
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for many texts with as few requests as possible.
+        
+        Texts are grouped into batches that respect the provider's item and token
+        limits, and up to max_concurrency batches are sent at once. Ollama has no
+        batch endpoint, so its texts are embedded one per request, concurrently.
+        The local provider embeds all texts in one vectorized pass.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            Embedding vectors in the same order as texts (a float32 matrix for the local provider)
+        """
+        if self.provider == "local":
+            return self._local.embed(texts)
+        
+        if not self.cache:
+            return self._embed_many(texts)
+        
+        keys = [self._cache_key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        
+        # Only send texts the cache doesn't know, each distinct text once
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        if missing:
+            fresh = self._embed_many(missing)
+            fresh_items = [(self._cache_key(text), embedding) for text, embedding in zip(missing, fresh)]
+            self.cache.put_many(fresh_items)
+            cached.update(fresh_items)
+        
+        return [cached[key] for key in keys]
+    
+    def _cache_key(self, text: str) -> str:
+        """Build the cache key for a text under this provider, model and dimension."""
+        return EmbeddingCache.make_key(self.provider, self.model, self.dimensions, text)
+    
+    def _embed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the provider, batching and parallelizing the requests."""
+        if not texts:
+            return []
+        
+        if self.provider in BATCH_LIMITS:
+            batches = self._split_batches(texts)
+            embed = self._get_batch_embeddings
+        else:
+            batches = [[text] for text in texts]
+            embed = lambda batch: [self._embed(batch[0])]
+        
+        if len(batches) == 1:
+            return embed(batches[0])
+        
+        embeddings = []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            # map() preserves batch order, so the result lines up with texts
+            for batch_embeddings in executor.map(embed, batches):
+                embeddings.extend(batch_embeddings)
+        return embeddings
+    
+    def _split_batches(self, texts: List[str]) -> List[List[str]]:
+        """Split texts into consecutive batches within the provider's request limits."""
+        limits = BATCH_LIMITS[self.provider]
+        batches = []
+        batch = []
+        batch_tokens = 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if batch and (len(batch) >= limits["max_items"] or batch_tokens + tokens > limits["max_tokens"]):
+                batches.append(batch)
+                batch = []
+                batch_tokens = 0
+            batch.append(text)
+            batch_tokens += tokens
+        if batch:
+            batches.append(batch)
+        return batches
+    
+    def _get_batch_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Embed a batch of texts with a single request to an OpenAI-compatible endpoint."""
+        if self.provider == "openai":
+            return self._request_embeddings(texts, "OpenAI")
+        elif self.provider == "silicoflow":
+            return self._request_embeddings(texts, "SilicoFlow")
+        elif self.provider == "qwen":
+            return self._request_embeddings(texts, "Qwen")
+        else:
+            raise ValueError(f"Batch embeddings not supported for provider: {self.provider}")
+    
+    def _request_embeddings(self, inputs: Union[str, List[str]], label: str) -> List[List[float]]:
+        """Call an OpenAI-compatible /embeddings endpoint and return the vectors in input order."""
+        payload, headers = self._embeddings_request(inputs)
+        response = self._post(f"{self.api_base}/embeddings", payload, headers)
+        if response.status_code != 200:
+            raise Exception(f"{label} API error: {response.text}")
+        return self._parse_embeddings(response.json())
+    
+    def _embeddings_request(self, inputs: Union[str, List[str]]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Build the payload and headers of an OpenAI-compatible /embeddings request."""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "model": self.model,
+            "input": inputs
+        }
+        if self.dimensions and self.provider in ("openai", "qwen"):
+            payload["dimensions"] = self.dimensions
+        return payload, headers
+    
+    @staticmethod
+    def _parse_embeddings(result: Dict[str, Any]) -> List[List[float]]:
+        """Extract the vectors of an OpenAI-compatible /embeddings response in input order."""
+        data = sorted(result["data"], key=lambda item: item.get("index", 0))
+        return [item["embedding"] for item in data]
+    
+    def _post(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> "requests.Response":
+        """
+        POST over the pooled session, retrying transient failures with jittered exponential backoff.
+        
+        The last response is returned when retries run out, so callers report the provider's error.
+        """
+        import requests
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(url, headers=headers, json=payload, timeout=self.timeout)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+            attempt += 1
+            time.sleep(delay)
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Seconds to wait before the next attempt: Retry-After if given, else full-jitter backoff."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_factor * (2 ** attempt)))
+    
     def _get_ollama_embedding(self, text: str) -> List[float]:
         """Get embedding from Ollama local API."""
-        response = requests.post(
-            f"{self.api_base}/embeddings",
-            json={"model": self.model, "prompt": text}
-        )
+        response = self._post(f"{self.api_base}/embeddings", {"model": self.model, "prompt": text})
         if response.status_code != 200:
             raise Exception(f"Ollama API error: {response.text}")
         result = response.json()
@@ -71,60 +323,132 @@ class EmbeddingModel:
     
     def _get_openai_embedding(self, text: str) -> List[float]:
         """Get embedding from OpenAI API."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(
-            f"{self.api_base}/embeddings",
-            headers=headers,
-            json={
-                "input": text,
-                "model": self.model
-            }
-        )
-        if response.status_code != 200:
-            raise Exception(f"OpenAI API error: {response.text}")
-        result = response.json()
-        return result["data"][0]["embedding"]
+        return self._request_embeddings(text, "OpenAI")[0]
     
     def _get_silicoflow_embedding(self, text: str) -> List[float]:
         """Get embedding from SilicoFlow API."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(
-            f"{self.api_base}/embeddings",
-            headers=headers,
-            json={
-                "input": text,
-                "model": self.model
-            }
-        )
-        if response.status_code != 200:
-            raise Exception(f"SilicoFlow API error: {response.text}")
-        result = response.json()
-        return result["data"][0]["embedding"]
+        return self._request_embeddings(text, "SilicoFlow")[0]
     
     def _get_qwen_embedding(self, text: str) -> List[float]:
         """Get embedding from Alibaba Cloud Qwen API."""
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-        response = requests.post(
-            f"{self.api_base}/embeddings",
-            headers=headers,
-            json={
-                "model": self.model,
-                "input": text
-            }
-        )
-        if response.status_code != 200:
-            raise Exception(f"Qwen API error: {response.text}")
-        result = response.json()
-        return result["data"][0]["embedding"]
+        return self._request_embeddings(text, "Qwen")[0]
+    
+    # Asyncio API: same caching, batching and retry behavior over a pooled httpx.AsyncClient.
+    # The persistent cache is SQLite, which can wait on a busy writer, so it is queried
+    # from a worker thread instead of the event loop.
+    
+    async def aget_embedding(self, text: str) -> List[float]:
+        """Async version of get_embedding."""
+        if self.provider == "local":
+            return self.get_embedding(text)
+        
+        if self.query_cache:
+            embedding = self.query_cache.get(text)
+            if embedding is not None:
+                return embedding
+        
+        key = self._cache_key(text) if self.cache else None
+        embedding = await asyncio.to_thread(self.cache.get, key) if self.cache else None
+        if embedding is None:
+            embedding = (await self._aembed_many([text]))[0]
+            if self.cache:
+                await asyncio.to_thread(self.cache.put, key, embedding)
+        
+        if self.query_cache:
+            self.query_cache.put(text, embedding)
+        return embedding
+    
+    async def aget_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Async version of get_embeddings."""
+        if self.provider == "local":
+            return self.get_embeddings(texts)
+        
+        if not self.cache:
+            return await self._aembed_many(texts)
+        
+        keys = [self._cache_key(text) for text in texts]
+        cached = await asyncio.to_thread(self.cache.get_many, keys)
+        
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        if missing:
+            fresh = await self._aembed_many(missing)
+            fresh_items = [(self._cache_key(text), embedding) for text, embedding in zip(missing, fresh)]
+            await asyncio.to_thread(self.cache.put_many, fresh_items)
+            cached.update(fresh_items)
+        
+        return [cached[key] for key in keys]
+    
+    async def _aembed_many(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts with the provider, sending up to max_concurrency batch requests at once."""
+        if not texts:
+            return []
+        
+        batches = self._split_batches(texts) if self.provider in BATCH_LIMITS else [[text] for text in texts]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def embed(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                if self.provider == "ollama":
+                    response = await self._apost(f"{self.api_base}/embeddings", {"model": self.model, "prompt": batch[0]})
+                    if response.status_code != 200:
+                        raise Exception(f"Ollama API error: {response.text}")
+                    return [response.json()["embedding"]]
+                
+                payload, headers = self._embeddings_request(batch)
+                response = await self._apost(f"{self.api_base}/embeddings", payload, headers)
+                if response.status_code != 200:
+                    raise Exception(f"{PROVIDER_LABELS[self.provider]} API error: {response.text}")
+                return self._parse_embeddings(response.json())
+        
+        embeddings = []
+        # gather() preserves batch order, so the result lines up with texts
+        for batch_embeddings in await asyncio.gather(*(embed(batch) for batch in batches)):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+    
+    def _async_client(self) -> "httpx.AsyncClient":
+        """Return the pooled async client for this endpoint on the running event loop."""
+        import httpx
+        clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(self.api_base)
+        if client is None:
+            connect, read = self.timeout
+            client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read, connect=connect),
+                limits=httpx.Limits(max_connections=max(10, self.max_concurrency), max_keepalive_connections=10)
+            )
+            clients[self.api_base] = client
+        return client
+    
+    @staticmethod
+    async def aclose():
+        """
+        Close the pooled async clients of the running event loop.
+        
+        Clients are shared by every EmbeddingModel on the loop, so call this once the loop
+        is done embedding, e.g. before asyncio.run() returns; later calls open new ones.
+        """
+        clients = _async_clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+    
+    async def _apost(self, url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> "httpx.Response":
+        """Async version of _post."""
+        import httpx
+        client = self._async_client()
+        attempt = 0
+        while True:
+            try:
+                response = await client.post(url, headers=headers, json=payload)
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt)
+            attempt += 1
+            await asyncio.sleep(delay)
 
 
 # Usage examples:
@@ -138,4 +462,17 @@ class EmbeddingModel:
 # embedding_model = EmbeddingModel(provider="silicoflow", model_name="bge-large-zh", api_key="your-api-key")
 
 # 4. Use Qwen
-# embedding_model = EmbeddingModel(provider="qwen", api_key="your-api-key")
\ No newline at end of file
+# embedding_model = EmbeddingModel(provider="qwen", api_key="your-api-key")
+
+# 5. Cache embeddings on disk across restarts
+# embedding_model = EmbeddingModel(provider="qwen", cache=EmbeddingCache("knowledge/cache/embeddings.db"))
+
+# 6. Embed many texts in a few batched requests
+# vectors = embedding_model.get_embeddings(["first text", "second text"])
+
+# 7. Async usage, sharing one event loop
+# vector = await embedding_model.aget_embedding("some text")
+# await EmbeddingModel.aclose()  # when the loop is done embedding
+
+# 8. Local hashed n-gram embeddings: offline, in-process, no API key
+# embedding_model = EmbeddingModel(provider="local", dimensions=512)
\ No newline at end of file
@@ -0,0 +1,294 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import List, Optional, Dict, Iterable, Tuple
+
+# Access times of cache hits are buffered and written in one transaction once this many keys
+# are pending or this many seconds have passed since the last write
+ACCESS_FLUSH_KEYS = 256
+ACCESS_FLUSH_SECONDS = 30.0
+
+# The running total of stored bytes is recounted at most this often, since other processes
+# write to the same database, and always before evicting
+SIZE_RECOUNT_SECONDS = 300.0
+
+class EmbeddingCache:
+    """
+    On-disk, content-addressed cache of embedding vectors.
+
+    Entries are keyed by a hash of (provider, model, dimensions, text), so the same
+    text embedded by a different model never collides. The store is a SQLite database
+    in WAL mode, which lets several threads and processes read and write it at once.
+    When the stored vectors exceed max_bytes, the least recently used entries are evicted.
+
+    Neither reads nor writes scan the table: the stored size is tracked as a running
+    total, and recency updates from hits are batched.
+    """
+
+    def __init__(self, path: str = "knowledge/cache/embeddings.db", max_bytes: int = 256 * 1024 * 1024):
+        """
+        Initialize the embedding cache.
+
+        Args:
+            path: Path of the SQLite database file (created if missing)
+            max_bytes: Maximum total size of stored vectors before eviction
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._stats_lock = threading.Lock()
+        self._size_estimate = None                # stored bytes, tracked since the last recount
+        self._size_counted = 0.0                  # monotonic time of the last recount
+        self._touched = {}                        # key -> access time of hits not yet written
+        self._touched_flushed = time.monotonic()  # monotonic time of the last access time write
+        self._pending_lock = threading.Lock()     # guards the four fields above
+        # sqlite3 connections can't be shared between threads, so keep one per thread
+        self._local = threading.local()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Return this thread's connection to the cache database."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(provider: str, model: str, dimensions: Optional[int], text: str) -> str:
+        """Build the content-addressed key for a text embedded by a given model."""
+        material = f"{provider}\0{model}\0{dimensions or ''}\0{text}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """
+        Look up several keys at once.
+
+        Args:
+            keys: Cache keys from make_key
+
+        Returns:
+            Mapping of the keys that were found to their vectors
+        """
+        found = {}
+        if not keys:
+            return found
+
+        conn = self._connection()
+        unique_keys = list(dict.fromkeys(keys))
+        # Stay well below SQLite's limit on bound parameters
+        for start in range(0, len(unique_keys), 500):
+            chunk = unique_keys[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            rows = conn.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", chunk
+            ).fetchall()
+            for key, blob in rows:
+                vector = array("f")
+                vector.frombytes(blob)
+                found[key] = vector.tolist()
+
+        if found:
+            self._touch(found)
+
+        with self._stats_lock:
+            self.hits += sum(1 for key in keys if key in found)
+            self.misses += sum(1 for key in keys if key not in found)
+        return found
+
+    def get(self, key: str) -> Optional[List[float]]:
+        """Look up a single key, returning None on a miss."""
+        return self.get_many([key]).get(key)
+
+    def _touch(self, keys: Iterable[str]):
+        """Record hits, writing their access times once enough are buffered."""
+        now = time.time()
+        with self._pending_lock:
+            for key in keys:
+                self._touched[key] = now
+            due = (len(self._touched) >= ACCESS_FLUSH_KEYS
+                   or time.monotonic() - self._touched_flushed >= ACCESS_FLUSH_SECONDS)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered access times of cache hits to the database."""
+        with self._pending_lock:
+            touched, self._touched = self._touched, {}
+            self._touched_flushed = time.monotonic()
+        if not touched:
+            return
+        conn = self._connection()
+        try:
+            conn.executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                             [(accessed, key) for key, accessed in touched.items()])
+            conn.commit()
+        except sqlite3.OperationalError:
+            # Recency is only a hint for eviction; never fail a read because the database is busy
+            conn.rollback()
+
+    def put_many(self, items: Iterable[Tuple[str, List[float]]]):
+        """
+        Store several vectors and evict old entries if the cache is over its size limit.
+
+        Args:
+            items: (key, vector) pairs
+        """
+        now = time.time()
+        rows = []
+        for key, vector in items:
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        if not rows:
+            return
+
+        conn = self._connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, vector, size, last_access) VALUES (?, ?, ?, ?)", rows
+        )
+        conn.commit()
+        with self._stats_lock:
+            self.writes += len(rows)
+        with self._pending_lock:
+            if self._size_estimate is not None:
+                # Replaced entries are counted twice; the recount before evicting corrects it
+                self._size_estimate += sum(row[2] for row in rows)
+        self._evict(conn)
+
+    def put(self, key: str, vector: List[float]):
+        """Store a single vector."""
+        self.put_many([(key, vector)])
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Delete least recently used entries until the cache is below 90% of max_bytes."""
+        with self._pending_lock:
+            estimate = self._size_estimate
+            recount = estimate is None or time.monotonic() - self._size_counted >= SIZE_RECOUNT_SECONDS
+        if not recount and estimate <= self.max_bytes:
+            return
+
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        with self._pending_lock:
+            self._size_estimate = total
+            self._size_counted = time.monotonic()
+        if total <= self.max_bytes:
+            return
+
+        # Evict by up-to-date recency
+        self.flush()
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM embeddings ORDER BY last_access"):
+            doomed.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+        conn.commit()
+        with self._pending_lock:
+            self._size_estimate = total - freed
+        with self._stats_lock:
+            self.evictions += len(doomed)
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss/write/eviction counters for this process."""
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions
+            }
+
+
+class QueryEmbeddingCache:
+    """
+    In-memory LRU cache of query embeddings with a time-to-live.
+
+    Queries are normalized (whitespace collapsed, lowercased) before lookup, so
+    "I feel anxious" and "i feel  anxious " share one entry.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600.0):
+        """
+        Initialize the query cache.
+
+        Args:
+            max_size: Maximum number of cached queries
+            ttl: Seconds an entry stays valid
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # normalized query -> (expires_at, vector)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Collapse whitespace and case so trivially different inputs share an entry."""
+        return " ".join(text.split()).lower()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for a query, or None if missing or expired."""
+        key = self.normalize(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text: str, vector: List[float]):
+        """Cache the embedding of a query, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        key = self.normalize(text)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and the current number of entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "size": len(self._entries)
+            }
@@ -0,0 +1,102 @@
+from typing import List
+import numpy as np
+
+# Dimension of local embeddings when none is requested
+DEFAULT_DIMENSIONS = 512
+
+# Lengths of the character n-grams hashed from every text; characters of CJK and other
+# scripts without spaces (from U+2E80) are also hashed on their own
+NGRAM_SIZES = (2, 3, 4)
+CJK_START = 0x2E80
+
+# Texts embedded per vectorized pass; bounds the temporary n-gram arrays (about 100 bytes
+# per character) when a whole knowledge base is embedded at once
+BATCH_TEXTS = 1024
+
+# Odd 64-bit multipliers, one per position in an n-gram, and the splitmix64 finalizer
+_POSITION_MULTIPLIERS = [np.uint64(0x9E3779B97F4A7C15), np.uint64(0xC2B2AE3D27D4EB4F),
+                         np.uint64(0x165667B19E3779F9), np.uint64(0xD6E8FEB86659FD93)]
+_MIX_1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX_2 = np.uint64(0x94D049BB133111EB)
+
+class HashedEmbedder:
+    """
+    Deterministic embeddings from hashed character n-grams, computed in-process.
+
+    Every n-gram of a lowercased text is hashed to one of `dimensions` buckets with a
+    random sign (the hashing trick), and the bucket counts are L2-normalized. Texts
+    sharing many n-grams (words, word pieces, Chinese characters and character pairs)
+    get a high cosine similarity. It captures surface overlap rather than meaning, but
+    needs no network, model file or training, and a query embeds in microseconds.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS):
+        """
+        Initialize the embedder.
+
+        Args:
+            dimensions: Number of hash buckets, i.e. the embedding dimension
+        """
+        if dimensions <= 0:
+            raise ValueError("dimensions must be positive")
+        self.dimensions = dimensions
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts.
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 array of shape (len(texts), dimensions) with L2-normalized rows
+            (all-zero for texts without characters)
+        """
+        if len(texts) > BATCH_TEXTS:
+            return np.concatenate([self._embed_batch(texts[start:start + BATCH_TEXTS])
+                                   for start in range(0, len(texts), BATCH_TEXTS)])
+        return self._embed_batch(texts)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in one vectorized pass."""
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+
+        # One code point array for the whole batch: texts are separated by NUL and padded
+        # with spaces, so n-grams mark the start and end of words
+        normalized = (" ".join(text.lower().replace("\0", " ").split()) for text in texts)
+        joined = "\0".join(f" {text} " if text else "" for text in normalized)
+        codes = np.frombuffer(joined.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+        separators = codes == 0
+        rows = np.cumsum(separators)
+
+        hashes, owners = [], []
+        for n in NGRAM_SIZES:
+            count = len(codes) - n + 1
+            if count <= 0:
+                continue
+            h = np.full(count, n, dtype=np.uint64)
+            for k in range(n):
+                h += codes[k:k + count] * _POSITION_MULTIPLIERS[k]
+            # Keep n-grams that don't cross into another text
+            inside = (rows[:count] == rows[n - 1:]) & ~separators[:count]
+            hashes.append(h[inside])
+            owners.append(rows[:count][inside])
+        cjk = codes >= CJK_START
+        hashes.append(codes[cjk] * _POSITION_MULTIPLIERS[0] + np.uint64(1))
+        owners.append(rows[cjk])
+
+        h = np.concatenate(hashes)
+        h ^= h >> np.uint64(30)
+        h *= _MIX_1
+        h ^= h >> np.uint64(27)
+        h *= _MIX_2
+        h ^= h >> np.uint64(31)
+
+        buckets = np.concatenate(owners).astype(np.int64) * self.dimensions + (h % np.uint64(self.dimensions)).astype(np.int64)
+        signs = 1.0 - 2.0 * (h >> np.uint64(63)).astype(np.float64)
+        matrix = np.bincount(buckets, weights=signs, minlength=len(texts) * self.dimensions)
+        matrix = matrix.reshape(len(texts), self.dimensions).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
@@ -3,6 +3,8 @@ from prompts.tools import AVAILABLE_TOOLS
 from prompts.knowledge import AVAILABLE_KNOWLEDGE_BASES
 
 # define the agent prompts
+# A node may also set "knowledge_filter", a metadata filter such as {"category": "techniques"}
+# that narrows its knowledge search to matching documents
 AGENT_PROMPT: Dict[str, Dict[str, Any]] = {
     "greeting": {
         "prompt": "Hello! I'm here to help you today. How are you feeling?",
@@ -32,7 +34,17 @@ AGENT_PROMPT: Dict[str, Dict[str, Any]] = {
         "prompt": "Here are some strategies that might help: {strategies}. Would you like to discuss any of these in more detail?",
         "next": "closing",
         "tools": ["coping_strategies"],
-        "knowledge": ["coping_techniques", "self_help_resources"]
+        "knowledge": ["coping_techniques", "self_help_resources"],
+        # Session documents other than techniques and resources stay out of strategy suggestions
+        "knowledge_filter": {"category": ["techniques", "resources"]}
+    },
+    "crisis": {
+        "prompt": "I'm really glad you told me, and your safety matters most right now. Please reach out to emergency services or a crisis line: {resources}. Are you safe at the moment?",
+        "next": "support",
+        "tools": [],
+        "knowledge": [],
+        # Only emergency contacts are retrieved, never general material
+        "knowledge_filter": {"source": "emergency-resources"}
     },
     "closing": {
         "prompt": "I hope our conversation has been helpful. Is there anything else you'd like to talk about?",
@@ -1,4 +1,6 @@
 # This file contains system prompts that define the behavior and personality of the agents.
+import json
+from typing import Any, Dict
 
 def get_assistant_prompt(node_id, node_info):
     """
@@ -22,5 +24,50 @@ template above. Personalize your response based on the conversation history and
 Keep your response concise (3-4 sentences maximum).
 """
 
+def get_tools_prompt(tools: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Describe the tools the assistant may call and the format of a tool call.
+    
+    Args:
+        tools (dict): Tool schemas by name, in the order they should be listed
+        
+    Returns:
+        str: Text to append to the assistant prompt, or "" if there are no tools
+    """
+    if not tools:
+        return ""
+    tools_description = json.dumps(tools, indent=2, ensure_ascii=False)
+    return (f"\n\nYou have access to the following tools:\n{tools_description}\n"
+            "\nIf you believe a tool would help address the user's needs, you can use it by responding with:\n"
+            '{"tool": "tool_name", "parameters": {"param1": "value1", ...}}'
+            "\nBe warm, empathetic, and conversational - avoid clinical or generic questions\n"
+            "\nOnly use tools when they would clearly benefit the conversation.")
+
+def compile_node_prompts(nodes: Dict[str, Dict[str, Any]], tools: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, str]]:
+    """
+    Render the system prompts of every node once.
+    
+    The rendered strings are reused verbatim on every call, so the start of each
+    request is byte-identical across turns and can be served from provider prompt caches.
+    
+    Args:
+        nodes (dict): Conversation nodes (AGENT_PROMPT)
+        tools (dict): All tool schemas (AVAILABLE_TOOLS)
+        
+    Returns:
+        dict: For each node ID, the "assistant" prompt and the "tools" prompt
+        (the assistant prompt followed by the node's tool descriptions)
+    """
+    compiled = {}
+    for node_id, node_info in nodes.items():
+        assistant_prompt = get_assistant_prompt(node_id, node_info)
+        node_tools = {tool: tools[tool] for tool in node_info.get("tools", []) if tool in tools}
+        compiled[node_id] = {
+            "assistant": assistant_prompt,
+            "tools": assistant_prompt + get_tools_prompt(node_tools)
+        }
+    return compiled
+
 # Example usage:
-# ASSISTANT_PROMPT = get_assistant_prompt(current_node_id, current_node_info)
\ No newline at end of file
+# ASSISTANT_PROMPT = get_assistant_prompt(current_node_id, current_node_info)
+# NODE_PROMPTS = compile_node_prompts(AGENT_PROMPT, AVAILABLE_TOOLS)
\ No newline at end of file
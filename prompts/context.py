@@ -0,0 +1,10 @@
+# This file contains the prompts used to condense conversation history that no longer fits the context budget.
+
+SUMMARY_PROMPT = """You maintain a running summary of a counseling conversation for the assistant.
+Update the existing summary with the new messages below. Keep what still matters: the user's situation,
+feelings, important events, assessments taken and their outcomes, and strategies already suggested.
+Drop greetings and small talk. Write in the language of the conversation, in at most {max_words} words.
+Respond with the updated summary only.
+"""
+
+SUMMARY_CONTEXT = "Summary of the earlier conversation (older messages are not shown):\n{summary}"
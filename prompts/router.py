@@ -0,0 +1,60 @@
+from typing import Dict, List
+
+# Example user messages for each conversation node; their embeddings act as node prototypes
+ROUTER_EXAMPLES: Dict[str, List[str]] = {
+    "greeting": [
+        "Hello",
+        "Hi, can we start over?",
+        "你好",
+    ],
+    "assessment": [
+        "I don't really know how to describe it",
+        "Something has been bothering me lately",
+        "最近心里有点乱，不知道怎么说",
+    ],
+    "reflection": [
+        "I've been feeling really anxious and can't sleep at night",
+        "I feel sad and empty most of the day",
+        "我最近总是很焦虑，晚上睡不着",
+    ],
+    "exploration": [
+        "I think it started when I lost my job",
+        "Maybe it's because of the pressure from my family",
+        "可能是因为工作压力太大了",
+    ],
+    "support": [
+        "What can I do to feel better?",
+        "Do you have any tips to calm down?",
+        "有什么方法可以让我放松一点吗",
+    ],
+    "closing": [
+        "Thank you, that helped a lot. Bye",
+        "I think that's all for today",
+        "谢谢你，今天就到这里吧",
+    ],
+    "crisis": [
+        "I don't want to live anymore",
+        "I've been thinking about hurting myself",
+        "我不想活了",
+    ],
+    "tool_use": [
+        "Can I take an anxiety test?",
+        "I want to do a depression assessment",
+        "我想做一个抑郁测试",
+    ],
+}
+
+# Phrases that strongly indicate a node, matched case-insensitively (ASCII phrases on word boundaries)
+ROUTER_KEYWORDS: Dict[str, List[str]] = {
+    "greeting": ["hello", "hi there", "start over", "你好", "重新开始"],
+    "assessment": ["not sure", "don't know", "不知道", "说不清"],
+    "reflection": ["i feel", "i've been feeling", "i am feeling", "我觉得", "我感觉", "我最近"],
+    "exploration": ["because", "started when", "caused by", "why do i", "因为", "为什么", "原因"],
+    "support": ["what can i do", "how can i", "help me", "tips", "advice", "strategy", "strategies",
+                "怎么办", "有什么方法", "建议", "帮帮我"],
+    "closing": ["thank you", "thanks", "bye", "goodbye", "that's all", "谢谢", "再见", "就到这里"],
+    "crisis": ["kill myself", "suicide", "suicidal", "end my life", "hurt myself", "self harm", "self-harm",
+               "want to die", "自杀", "不想活", "轻生", "伤害自己"],
+    "tool_use": ["test", "assessment", "questionnaire", "quiz", "screening", "gad-7", "phq-9",
+                 "测试", "评估", "量表", "问卷"],
+}
@@ -1,13 +1,18 @@
-import streamlit as st
-from agents.workflow import Workflow
-import os
+from utils import startup
+startup.begin()
+
+with startup.stage("import application"):
+    import streamlit as st
+    from agents.workflow import Workflow
+    import os
 
 def initialize_session():
     """Initialize session state variables if they don't exist"""
     if 'conversation_history' not in st.session_state:
         st.session_state.conversation_history = []
     if 'workflow' not in st.session_state:
-        st.session_state.workflow = Workflow()
+        with startup.stage("Workflow()"):
+            st.session_state.workflow = Workflow()
     if 'current_node' not in st.session_state:
         st.session_state.current_node = "greeting"
     if 'greeting_shown' not in st.session_state:
@@ -87,7 +92,11 @@ def process_user_input(user_input):
         if hasattr(st.session_state.workflow, 'get_next_node'):
             current_node = workflow.get_next_node(current_node)
 
-    result = workflow.execute_node(current_node, user_input)
+    # Show the exchange right away and stream the reply as it is generated
+    with st.chat_message("user"):
+        st.markdown(user_input)
+    with st.chat_message("assistant", avatar="🧠"):
+        result = st.write_stream(workflow.execute_node_stream(current_node, user_input))
     
     # Add assistant response to history
     if result:
@@ -156,6 +165,7 @@ def main():
             'content': greeting
         })
         st.session_state.greeting_shown = True
+        startup.report()
     
     # Display conversation history
     display_conversation()
@@ -0,0 +1,59 @@
+import numpy as np
+from knowledge.ann import IVFIndex
+from knowledge.vector_store import VectorStore
+
+def _vectors(count, dimension=16, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _assert_consistent(index):
+    # Every row is in exactly one list, the list of the cluster it is assigned to
+    listed = sorted(row for rows in index._lists for row in rows)
+    assert listed == list(range(len(index)))
+    for cluster, rows in enumerate(index._lists):
+        assert all(index._assignments[row] == cluster for row in rows)
+        assert list(index._list_array(cluster)) == rows
+
+def test_trains_past_the_threshold():
+    index = IVFIndex(exact_threshold=100, nlist=8, nprobe=2)
+    index.add(_vectors(99))
+    index.refresh()
+    assert not index.trained
+    index.add(_vectors(1, seed=1))
+    index.refresh()
+    assert index.trained
+    _assert_consistent(index)
+
+def test_add_and_remove_keep_the_lists_consistent():
+    index = IVFIndex(exact_threshold=50, nlist=8, nprobe=8)
+    vectors = _vectors(200)
+    index.add(vectors[:100])
+    index.refresh()
+    index.add(vectors[100:150])
+    index.set([3, 120], vectors[150:152])
+    for row in [0, 10, 147, 50]:
+        index.remove(row)
+    _assert_consistent(index)
+    assert len(index) == 146
+
+def test_probing_every_cluster_matches_exact_search():
+    vectors = _vectors(400)
+    index, exact = IVFIndex(exact_threshold=50, nlist=10, nprobe=10), VectorStore()
+    index.add(vectors)
+    exact.add(vectors)
+    index.remove(5)
+    exact.remove(5)
+    for query in _vectors(5, seed=1):
+        assert list(index.search(query, top_k=5)[0]) == list(exact.search(query, top_k=5)[0])
+
+def test_retrains_once_the_store_doubles():
+    index = IVFIndex(exact_threshold=50, nlist=4)
+    index.add(_vectors(60))
+    index.refresh()
+    index.add(_vectors(59, seed=1))
+    index.refresh()
+    assert index._trained_size == 60
+    index.add(_vectors(1, seed=2))
+    index.refresh()
+    assert index._trained_size == 120
+    _assert_consistent(index)
@@ -0,0 +1,80 @@
+from agents.context import ContextBuilder
+
+class _SummaryClient:
+    """Chat client stand-in that records summary requests."""
+
+    def __init__(self):
+        self.requests = []
+
+    def generate_response(self, messages, **kwargs):
+        self.requests.append(messages[-1]["content"])
+        return f"summary {len(self.requests)}"
+
+def _history(count, words=20):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"message {i} " + "word " * words}
+            for i in range(count)]
+
+def _cost(builder, messages):
+    return sum(builder.count_tokens(message) for message in messages)
+
+def test_everything_fits_a_large_budget():
+    builder = ContextBuilder(budget=10000)
+    history = _history(6)
+    messages = builder.build("system", history)
+    assert messages == [{"role": "system", "content": "system"}] + history
+
+def test_window_keeps_the_newest_messages_within_budget():
+    builder = ContextBuilder(budget=150)
+    history = _history(20)
+    messages = builder.build("system", history)
+    assert _cost(builder, messages) <= 150
+    assert messages[-1] == history[-1]
+    assert messages[1:] == history[-(len(messages) - 1):]
+
+def test_latest_message_is_sent_even_over_budget():
+    builder = ContextBuilder(budget=10)
+    history = _history(3, words=200)
+    assert builder.build("system", history)[1:] == [history[-1]]
+
+def test_context_goes_just_before_the_latest_message():
+    builder = ContextBuilder(budget=10000)
+    history = _history(4)
+    messages = builder.build("system", history, context="Relevant knowledge")
+    assert messages[-2] == {"role": "system", "content": "Relevant knowledge"}
+    assert messages[-1] == history[-1]
+
+def test_evicted_messages_are_summarized_in_the_background():
+    client = _SummaryClient()
+    builder = ContextBuilder(client, budget=150)
+    history = _history(20)
+    first = builder.build("system", history)
+    builder.wait(5)
+    assert builder.summary == "summary 1"
+    assert "message 0 " in client.requests[0]
+
+    second = builder.build("system", history)
+    assert "summary 1" in second[-2]["content"]
+    assert _cost(builder, second) <= 150
+    # Summarized messages are not sent again
+    assert all(message in history[builder._summarized:] for message in second[1:-2])
+    assert len(second) <= len(first) + 1
+
+def test_no_summary_without_a_client_or_when_disabled():
+    builder = ContextBuilder(budget=150)
+    builder.build("system", _history(20))
+    builder.wait(5)
+    assert builder.summary == ""
+    client = _SummaryClient()
+    builder = ContextBuilder(client, budget=150)
+    builder.build("system", _history(20), summarize=False)
+    builder.wait(5)
+    assert client.requests == []
+
+def test_reset_forgets_the_summary():
+    builder = ContextBuilder(_SummaryClient(), budget=150)
+    builder.build("system", _history(20))
+    builder.wait(5)
+    builder.reset()
+    assert builder.summary == "" and builder._summarized == 0
+    messages = builder.build("system", _history(4), summarize=False)
+    assert all("Summary" not in message["content"] for message in messages)
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from models.embedding import EmbeddingModel, _async_clients
+from models.embedding_cache import EmbeddingCache
+
+class _ThreadRecordingCache(EmbeddingCache):
+    """Embedding cache that records which threads query it."""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.get_ident())
+        return super().get(key)
+
+    def get_many(self, keys):
+        self.threads.add(threading.get_ident())
+        return super().get_many(keys)
+
+def test_async_cache_lookups_run_off_the_event_loop(tmp_path):
+    cache = _ThreadRecordingCache(str(tmp_path / "embeddings.db"))
+    model = EmbeddingModel(provider="openai", api_key="unused", cache=cache)
+    texts = ["first text", "second text"]
+    cache.put_many([(model._cache_key(text), [float(i), 1.0]) for i, text in enumerate(texts)])
+
+    async def embed():
+        loop_thread = threading.get_ident()
+        # Every text is cached, so no request is sent
+        assert await model.aget_embeddings(texts) == [[0.0, 1.0], [1.0, 1.0]]
+        assert await model.aget_embedding("second text") == [1.0, 1.0]
+        return loop_thread
+
+    loop_thread = asyncio.run(embed())
+    assert cache.threads and loop_thread not in cache.threads
+
+def test_aclose_closes_the_loop_clients():
+    model = EmbeddingModel(provider="openai", api_key="unused")
+
+    async def open_and_close():
+        client = model._async_client()
+        await EmbeddingModel.aclose()
+        assert asyncio.get_running_loop() not in _async_clients
+        return client
+
+    assert asyncio.run(open_and_close()).is_closed
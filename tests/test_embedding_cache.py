@@ -0,0 +1,45 @@
+import itertools
+import time
+from models import embedding_cache
+from models.embedding_cache import EmbeddingCache, QueryEmbeddingCache
+
+VECTOR_BYTES = 16  # four float32 values
+
+def test_cache_round_trip(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"))
+    key = EmbeddingCache.make_key("qwen", "text-embedding-v3", 4, "hello")
+    assert key != EmbeddingCache.make_key("qwen", "text-embedding-v3", 8, "hello")
+    assert cache.get(key) is None
+    cache.put(key, [0.5, 1.0, 1.5, 2.0])
+    assert cache.get(key) == [0.5, 1.0, 1.5, 2.0]
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_eviction_drops_least_recently_used_entries(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(embedding_cache.time, "time", lambda: float(next(clock)))
+    cache = EmbeddingCache(str(tmp_path / "embeddings.db"), max_bytes=3 * VECTOR_BYTES)
+    for key in "abc":
+        cache.put(key, [1.0, 2.0, 3.0, 4.0])
+    # Reading "a" makes it the most recently used entry
+    assert cache.get("a") is not None
+    cache.put("d", [1.0, 2.0, 3.0, 4.0])
+    assert set(cache.get_many(["a", "b", "c", "d"])) == {"a", "d"}
+    assert cache.stats()["evictions"] == 2
+
+def test_query_cache_normalizes_and_evicts_lru():
+    cache = QueryEmbeddingCache(max_size=2)
+    cache.put("I feel  anxious ", [1.0])
+    cache.put("second", [2.0])
+    assert cache.get("i feel anxious") == [1.0]
+    cache.put("third", [3.0])
+    assert cache.get("second") is None
+    assert cache.get("I FEEL ANXIOUS") == [1.0]
+    assert cache.stats()["size"] == 2
+
+def test_query_cache_entries_expire():
+    cache = QueryEmbeddingCache(ttl=0.05)
+    cache.put("hello", [1.0])
+    assert cache.get("hello") == [1.0]
+    time.sleep(0.1)
+    assert cache.get("hello") is None
+    assert cache.stats()["size"] == 0
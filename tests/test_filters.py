@@ -0,0 +1,44 @@
+from knowledge.filters import MetadataIndex
+
+METADATA = [
+    {"source": "coping_techniques", "category": "techniques"},
+    {"source": "self_help_resources", "category": "resources"},
+    {"source": "emergency-resources", "category": "resources"},
+    {"source": "coping_techniques", "category": ["techniques", "sleep"]},
+    None
+]
+
+def _index():
+    index = MetadataIndex()
+    for metadata in METADATA:
+        index.add(metadata)
+    return index
+
+def test_rows_match_a_value_or_any_of_a_list():
+    index = _index()
+    assert list(index.rows({"category": "resources"})) == [1, 2]
+    assert list(index.rows({"category": ["techniques", "resources"]})) == [0, 1, 2, 3]
+    # List metadata values index each element
+    assert list(index.rows({"category": "sleep"})) == [3]
+    assert list(index.rows({"category": "missing"})) == []
+
+def test_fields_are_combined_with_and():
+    index = _index()
+    assert list(index.rows({"source": "coping_techniques", "category": "sleep"})) == [3]
+    assert list(index.rows({"source": "emergency-resources", "category": "techniques"})) == []
+
+def test_empty_filter_matches_every_row():
+    assert list(_index().rows({})) == [0, 1, 2, 3, 4]
+
+def test_remove_and_set_follow_row_swaps():
+    index = _index()
+    index.rows({"category": "resources"})  # fill the cache before changing rows
+    index.remove(1)
+    index.remove(0)
+    # Rows 4 and then 3 were moved into the freed slots
+    assert list(index.rows({"category": "resources"})) == [2]
+    assert list(index.rows({"category": "sleep"})) == [0]
+    index.set(2, {"category": "techniques"})
+    assert list(index.rows({"category": "resources"})) == []
+    assert list(index.rows({"category": "techniques"})) == [0, 2]
+    assert len(index) == 3
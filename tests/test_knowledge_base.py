@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+from knowledge.base import KnowledgeBase, content_hash
+from models.embedding import EmbeddingModel
+
+def _knowledge_base(*contents):
+    kb = KnowledgeBase(EmbeddingModel(provider="local"), storage="float32")
+    for index, content in enumerate(contents):
+        kb.add_document({"id": f"doc-{index}", "content": content})
+    kb.warm_up()
+    return kb
+
+def _assert_consistent(kb):
+    assert len(kb.vectors) == len(kb.lexical) == len(kb.documents)
+    assert kb._rows == {doc['id']: row for row, doc in enumerate(kb.documents)}
+    for doc in kb.documents:
+        assert doc['id'] in kb._hashes[content_hash(doc['content'])]
+    assert sum(len(ids) for ids in kb._hashes.values()) == len(kb.documents)
+    # Every row holds the embedding of its own document
+    expected = np.array(kb.embedding_model.get_embeddings([doc['content'] for doc in kb.documents]))
+    assert np.allclose(kb.vectors.matrix, expected, atol=1e-5)
+
+def test_add_without_id_deduplicates_content():
+    kb = _knowledge_base("Slow breathing calms the body.")
+    assert kb.add_document({"content": "Slow breathing calms the body."}) == "doc-0"
+    assert len(kb.documents) == 1
+
+def test_add_with_id_keeps_duplicate_content():
+    kb = _knowledge_base("Slow breathing calms the body.")
+    assert kb.add_document({"id": "copy", "content": "Slow breathing calms the body."}) == "copy"
+    assert kb.get_document("copy")["content"] == "Slow breathing calms the body."
+    kb.warm_up()
+    _assert_consistent(kb)
+
+def test_upsert_keeps_explicit_id_for_duplicate_content():
+    kb = _knowledge_base("Slow breathing calms the body.", "Grounding uses the five senses.")
+    assert kb.upsert({"id": "b", "content": "Slow breathing calms the body."}) == "b"
+    assert kb.get_document("b") is not None
+    kb.delete("doc-0")
+    # The remaining copy now answers content deduplication
+    assert kb.add_document({"content": "Slow breathing calms the body."}) == "b"
+    kb.warm_up()
+    _assert_consistent(kb)
+
+def test_upsert_replaces_content_in_place():
+    kb = _knowledge_base("Slow breathing calms the body.", "Grounding uses the five senses.")
+    kb.upsert({"id": "doc-0", "content": "Journaling helps untangle worries."})
+    assert content_hash("Slow breathing calms the body.") not in kb._hashes
+    assert kb._pending == {0}
+    kb.warm_up()
+    _assert_consistent(kb)
+    assert kb.search("writing down worries", top_k=1)[0][0]["id"] == "doc-0"
+
+def test_delete_swaps_last_row_into_the_gap():
+    kb = _knowledge_base("Slow breathing calms the body.", "Grounding uses the five senses.",
+                         "Journaling helps untangle worries.", "Regular sleep supports mood.")
+    kb.add_document({"id": "pending", "content": "Walking outside lifts energy."})
+    assert kb.delete("doc-1")
+    # The pending last document moved into row 1 and is still waiting for its embedding
+    assert kb._rows["pending"] == 1 and kb._pending == {1}
+    assert not kb.delete("doc-1")
+    kb.delete("doc-3")
+    kb.warm_up()
+    _assert_consistent(kb)
+    assert [doc['id'] for doc, _ in kb.search("go for a walk", top_k=1)] == ["pending"]
+
+class _BlockingModel:
+    """Local embedding model whose document embedding waits until released."""
+
+    def __init__(self):
+        self.model = EmbeddingModel(provider="local")
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_embedding(self, text):
+        return self.model.get_embedding(text)
+
+    def get_embeddings(self, texts):
+        self.started.set()
+        self.release.wait(5)
+        return self.model.get_embeddings(texts)
+
+def test_search_does_not_wait_for_an_embedding_in_another_thread():
+    kb = _knowledge_base("Slow breathing calms the body.", "Grounding uses the five senses.")
+    kb.embedding_model = _BlockingModel()
+    kb.add_document({"id": "walk", "content": "Walking outside lifts energy."})
+    embedding = threading.Thread(target=kb.warm_up)
+    embedding.start()
+    assert kb.embedding_model.started.wait(5)
+    # The new document isn't searchable yet, but the others are, without waiting
+    assert [doc['id'] for doc, _ in kb.search("go for a walk", top_k=3)] != []
+    assert "walk" not in [doc['id'] for doc, _ in kb.search("go for a walk", top_k=3)]
+    kb.embedding_model.release.set()
+    embedding.join(5)
+    assert kb.search("go for a walk", top_k=1)[0][0]["id"] == "walk"
+
+def test_rows_changed_while_embedding_stay_pending():
+    kb = _knowledge_base("Slow breathing calms the body.")
+    kb.embedding_model = _BlockingModel()
+    kb.add_document({"id": "walk", "content": "Walking outside lifts energy."})
+    embedding = threading.Thread(target=kb.warm_up)
+    embedding.start()
+    assert kb.embedding_model.started.wait(5)
+    kb.upsert({"id": "walk", "content": "Journaling helps untangle worries."})
+    kb.embedding_model.release.set()
+    embedding.join(5)
+    assert kb._pending == {1}
+    kb.warm_up()
+    _assert_consistent(kb)
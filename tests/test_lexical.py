@@ -0,0 +1,47 @@
+import numpy as np
+from knowledge.lexical import BM25Index, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "Insomnia makes it hard to fall asleep at night.",
+    "Panic attacks bring a racing heart and fear.",
+    "A regular bedtime helps with insomnia and sleep.",
+    "Breathing slowly can calm a racing heart."
+]
+
+def _index():
+    index = BM25Index()
+    for text in TEXTS:
+        index.add(text)
+    return index
+
+def test_tokenize_splits_chinese_into_characters_and_pairs():
+    assert tokenize("Can't SLEEP") == ["can't", "sleep"]
+    assert tokenize("睡不着") == ["睡", "不", "着", "睡不", "不着"]
+
+def test_search_ranks_documents_sharing_query_terms():
+    indices, scores = _index().search("insomnia sleep", top_k=3)
+    assert list(indices) == [2, 0]
+    assert scores[0] > scores[1] > 0
+
+def test_filtered_search_keeps_corpus_wide_scores():
+    index = _index()
+    all_indices, all_scores = index.search("racing heart", top_k=4)
+    indices, scores = index.search("racing heart", top_k=4, rows=np.array([0, 3]))
+    assert list(indices) == [3]
+    assert scores[0] == all_scores[list(all_indices).index(3)]
+    assert len(index.search("racing heart", top_k=4, rows=np.array([], dtype=np.int64))[0]) == 0
+
+def test_remove_and_set_move_postings_with_rows():
+    index = _index()
+    index.remove(0)
+    # The last document now lives in row 0
+    assert list(index.search("breathing", top_k=1)[0]) == [0]
+    assert list(index.search("insomnia", top_k=3)[0]) == [2]
+    index.set(2, "Journaling untangles worries.")
+    assert len(index.search("insomnia", top_k=3)[0]) == 0
+    assert list(index.search("journaling", top_k=3)[0]) == [2]
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "a", "d"]])
+    assert [key for key, _ in fused[:2]] in (["a", "b"], ["b", "a"])
+    assert fused[-1][0] in ("c", "d")
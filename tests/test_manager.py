@@ -0,0 +1,38 @@
+import pytest
+from knowledge.manager import KnowledgeManager
+
+DOCUMENTS = [
+    {"content": "Box breathing: inhale for four counts, hold, exhale, hold again.",
+     "metadata": {"source": "coping_techniques", "category": "techniques"}},
+    {"content": "I can feel my heart racing when I think about exams.",
+     "metadata": {"source": "symptom_patterns", "category": "patterns"}},
+    {"content": "Sleep hygiene means a regular bedtime and no screens before sleep.",
+     "metadata": {"source": "coping_techniques", "category": "techniques"}}
+]
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("EMBEDDING_PROVIDER", "local")
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embeddings.db"))
+    monkeypatch.setenv("KNOWLEDGE_INDEX_PATH", str(tmp_path / "index"))
+    monkeypatch.delenv("KNOWLEDGE_MIN_SCORE", raising=False)
+    manager = KnowledgeManager()
+    manager.wait()
+    for document in DOCUMENTS:
+        manager.add_document(document)
+    return manager
+
+@pytest.mark.parametrize("mode", ["vector", "hybrid"])
+def test_min_score_drops_everything_below_it(manager, mode):
+    manager.search_mode = mode
+    assert manager.search_in_bases("how can I calm my breathing", [], top_k=2, min_score=0.99) == []
+
+def test_hybrid_keeps_keyword_hits_that_pass_the_cutoff(manager):
+    manager.search_mode = "hybrid"
+    hits = manager.search_in_bases("box breathing", [], top_k=3, min_score=0.2)
+    assert hits and all(doc["id"] != manager.general_kb.documents[1]["id"] for doc in hits)
+    assert hits[0]["content"].startswith("Box breathing")
+
+def test_hybrid_without_cutoff_fuses_keyword_hits(manager):
+    manager.search_mode = "hybrid"
+    assert len(manager.search_in_bases("I can", [], top_k=3)) >= 1
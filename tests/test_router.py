@@ -0,0 +1,41 @@
+import pytest
+from agents.router import NodeRouter
+from knowledge.base import KnowledgeBase
+from models.embedding import EmbeddingModel
+from prompts.agent import AGENT_PROMPT
+
+@pytest.fixture(scope="module")
+def router():
+    return NodeRouter(AGENT_PROMPT, EmbeddingModel(provider="local"), threshold=0.6, audit_rate=0)
+
+@pytest.mark.parametrize("message", [
+    "I want to kill myself",
+    "I keep thinking about suicide",
+    "我不想活了",
+])
+def test_crisis_messages_route_to_crisis(router, message):
+    node, confidence = router.route("reflection", message)
+    assert node == "crisis"
+    assert confidence >= router.threshold
+
+@pytest.mark.parametrize("message", [
+    "I've been feeling really anxious and can't sleep at night",
+    "What can I do to feel better?",
+    "Thank you, that helped a lot. Bye",
+])
+def test_other_messages_do_not_route_to_crisis(router, message):
+    node, _ = router.route("reflection", message)
+    assert node != "crisis"
+
+def test_crisis_keywords_alone_pick_crisis():
+    node, _ = NodeRouter(AGENT_PROMPT).route("support", "I have thought about suicide")
+    assert node == "crisis"
+
+def test_crisis_node_only_retrieves_emergency_resources():
+    kb = KnowledgeBase(EmbeddingModel(provider="local"), storage="float32")
+    kb.add_document({"content": "If you might hurt yourself, call emergency services right away.",
+                     "metadata": {"source": "emergency-resources", "category": "resources"}})
+    kb.add_document({"content": "Hurt feelings after an argument can be eased by journaling.",
+                     "metadata": {"source": "coping_techniques", "category": "techniques"}})
+    hits = kb.search("I want to hurt myself", top_k=3, filter=AGENT_PROMPT["crisis"]["knowledge_filter"])
+    assert [doc["metadata"]["source"] for doc, _ in hits] == ["emergency-resources"]
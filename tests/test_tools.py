@@ -0,0 +1,34 @@
+from knowledge.base import KnowledgeBase
+from models.embedding import EmbeddingModel
+from tools.tools import ToolRegistry
+
+DOCUMENTS = [
+    {"content": "Insomnia is difficulty falling asleep or staying asleep at night."},
+    {"content": "Panic attacks are sudden episodes of intense fear with a racing heart."},
+    {"content": "Progressive muscle relaxation tenses and releases muscle groups in turn."}
+]
+
+def _knowledge_base(embedding_model=None):
+    kb = KnowledgeBase(embedding_model, storage="float32")
+    for document in DOCUMENTS:
+        kb.add_document(document)
+    return kb
+
+def test_symptom_search_with_embeddings():
+    tools = ToolRegistry(_knowledge_base(EmbeddingModel(provider="local")))
+    response = tools.execute_tool("symptom_search", {"symptom": "can't fall asleep at night"})
+    assert response["status"] == "success"
+    assert response["result"]["found"]
+    assert response["result"]["count"] == 2
+    assert response["result"]["information"][0] == DOCUMENTS[0]["content"]
+
+def test_symptom_search_with_keywords_only():
+    tools = ToolRegistry(_knowledge_base())
+    response = tools.execute_tool("symptom_search", {"symptom": "panic attacks"})
+    assert response["status"] == "success"
+    assert response["result"]["information"] == [DOCUMENTS[1]["content"]]
+
+def test_symptom_search_without_knowledge_base():
+    response = ToolRegistry().execute_tool("symptom_search", {"symptom": "insomnia"})
+    assert response["status"] == "success"
+    assert not response["result"]["found"]
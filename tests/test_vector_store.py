@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from knowledge.vector_store import VectorStore
+
+def _vectors(count, dimension=32, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_search_returns_the_most_similar_rows():
+    store = VectorStore(storage="float32")
+    vectors = _vectors(50)
+    store.add(vectors)
+    indices, scores = store.search(vectors[7], top_k=3)
+    assert indices[0] == 7 and scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert list(scores) == sorted(scores, reverse=True)
+    assert np.allclose(scores, vectors[indices] @ vectors[7], atol=1e-5)
+
+def test_search_scores_only_candidate_rows():
+    store = VectorStore(storage="float32")
+    vectors = _vectors(50)
+    store.add(vectors)
+    indices, _ = store.search(vectors[7], top_k=3, rows=np.array([1, 2, 3, 40]))
+    assert set(indices) <= {1, 2, 3, 40} and 7 not in indices
+
+@pytest.mark.parametrize("storage", ["float32", "float16", "int8"])
+def test_remove_moves_the_last_row_into_the_gap(storage):
+    store = VectorStore(storage=storage)
+    vectors = _vectors(4)
+    store.add(vectors)
+    store.remove(1)
+    assert len(store) == 3
+    assert np.allclose(store.vectors(np.arange(3)), vectors[[0, 3, 2]], atol=0.02)
+    indices, _ = store.search(vectors[3], top_k=1)
+    assert indices[0] == 1
+    store.remove(2)
+    assert len(store) == 2
+    with pytest.raises(IndexError):
+        store.remove(2)
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_compressed_storage_stays_close_to_float32(storage):
+    vectors = _vectors(500)
+    exact, compressed = VectorStore(storage="float32"), VectorStore(storage=storage)
+    exact.add(vectors)
+    compressed.add(vectors)
+    assert compressed.nbytes < exact.nbytes
+    for query in _vectors(10, seed=1):
+        exact_indices, exact_scores = exact.search(query, top_k=5)
+        indices, scores = compressed.search(query, top_k=5)
+        assert indices[0] == exact_indices[0]
+        assert np.allclose(scores, exact_scores, atol=0.02)
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_attached_compressed_storage_rescores_at_full_precision(storage):
+    vectors = _vectors(500)
+    exact, compressed = VectorStore(storage="float32"), VectorStore(storage=storage)
+    exact.add(vectors)
+    compressed.attach(vectors)
+    for query in _vectors(10, seed=1):
+        exact_indices, exact_scores = exact.search(query, top_k=5)
+        indices, scores = compressed.search(query, top_k=5)
+        # The shortlist is rescored against the float32 rows, so scores are exact
+        assert list(indices) == list(exact_indices)
+        assert np.allclose(scores, exact_scores, atol=1e-5)
+
+def test_attached_rows_are_copied_on_the_first_change():
+    vectors = _vectors(10)
+    vectors.flags.writeable = False
+    store = VectorStore(storage="int8")
+    codes = np.rint(vectors / (np.abs(vectors).max(axis=1, keepdims=True) / 127)).astype(np.int8)
+    scales = (np.abs(vectors).max(axis=1) / 127).astype(np.float32)
+    # Read-only like the memory maps of a compiled index
+    codes.flags.writeable = scales.flags.writeable = False
+    store.attach(vectors, codes, scales)
+    store.set([0], vectors[1:2])
+    assert np.allclose(store.vectors(np.array([0])), vectors[1], atol=0.02)
+    assert np.allclose(codes[0] * scales[0], vectors[0], atol=0.02)
@@ -0,0 +1,87 @@
+import threading
+import pytest
+from agents import workflow
+from agents.workflow import Workflow
+
+class _KnowledgeManager:
+    """Knowledge manager stand-in that records how hits were collected."""
+
+    def __init__(self, embedding_model):
+        self.embedding_model = embedding_model
+        self.knowledge_bases = {}
+        self.calls = []
+
+    def collect_hits(self, user_input, kb_names, top_k, query_embedding=None, mode=None, filter=None):
+        self.calls.append((query_embedding, mode, filter))
+        return {"filter": filter}
+
+    def merge_hits(self, hits_by_base, kb_names, top_k):
+        return [{"content": f"hits for {hits_by_base['filter']}"}]
+
+    def search_in_bases(self, *args, **kwargs):
+        raise AssertionError("the prefetched hits should have been used")
+
+class _EmbeddingModel:
+    def __init__(self, error=None):
+        self.error = error
+
+    def get_embedding(self, text):
+        if self.error:
+            raise self.error
+        return [1.0, 0.0]
+
+def _workflow(embedding_model):
+    flow = Workflow.__new__(Workflow)
+    flow.nodes = {
+        "start": {"knowledge": []},
+        "support": {"knowledge": [], "knowledge_filter": {"category": ["techniques", "resources"]}}
+    }
+    flow.knowledge_manager = _KnowledgeManager(embedding_model)
+    flow._prefetch = None
+    return flow
+
+def test_prefetch_embeds_and_collects_in_one_task():
+    flow = _workflow(_EmbeddingModel())
+    flow.prefetch_knowledge("I can't sleep")
+    _, embedding_future, hits_future = flow._prefetch
+    assert set(hits_future.result(5)) == {None, '{"category": ["techniques", "resources"]}'}
+    assert embedding_future.result(0) == [1.0, 0.0]
+    assert flow.knowledge_manager.calls == [
+        ([1.0, 0.0], None, None), ([1.0, 0.0], None, {"category": ["techniques", "resources"]})
+    ]
+
+def test_prefetch_falls_back_to_keywords_when_embedding_fails():
+    flow = _workflow(_EmbeddingModel(RuntimeError("provider down")))
+    flow.prefetch_knowledge("I can't sleep")
+    _, embedding_future, hits_future = flow._prefetch
+    assert len(hits_future.result(5)) == 2
+    with pytest.raises(RuntimeError):
+        embedding_future.result(0)
+    assert flow.knowledge_manager.calls == [
+        (None, "lexical", None), (None, "lexical", {"category": ["techniques", "resources"]})
+    ]
+
+def test_prefetch_completes_with_every_worker_busy():
+    # Each prefetch is one task, so a single free worker serves them all in turn
+    release = threading.Event()
+    blockers = [workflow._prefetch_executor.submit(release.wait, 5)
+                for _ in range(workflow._prefetch_executor._max_workers - 1)]
+    try:
+        flows = [_workflow(_EmbeddingModel()) for _ in range(4)]
+        for flow in flows:
+            flow.prefetch_knowledge("I can't sleep")
+        for flow in flows:
+            assert len(flow._prefetch[2].result(5)) == 2
+    finally:
+        release.set()
+        for blocker in blockers:
+            blocker.result(5)
+
+@pytest.mark.parametrize("node_id, expected", [
+    ("start", "hits for None"),
+    ("support", "hits for {'category': ['techniques', 'resources']}")
+])
+def test_retrieval_uses_the_prefetch_with_the_node_filter(node_id, expected):
+    flow = _workflow(_EmbeddingModel())
+    flow.prefetch_knowledge("I can't sleep")
+    assert expected in flow.retrieve_relevant_knowledge(node_id, "I can't sleep")
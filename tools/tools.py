@@ -44,7 +44,7 @@ class ToolRegistry:
             if results:
                 return {
                     "found": True,
-                    "information": [doc['content'] for doc in results],
+                    "information": [doc['content'] for doc, _ in results],
                     "count": len(results)
                 }
         
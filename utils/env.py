@@ -0,0 +1,20 @@
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def load_env():
+    """
+    Load variables from the .env file into os.environ.
+
+    The file is read on the first call only, so constructors can call this freely.
+    Variables already set in the environment take precedence.
+    """
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _loaded = True
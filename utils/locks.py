@@ -0,0 +1,63 @@
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+    """
+    Lock that lets any number of readers in at once, or one writer.
+
+    Waiting writers hold off new readers, so a steady stream of searches can't starve
+    an update. The writer may re-enter the lock, for reading or writing; readers must
+    not upgrade to writing.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition(threading.Lock())
+        self._readers = 0          # readers inside the lock
+        self._writers_waiting = 0
+        self._writer = None        # thread holding the write lock
+        self._depth = 0            # re-entries of the writer
+
+    @contextmanager
+    def read(self):
+        """Hold the lock shared for the duration of the block."""
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                while self._writer is not None or self._writers_waiting:
+                    self._condition.wait()
+                self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                if self._writer == me:
+                    self._depth -= 1
+                else:
+                    self._readers -= 1
+                    if not self._readers:
+                        self._condition.notify_all()
+
+    @contextmanager
+    def write(self):
+        """Hold the lock exclusively for the duration of the block."""
+        me = threading.get_ident()
+        with self._condition:
+            if self._writer == me:
+                self._depth += 1
+            else:
+                self._writers_waiting += 1
+                while self._writer is not None or self._readers:
+                    self._condition.wait()
+                self._writers_waiting -= 1
+                self._writer = me
+                self._depth = 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._depth -= 1
+                if not self._depth:
+                    self._writer = None
+                    self._condition.notify_all()
@@ -1,6 +1,6 @@
 import logging
+import threading
 from os import getenv
-from rich.logging import RichHandler
 
 LOGGER_NAME = "mindio"
 LOG_LEVEL = getenv("LOG_LEVEL", "INFO")
@@ -16,10 +16,15 @@ LOG_FORMAT = {
 
 # Create a global logger instance
 _logger = logging.getLogger(LOGGER_NAME)
+_configured = False
+_setup_lock = threading.Lock()
 
-# Configure the logger once at module level
+# Configure the logger once, on the first message
 def setup_logger():
     """Configure the logger with handlers"""
+    # rich is only imported once something is logged, to keep it out of cold start
+    from rich.logging import RichHandler
+    
     # Set log level
     _logger.setLevel(logging.getLevelName(LOG_LEVEL))
     
@@ -42,11 +47,14 @@ def setup_logger():
     _logger.addHandler(file_handler)
     _logger.addHandler(console_handler)
 
-# Initialize the logger
-setup_logger()
-
 def log(level: str, message: str):
     """Log a message at the specified level"""
+    global _configured
+    if not _configured:
+        with _setup_lock:
+            if not _configured:
+                setup_logger()
+                _configured = True
     level_upper = level.upper()
     if level_upper == "DEBUG":
         _logger.debug(message)
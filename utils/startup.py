@@ -0,0 +1,132 @@
+import os
+import sys
+import time
+import threading
+import importlib.abc
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Set STARTUP_PROFILE=1 in the process environment (it is read before .env) to print how
+# long each module took to import and each startup stage took to run
+ENABLED = os.getenv("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+# Number of modules listed in the report, slowest first
+REPORT_MODULES = 20
+
+_started = time.perf_counter()
+_stages: List[Tuple[str, str, float, float]] = []   # (thread, stage, start offset, seconds)
+_reported = False
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module loader to time the execution of the module's body."""
+
+    def __init__(self, loader, timer: "_ImportTimer"):
+        self._loader = loader
+        self._timer = timer
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Put the real loader back, so the module and later reloads see the usual one
+        module.__loader__ = self._loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self._loader
+        self._timer.enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._timer.leave(module.__name__)
+
+
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    """
+    Records the import time of every module loaded after install.
+
+    Own time excludes the modules a module imports, cumulative time includes them,
+    like `python -X importtime`.
+    """
+
+    def __init__(self):
+        self.times: Dict[str, Tuple[float, float]] = {}   # module -> (own, cumulative) seconds
+        self._local = threading.local()
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, "finding", False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, "find_spec"):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def enter(self):
+        """Start timing a module body; children's time is subtracted from its own."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append([time.perf_counter(), 0.0])
+
+    def leave(self, name: str):
+        """Stop timing the current module body."""
+        stack = self._local.stack
+        started, children = stack.pop()
+        elapsed = time.perf_counter() - started
+        self.times[name] = (elapsed - children, elapsed)
+        if stack:
+            stack[-1][1] += elapsed
+
+_timer: Optional[_ImportTimer] = None
+
+def begin():
+    """
+    Start profiling if STARTUP_PROFILE is set; call before importing the application.
+
+    Entry points call this first thing, so imports made afterwards are timed.
+    """
+    global _timer
+    if ENABLED and _timer is None:
+        _timer = _ImportTimer()
+        sys.meta_path.insert(0, _timer)
+
+@contextmanager
+def stage(name: str):
+    """Time a startup stage (a no-op unless profiling)."""
+    if not ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        _stages.append((threading.current_thread().name, name, started - _started, time.perf_counter() - started))
+
+def report():
+    """Print the stage and import timings once, at the end of startup (a no-op unless profiling)."""
+    global _reported
+    if not ENABLED or _reported:
+        return
+    _reported = True
+    lines = [f"Startup profile: {(time.perf_counter() - _started) * 1000:.0f} ms since start", "",
+             f"{'stage':<40}{'thread':<24}{'at ms':>9}{'ms':>9}"]
+    for thread, name, offset, seconds in sorted(_stages, key=lambda item: item[2]):
+        lines.append(f"{name:<40}{thread[:23]:<24}{offset * 1000:>9.1f}{seconds * 1000:>9.1f}")
+    if _timer is not None:
+        slowest = sorted(_timer.times.items(), key=lambda item: item[1][0], reverse=True)[:REPORT_MODULES]
+        lines += ["", f"{'module (slowest own import time)':<64}{'own ms':>9}{'cum ms':>9}"]
+        for name, (own, cumulative) in slowest:
+            lines.append(f"{name:<64}{own * 1000:>9.1f}{cumulative * 1000:>9.1f}")
+        total = sum(own for own, _ in _timer.times.values())
+        lines.append(f"{len(_timer.times)} modules imported in {total * 1000:.0f} ms")
+    print("\n".join(lines), file=sys.stderr)
@@ -0,0 +1,4 @@
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 ASCII characters per token, one token per other character (e.g. CJK)."""
+    ascii_chars = sum(1 for c in text if ord(c) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1